@@ -0,0 +1,468 @@
+"""
+AI结果缓存 - 进程内LRU + AICache表的两级缓存
+
+第一级是每个工作进程内的LRU (条目数和有效期可配置)，命中时不访问数据库；
+第二级是 AICache 表，由所有工作进程共享。
+失效通过 AICacheInvalidation 表在进程间同步: invalidate_cached_results 删除数据库条目
+并写入失效记录，各进程每隔 AI_CACHE_INVALIDATION_POLL_SECONDS 秒读取一次新记录并清除本地条目。
+命中次数和最后使用时间先在内存中累计，由后台线程每隔 AI_CACHE_HIT_FLUSH_SECONDS 秒
+以 F() 增量批量写回，读取缓存时不产生数据库写操作。
+同一后台线程每隔 AI_CACHE_EVICTION_INTERVAL_SECONDS 秒清理 AICache 表: 删除超过
+AI_CACHE_TTL_DAYS 未使用的条目，并按最近最少使用把各类型的条目数控制在 AI_CACHE_MAX_ENTRIES 以内。
+compute_once 合并相同缓存键的并发计算: 进程内通过等待事件，进程间通过 AICacheLease 租约行，
+只有一个调用者执行计算，其他调用者等待并读取它写入的缓存。
+store_result_blobs 按内容哈希保存历史记录引用的输入/结果数据，相同内容只写入一次。
+"""
+
+import atexit
+import copy
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F, Max, Sum
+from django.db.models.functions import Length
+from django.utils import timezone
+
+from .ai_usage import CACHE_ENTRIES, CACHE_HITS, increment_usage
+from .models import AICache, AICacheInvalidation, AICacheLease, AIResultBlob, content_hash
+
+logger = logging.getLogger(__name__)
+
+
+class LocalLRUCache:
+    """线程安全的进程内LRU缓存，条目超过有效期后视为未命中"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, cache_type: str = '', cache_key: str = ''):
+        """清除条目; cache_type/cache_key 为空时匹配全部"""
+        with self._lock:
+            if not cache_type and not cache_key:
+                self._entries.clear()
+                return
+            for key in list(self._entries):
+                if (not cache_type or key[0] == cache_type) and (not cache_key or key[1] == cache_key):
+                    del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class InvalidationWatcher:
+    """按间隔轮询 AICacheInvalidation 表，把新的失效记录应用到本地缓存"""
+
+    def __init__(self, local_cache: LocalLRUCache, poll_seconds: float):
+        self.local_cache = local_cache
+        self.poll_seconds = poll_seconds
+        self._last_seen_id = None
+        self._next_poll_at = 0.0
+        self._lock = threading.Lock()
+
+    def poll(self):
+        now = time.monotonic()
+        if now < self._next_poll_at:
+            return
+        with self._lock:
+            if now < self._next_poll_at:
+                return
+            self._next_poll_at = now + self.poll_seconds
+
+            if self._last_seen_id is None:
+                # 首次轮询: 之前的失效记录与本进程的空缓存无关
+                self._last_seen_id = AICacheInvalidation.objects.aggregate(
+                    last_id=Max('id')
+                )['last_id'] or 0
+                return
+
+            records = AICacheInvalidation.objects.filter(
+                id__gt=self._last_seen_id
+            ).order_by('id').values_list('id', 'cache_type', 'input_hash')
+            for record_id, cache_type, input_hash in records:
+                self.local_cache.discard(cache_type, input_hash)
+                self._last_seen_id = record_id
+
+
+class HitCounter:
+    """缓冲缓存命中，由后台线程定期以 F() 增量批量写入 AICache"""
+
+    def __init__(self):
+        self._hits = {}
+        self._lock = threading.Lock()
+
+    def record(self, cache_key: str):
+        with self._lock:
+            self._hits[cache_key] = self._hits.get(cache_key, 0) + 1
+
+    def flush(self) -> int:
+        """写回缓冲的命中次数，返回写回的命中总数"""
+        if not self._hits:
+            return 0
+        with self._lock:
+            hits, self._hits = self._hits, {}
+        if not hits:
+            return 0
+
+        # 命中次数相同的条目合并为一条 UPDATE
+        keys_by_count = {}
+        for cache_key, count in hits.items():
+            keys_by_count.setdefault(count, []).append(cache_key)
+
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                recorded = 0
+                for count, cache_keys in keys_by_count.items():
+                    recorded += count * AICache.objects.filter(input_hash__in=cache_keys).update(
+                        hit_count=F('hit_count') + count, last_used=now
+                    )
+                increment_usage({CACHE_HITS: recorded})
+        except Exception as e:
+            # 写回失败时放回缓冲区，下次重试
+            logger.warning("Cache hit flush failed: %s", e)
+            with self._lock:
+                for cache_key, count in hits.items():
+                    self._hits[cache_key] = self._hits.get(cache_key, 0) + count
+            return 0
+        return sum(hits.values())
+
+
+_local_cache = LocalLRUCache(
+    max_entries=settings.AI_CACHE_LOCAL_MAX_ENTRIES,
+    ttl_seconds=settings.AI_CACHE_LOCAL_TTL_SECONDS
+)
+_watcher = InvalidationWatcher(_local_cache, settings.AI_CACHE_INVALIDATION_POLL_SECONDS)
+_hit_counter = HitCounter()
+# 进程退出前写回尚未写入的命中
+atexit.register(_hit_counter.flush)
+
+_maintenance_thread = None
+_maintenance_lock = threading.Lock()
+
+
+def flush_hit_counts() -> int:
+    """立即写回本进程缓冲的命中次数"""
+    return _hit_counter.flush()
+
+
+def _ensure_maintenance_thread():
+    """按需启动后台维护线程 (写回命中次数、定期清理缓存表)"""
+    global _maintenance_thread
+    if _maintenance_thread is not None:
+        return
+    with _maintenance_lock:
+        if _maintenance_thread is None:
+            _maintenance_thread = threading.Thread(
+                target=_run_maintenance, name='ai-cache-maintenance', daemon=True
+            )
+            _maintenance_thread.start()
+
+
+def _run_maintenance():
+    eviction_interval = settings.AI_CACHE_EVICTION_INTERVAL_SECONDS
+    next_eviction_at = time.monotonic() + eviction_interval
+    while True:
+        time.sleep(settings.AI_CACHE_HIT_FLUSH_SECONDS)
+        close_old_connections()
+        try:
+            flush_hit_counts()
+            if eviction_interval > 0 and time.monotonic() >= next_eviction_at:
+                next_eviction_at = time.monotonic() + eviction_interval
+                evict_cache_entries()
+        except Exception as e:
+            logger.exception("Cache maintenance failed: %s", e)
+        finally:
+            close_old_connections()
+
+
+def evict_cache_entries(ttl_days: Optional[float] = None, max_entries: Optional[Dict] = None,
+                        batch_size: Optional[int] = None, dry_run: bool = False) -> Dict[str, Dict]:
+    """清理 AICache 表，返回各类型删除的条目数和字节数 ({cache_type: {'rows', 'bytes'}})
+    
+    先删除超过 ttl_days 未使用的条目，再按 last_used、hit_count 从旧到新删除超出
+    max_entries 上限的条目。删除按 batch_size 分批进行，每批一个事务。
+    字节数为 result_data 的存储大小 (压缩后)。
+    """
+    ttl_days = settings.AI_CACHE_TTL_DAYS if ttl_days is None else ttl_days
+    max_entries = settings.AI_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+    batch_size = batch_size or settings.AI_CACHE_EVICTION_BATCH_SIZE
+
+    cache_types = [cache_type for cache_type, _ in AICache.CACHE_TYPES]
+    reclaimed = {cache_type: {'rows': 0, 'bytes': 0} for cache_type in cache_types}
+
+    for cache_type in cache_types:
+        entries = AICache.objects.filter(cache_type=cache_type)
+        if ttl_days:
+            cutoff = timezone.now() - timedelta(days=ttl_days)
+            ids = list(entries.filter(last_used__lt=cutoff).values_list('id', flat=True))
+            _delete_in_batches(ids, batch_size, dry_run, reclaimed[cache_type])
+            entries = entries.filter(last_used__gte=cutoff)
+
+        limit = max_entries.get(cache_type)
+        if limit is None:
+            continue
+        excess = entries.count() - limit
+        if excess > 0:
+            ids = list(
+                entries.order_by('last_used', 'hit_count', 'id')
+                .values_list('id', flat=True)[:excess]
+            )
+            _delete_in_batches(ids, batch_size, dry_run, reclaimed[cache_type])
+
+    return reclaimed
+
+
+def _delete_in_batches(ids: List[int], batch_size: int, dry_run: bool, totals: Dict):
+    for start in range(0, len(ids), batch_size):
+        batch = AICache.objects.filter(id__in=ids[start:start + batch_size])
+        with transaction.atomic():
+            aggregates = batch.aggregate(size=Sum(Length('result_data')), hits=Sum('hit_count'))
+            size = aggregates['size'] or 0
+            if dry_run:
+                deleted = batch.count()
+            else:
+                deleted = batch.delete()[0]
+                increment_usage({CACHE_ENTRIES: -deleted, CACHE_HITS: -(aggregates['hits'] or 0)})
+        totals['rows'] += deleted
+        totals['bytes'] += size
+
+
+def get_cached_result(cache_key: str, cache_type: str) -> Optional[Dict]:
+    """读取缓存结果: 先查进程内缓存，未命中再查 AICache 表并回填"""
+    _watcher.poll()
+
+    result = _local_cache.get((cache_type, cache_key))
+    if result is not None:
+        _hit_counter.record(cache_key)
+        _ensure_maintenance_thread()
+        return copy.deepcopy(result)
+
+    result = AICache.objects.filter(
+        cache_type=cache_type,
+        input_hash=cache_key
+    ).values_list('result_data', flat=True).first()
+    if result is None:
+        return None
+
+    _hit_counter.record(cache_key)
+    _ensure_maintenance_thread()
+    _local_cache.set((cache_type, cache_key), copy.deepcopy(result))
+    return result
+
+
+def cache_result(cache_key: str, cache_type: str, result: Dict):
+    """写入缓存结果 (AICache 表和本进程缓存)"""
+    try:
+        with transaction.atomic():
+            AICache.objects.create(
+                cache_type=cache_type,
+                input_hash=cache_key,
+                result_data=result
+            )
+            increment_usage({CACHE_ENTRIES: 1})
+    except IntegrityError:
+        # 其他进程已写入相同的缓存键，结果相同，无需处理
+        pass
+    except Exception as e:
+        # 缓存失败不影响主要功能
+        logger.warning("Cache save failed: %s", e)
+        return
+
+    _ensure_maintenance_thread()
+    _local_cache.set((cache_type, cache_key), copy.deepcopy(result))
+
+
+def invalidate_cached_results(cache_type: str = '', cache_key: str = '') -> int:
+    """删除缓存条目并通知所有工作进程; 参数为空时匹配全部，返回删除的数据库条目数"""
+    entries = AICache.objects.all()
+    if cache_type:
+        entries = entries.filter(cache_type=cache_type)
+    if cache_key:
+        entries = entries.filter(input_hash=cache_key)
+    with transaction.atomic():
+        hits = entries.aggregate(hits=Sum('hit_count'))['hits'] or 0
+        deleted = entries.delete()[0]
+        increment_usage({CACHE_ENTRIES: -deleted, CACHE_HITS: -hits})
+        AICacheInvalidation.objects.create(cache_type=cache_type, input_hash=cache_key)
+    _local_cache.discard(cache_type, cache_key)
+
+    # 早于本地缓存有效期的失效记录已不会影响任何进程，可以清理
+    AICacheInvalidation.objects.filter(
+        created_at__lt=timezone.now() - timedelta(seconds=settings.AI_CACHE_LOCAL_TTL_SECONDS)
+    ).delete()
+    return deleted
+
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+# 计算者写入结果所需的余量 (秒): 租约在计算者截止时间之后再过这段时间才过期
+LEASE_MARGIN_SECONDS = 5
+
+
+def compute_once(cache_key: str, cache_type: str,
+                 compute: Callable[[Optional[float]], Tuple[Any, Optional[Dict]]],
+                 time_budget: Optional[float] = None) -> Tuple[Optional[Dict], Any]:
+    """读取缓存，未命中时合并相同缓存键的并发计算
+    
+    compute 以剩余时间 (秒，没有 time_budget 时为 None) 调用，返回 (结果, 要缓存的数据)，
+    要缓存的数据为 None 时不写缓存。返回 (缓存数据, None) 表示命中缓存 (包括等到其他
+    调用者写入的结果)，否则返回 (None, compute 的结果)。
+    
+    调用者的截止时间为 time_budget 秒后 (未设置时为 AI_CACHE_LEASE_SECONDS 秒后)。
+    只等待截止时间不晚于自己的计算者，否则立即自行计算；等到截止时间仍没有结果时也自行计算。
+    其他调用者的计算失败或结果不可缓存时，等待者之一重新成为计算者。
+    """
+    started_at = time.monotonic()
+    deadline = started_at + min(
+        settings.AI_CACHE_LEASE_SECONDS,
+        time_budget if time_budget is not None else settings.AI_CACHE_LEASE_SECONDS
+    )
+
+    def remaining():
+        if time_budget is None:
+            return None
+        return max(started_at + time_budget - time.monotonic(), 0.0)
+
+    while True:
+        cached = get_cached_result(cache_key, cache_type)
+        if cached is not None:
+            return cached, None
+        if time.monotonic() >= deadline:
+            return None, _compute_and_store(cache_key, cache_type, compute, remaining())
+
+        # 进程内: 已有线程在计算且会在截止时间前结束时等待它
+        with _inflight_lock:
+            inflight = _inflight.get(cache_key)
+            leader = inflight is None
+            if leader:
+                inflight = _inflight[cache_key] = (threading.Event(), deadline)
+        done, leader_deadline = inflight
+        if not leader:
+            if leader_deadline > deadline:
+                return None, _compute_and_store(cache_key, cache_type, compute, remaining())
+            done.wait(max(deadline - time.monotonic(), 0))
+            continue
+
+        try:
+            # 进程间: 取得租约的进程计算，其余进程轮询缓存直到租约释放或过期
+            token, holder_deadline = _acquire_lease(cache_key, deadline)
+            if token is None:
+                if holder_deadline > deadline:
+                    return None, _compute_and_store(cache_key, cache_type, compute, remaining())
+                _wait_for_lease(cache_key, cache_type, deadline)
+                continue
+            try:
+                return None, _compute_and_store(cache_key, cache_type, compute, remaining())
+            finally:
+                AICacheLease.objects.filter(input_hash=cache_key, owner=token).delete()
+        finally:
+            with _inflight_lock:
+                del _inflight[cache_key]
+            done.set()
+
+
+def _compute_and_store(cache_key: str, cache_type: str, compute: Callable,
+                       remaining: Optional[float]) -> Any:
+    result, cacheable = compute(remaining)
+    if cacheable is not None:
+        cache_result(cache_key, cache_type, cacheable)
+    return result
+
+
+def _acquire_lease(cache_key: str, deadline: float) -> Tuple[Optional[str], float]:
+    """取得缓存键的计算租约
+    
+    deadline 为本进程的截止时间 (time.monotonic())。返回 (持有者令牌, 持有者的截止时间)，
+    租约被其他进程持有且未过期时令牌为 None，截止时间按其租约过期时间换算。
+    """
+    token = uuid.uuid4().hex
+    now = timezone.now()
+    expires_at = now + timedelta(seconds=deadline - time.monotonic() + LEASE_MARGIN_SECONDS)
+    try:
+        with transaction.atomic():
+            AICacheLease.objects.create(input_hash=cache_key, owner=token, expires_at=expires_at)
+        return token, deadline
+    except IntegrityError:
+        pass
+
+    # 接管已过期的租约 (持有者异常退出)
+    taken_over = AICacheLease.objects.filter(
+        input_hash=cache_key, expires_at__lt=now
+    ).update(owner=token, expires_at=expires_at)
+    if taken_over:
+        return token, deadline
+
+    holder_expires_at = AICacheLease.objects.filter(
+        input_hash=cache_key
+    ).values_list('expires_at', flat=True).first()
+    if holder_expires_at is None:
+        # 租约刚被释放，按可等待处理，下一轮重新检查缓存
+        return None, time.monotonic()
+    holder_deadline = (holder_expires_at - now).total_seconds() - LEASE_MARGIN_SECONDS
+    return None, time.monotonic() + holder_deadline
+
+
+def _wait_for_lease(cache_key: str, cache_type: str, deadline: float):
+    """等待其他进程的计算: 直到缓存写入、租约释放或过期，或到达截止时间"""
+    while time.monotonic() < deadline:
+        time.sleep(settings.AI_CACHE_LEASE_POLL_SECONDS)
+        if AICache.objects.filter(cache_type=cache_type, input_hash=cache_key).exists():
+            return
+        if not AICacheLease.objects.filter(
+            input_hash=cache_key, expires_at__gte=timezone.now()
+        ).exists():
+            return
+
+
+def store_result_blobs(*payloads) -> List[str]:
+    """按内容寻址保存数据，返回各数据的内容哈希; 已存在的内容不重复写入
+    
+    复用已有数据时刷新其 created_at，使保留策略不会删除即将被新历史记录引用的数据。
+    """
+    hashes = [content_hash(payload) for payload in payloads]
+    existing = set(AIResultBlob.objects.filter(pk__in=hashes).values_list('pk', flat=True))
+    if existing:
+        AIResultBlob.objects.filter(pk__in=existing).update(created_at=timezone.now())
+    missing = {
+        payload_hash: payload for payload_hash, payload in zip(hashes, payloads)
+        if payload_hash not in existing
+    }
+    if missing:
+        # 并发写入相同内容时忽略冲突
+        AIResultBlob.objects.bulk_create(
+            [AIResultBlob(content_hash=payload_hash, data=payload) for payload_hash, payload in missing.items()],
+            ignore_conflicts=True
+        )
+    return hashes
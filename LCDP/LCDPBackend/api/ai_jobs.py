@@ -0,0 +1,153 @@
+"""
+后台优化任务队列
+任务记录保存在 OptimizationJob 表中，由进程内线程池执行，无需外部消息队列
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .ai_optimizer import (
+    OptimizationCancelled, create_layout_optimizer, record_layout_history,
+    optimize_layout_batch, summarize_layout_batch
+)
+from .models import OptimizationJob
+
+
+# 进度写入数据库的最小间隔 (秒)
+PROGRESS_INTERVAL = 0.5
+
+_job_executor = None
+_job_executor_lock = threading.Lock()
+
+
+def get_job_executor() -> ThreadPoolExecutor:
+    """获取 (按需创建) 进程内的任务线程池"""
+    global _job_executor
+    with _job_executor_lock:
+        if _job_executor is None:
+            _job_executor = ThreadPoolExecutor(
+                max_workers=settings.AI_JOB_WORKERS,
+                thread_name_prefix='ai-job'
+            )
+        return _job_executor
+
+
+def submit_optimization_job(user, job_type: str, input_data: Dict) -> OptimizationJob:
+    """创建任务记录，并在事务提交后交给线程池执行"""
+    job = OptimizationJob.objects.create(
+        user=user,
+        job_type=job_type,
+        input_data=input_data
+    )
+    transaction.on_commit(lambda: get_job_executor().submit(run_optimization_job, job.id))
+    return job
+
+
+def request_job_cancellation(job: OptimizationJob):
+    """请求取消任务: 未开始的任务直接取消，运行中的任务在下次汇报进度时停止"""
+    OptimizationJob.objects.filter(pk=job.pk, status='PENDING').update(
+        status='CANCELLED', cancel_requested=True, finished_at=timezone.now()
+    )
+    OptimizationJob.objects.filter(pk=job.pk, status='RUNNING').update(
+        cancel_requested=True
+    )
+
+
+class JobProgressReporter:
+    """把优化进度节流写入任务记录，并在写入时检查取消标记"""
+    
+    def __init__(self, job_id: int):
+        self.job_id = job_id
+        self.last_report = 0.0
+    
+    def report(self, progress: float, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self.last_report < PROGRESS_INTERVAL:
+            return
+        self.last_report = now
+        
+        # 已请求取消的任务不会被更新，借此在一次写入中同时检查取消标记
+        updated = OptimizationJob.objects.filter(
+            pk=self.job_id, cancel_requested=False
+        ).update(progress=min(1.0, progress))
+        if not updated:
+            raise OptimizationCancelled()
+
+
+def run_optimization_job(job_id: int):
+    """执行一个待处理任务 (线程池或 process_optimization_jobs 命令中调用)"""
+    close_old_connections()
+    try:
+        # 原子地认领任务，避免被重复执行
+        claimed = OptimizationJob.objects.filter(pk=job_id, status='PENDING').update(
+            status='RUNNING', started_at=timezone.now()
+        )
+        if not claimed:
+            return
+        
+        job = OptimizationJob.objects.get(pk=job_id)
+        reporter = JobProgressReporter(job_id)
+        try:
+            if job.job_type == 'BATCH_LAYOUT':
+                result = _run_batch_layout_job(job, reporter)
+            else:
+                result = _run_layout_job(job, reporter)
+        except OptimizationCancelled:
+            _finish_job(job_id, 'CANCELLED')
+        except Exception as e:
+            _finish_job(job_id, 'FAILED', error=str(e))
+        else:
+            _finish_job(job_id, 'SUCCEEDED', result=result)
+    finally:
+        close_old_connections()
+
+
+def _finish_job(job_id: int, status: str, result: Dict = None, error: str = ''):
+    """记录任务的最终状态"""
+    fields = {'status': status, 'error': error, 'finished_at': timezone.now()}
+    if status == 'SUCCEEDED':
+        fields.update(result_data=result, progress=1.0)
+    OptimizationJob.objects.filter(pk=job_id).update(**fields)
+
+
+def _run_layout_job(job: OptimizationJob, reporter: JobProgressReporter) -> Dict:
+    """单页面布局优化任务，结果同样写入 AICache 和 OptimizationHistory"""
+    data = job.input_data
+    components = data['components']
+    constraints = data['constraints']
+    
+    def on_progress(iterations, max_iterations, best_fitness):
+        reporter.report(iterations / max(1, max_iterations))
+    
+    optimizer = create_layout_optimizer(constraints)
+    result = optimizer.optimize_layout(components, constraints, progress_callback=on_progress)
+    reporter.report(1.0, force=True)
+    
+    record_layout_history(
+        job.user, data.get('project_id'), data.get('page_id'),
+        components, constraints, result
+    )
+    return result
+
+
+def _run_batch_layout_job(job: OptimizationJob, reporter: JobProgressReporter) -> Dict:
+    """批量布局优化任务"""
+    data = job.input_data
+    
+    def on_progress(completed, total):
+        reporter.report(completed / max(1, total))
+    
+    results = optimize_layout_batch(
+        data['pages'], data.get('constraints', {}), progress_callback=on_progress
+    )
+    reporter.report(1.0, force=True)
+    return {
+        'results': results,
+        'summary': summarize_layout_batch(results)
+    }
@@ -4,148 +4,881 @@ AI优化器模块 - PSO (粒子群优化) 实现
 """
 
 import numpy as np
-import random
+import os
 import math
 import json
 import hashlib
-from typing import List, Dict, Tuple, Optional
-from django.utils import timezone
-from .models import OptimizationHistory, AICache
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Dict, Tuple, Optional
+from scipy.cluster.vq import kmeans2
+from scipy.spatial import cKDTree
+from django.conf import settings
+from django.db import transaction
+from .ai_cache import compute_once, store_result_blobs
+from .ai_solvers import SOLVERS, Solver, SwarmEngine, create_solver
+from .ai_usage import OPTIMIZATION_COUNTER, increment_usage
+from .models import OptimizationHistory, Project, Page
 
 
-class Particle:
-    """粒子类 - PSO算法的基本单元"""
+class OptimizationCancelled(Exception):
+    """优化被取消 (由 progress_callback 抛出)"""
+
+
+class InvalidLayoutConstraints(ValueError):
+    """请求中的布局约束不合法 (视图返回 400)"""
+
+
+# 布局优化的默认约束
+DEFAULT_LAYOUT_CONSTRAINTS = {
+    'canvas_width': 1200,
+    'canvas_height': 800,
+    'min_spacing': 10,
+    'max_iterations': 100,
+    'swarm_size': 30,
+    'workers': 1,
+    'migration_interval': 10,
+    'solver': 'pso',
+    'stream_interval_ms': 100
+}
+
+# 流式优化推送进度事件的最小间隔 (毫秒)
+MIN_STREAM_INTERVAL_MS = 20
+
+
+_optimizer_pool = None
+_optimizer_pool_lock = threading.Lock()
+
+
+def get_optimizer_max_workers() -> int:
+    """岛模型可使用的最大进程数"""
+    return getattr(settings, 'AI_OPTIMIZER_MAX_WORKERS', None) or os.cpu_count() or 1
+
+
+def _init_optimizer_worker():
+    """进程池子进程初始化: 确保Django应用已加载"""
+    import django
+    django.setup()
+
+
+def get_optimizer_pool() -> ProcessPoolExecutor:
+    """获取 (按需创建) 进程内共享的优化器进程池"""
+    global _optimizer_pool
+    with _optimizer_pool_lock:
+        if _optimizer_pool is None:
+            _optimizer_pool = ProcessPoolExecutor(
+                max_workers=get_optimizer_max_workers(),
+                initializer=_init_optimizer_worker
+            )
+        return _optimizer_pool
+
+
+def _optimize_cluster(optimizer: 'ComponentLayoutOptimizer', components: List[Dict],
+                      constraints: Dict) -> Dict:
+    """进程池任务: 分层优化中单个簇的优化 (不读写缓存)"""
+    return optimizer._optimize(components, constraints)
+
+
+def _run_island_epoch(optimizer: 'ComponentLayoutOptimizer', swarm: SwarmEngine,
+                      sizes: np.ndarray, constraints: Dict,
+                      start: int, stop: int) -> Tuple[SwarmEngine, List[float]]:
+    """进程池任务: 在一个岛上运行一个迁移周期"""
+    history = []
+    optimizer._run_iterations(swarm, sizes, constraints, start, stop, history)
+    return swarm, history
+
+
+def skyline_pack(sizes: np.ndarray, canvas_width: float, spacing: float = 0.0) -> np.ndarray:
+    """天际线 (skyline) 装箱: 构造一个无重叠的布局
     
-    def __init__(self, dimensions: int, bounds: List[Tuple[float, float]]):
-        self.dimensions = dimensions
-        self.bounds = bounds
-        
-        # 初始化位置和速度
-        self.position = np.array([
-            random.uniform(bound[0], bound[1]) 
-            for bound in bounds
-        ])
-        self.velocity = np.array([
-            random.uniform(-1, 1) for _ in range(dimensions)
-        ])
-        
-        # 历史最佳位置和适应度
-        self.best_position = self.position.copy()
-        self.best_fitness = float('inf')
-        self.current_fitness = float('inf')
+    组件按高度从大到小依次放到天际线上能放下的最高 (y 最小) 位置，
+    同高时靠左，组件之间保留 spacing 间距。返回每个组件左上角坐标 (n, 2)。
+    """
+    positions = np.zeros((len(sizes), 2))
     
-    def update_velocity(self, global_best_position: np.ndarray, 
-                       w: float = 0.5, c1: float = 1.5, c2: float = 1.5):
-        """更新粒子速度"""
-        r1, r2 = random.random(), random.random()
-        
-        # PSO速度更新公式
-        cognitive = c1 * r1 * (self.best_position - self.position)
-        social = c2 * r2 * (global_best_position - self.position)
-        
-        self.velocity = w * self.velocity + cognitive + social
-        
-        # 限制速度范围
-        self.velocity = np.clip(self.velocity, -2, 2)
+    # 天际线各段 [起点 x, 已占用到的 y, 宽度]，最右侧的组件不需要右间距
+    limit = canvas_width + spacing
+    skyline = [[0.0, 0.0, limit]]
     
-    def update_position(self):
-        """更新粒子位置"""
-        self.position += self.velocity
-        
-        # 确保位置在边界内
-        for i, (min_val, max_val) in enumerate(self.bounds):
-            if self.position[i] < min_val:
-                self.position[i] = min_val
-                self.velocity[i] *= -0.5  # 反弹
-            elif self.position[i] > max_val:
-                self.position[i] = max_val
-                self.velocity[i] *= -0.5  # 反弹
+    order = sorted(range(len(sizes)), key=lambda i: (-sizes[i][1], -sizes[i][0]))
+    for index in order:
+        width = min(float(sizes[index][0]), canvas_width) + spacing
+        height = float(sizes[index][1]) + spacing
+        
+        # 依次尝试以每段的起点作为组件左边缘
+        best = None
+        for start, (x, _, _) in enumerate(skyline):
+            if x + width > limit + 1e-9:
+                break
+            y = 0.0
+            for seg_x, seg_y, _ in skyline[start:]:
+                if seg_x >= x + width - 1e-9:
+                    break
+                y = max(y, seg_y)
+            if best is None or (y, x) < best:
+                best = (y, x)
+        
+        y, x = best
+        positions[index] = (x, y)
+        
+        # 用新组件的顶边替换被覆盖的天际线段，并合并等高的相邻段
+        right = x + width
+        updated = [[x, y + height, width]]
+        for seg_x, seg_y, seg_width in skyline:
+            seg_right = seg_x + seg_width
+            if seg_x < x:
+                updated.append([seg_x, seg_y, min(seg_right, x) - seg_x])
+            if seg_right > right:
+                start_x = max(seg_x, right)
+                updated.append([start_x, seg_y, seg_right - start_x])
+        updated.sort()
+        skyline = [updated[0]]
+        for segment in updated[1:]:
+            if segment[1] == skyline[-1][1]:
+                skyline[-1][2] += segment[2]
+            else:
+                skyline.append(segment)
+    
+    return positions
 
 
 class ComponentLayoutOptimizer:
     """组件布局PSO优化器"""
     
-    def __init__(self, swarm_size: int = 30, max_iterations: int = 100):
+    # 单次成对计算允许的最大元素数 (粒子数 × 组件对数)
+    PAIRWISE_CHUNK_ELEMENTS = 2_000_000
+    
+    # 组件数达到该阈值时，重叠检测先用扫描剪枝做粗筛 (见 benchmark_overlap 命令)
+    BROAD_PHASE_THRESHOLD = 80
+    
+    # fitness_mode 为 auto 时，组件数达到该阈值改用 O(n log n) 的对齐和间距指标
+    SCALABLE_METRICS_THRESHOLD = 80
+    
+    # 近似间距指标中每个组件参考的近邻数
+    SPACING_NEIGHBORS = 4
+    
+    # 对齐阈值 (像素)
+    ALIGNMENT_THRESHOLD = 5
+    
+    # 岛模型中每个子群的最少粒子数
+    MIN_ISLAND_SIZE = 5
+    
+    # decompose 为 auto 时，组件数达到该阈值即按簇分层优化
+    DECOMPOSE_THRESHOLD = 40
+    
+    # 分层优化时每个簇的默认最大组件数
+    DEFAULT_CLUSTER_SIZE = 12
+    
+    # 分层优化时按 簇内组件总面积 / CLUSTER_DENSITY 的正方形边长选择簇的装箱宽度
+    CLUSTER_DENSITY = 0.35
+    
+    # 分层优化时簇内优化可使用的时间预算比例，其余留给簇的整体排布
+    CLUSTER_TIME_SHARE = 0.7
+    
+    # 热启动时在当前布局附近初始化的种群比例，以及扰动的标准差 (像素)
+    WARM_START_FRACTION = 0.5
+    WARM_START_JITTER = 20
+    
+    # 粒子每个维度的最大速度占该维度搜索范围的比例 (不低于 SwarmEngine.MAX_VELOCITY)。
+    # 像素坐标的范围是数百到上千，固定的 ±2 几乎无法移动粒子，分层优化的整块排布也因此失效
+    MAX_VELOCITY_RATIO = 0.2
+    
+    def __init__(self, swarm_size: int = 30, max_iterations: int = 100,
+                 seed: Optional[int] = None, workers: int = 1,
+                 migration_interval: int = 10, solver: str = 'pso'):
+        if solver not in SOLVERS:
+            raise ValueError(f"不支持的优化算法: {solver}，可选: {', '.join(SOLVERS)}")
         self.swarm_size = swarm_size
         self.max_iterations = max_iterations
-        self.particles = []
+        self.solver = solver
+        self.workers = max(1, min(workers, get_optimizer_max_workers()))
+        self.migration_interval = max(1, migration_interval)
+        self.deadline = None
+        self.evaluations = 0
+        self.converged = False
+        self.progress_callback = None
+        self.rng = np.random.default_rng(seed)
+        self.swarm = None
         self.global_best_position = None
         self.global_best_fitness = float('inf')
         self.fitness_history = []
+        self.obstacles = None
+        self.obstacle_totals = None
+        self.pinned_mask = None
+        self._pair_index_cache = {}
     
-    def optimize_layout(self, components: List[Dict], constraints: Dict) -> Dict:
-        """使用PSO优化组件布局"""
-        
-        # 检查缓存
-        cache_key = self._generate_cache_key(components, constraints)
-        cached_result = self._get_cached_result(cache_key, 'PSO_LAYOUT')
+    def __getstate__(self):
+        """传给进程池时不携带粒子群和索引缓存"""
+        state = self.__dict__.copy()
+        state['swarm'] = None
+        state['_pair_index_cache'] = {}
+        state['progress_callback'] = None
+        return state
+    
+    @classmethod
+    def from_constraints(cls, constraints: Dict) -> 'ComponentLayoutOptimizer':
+        """按约束创建优化器，未指定的参数使用默认约束"""
+        options = {**DEFAULT_LAYOUT_CONSTRAINTS, **constraints}
+        return cls(
+            swarm_size=int(options['swarm_size']),
+            max_iterations=int(options['max_iterations']),
+            workers=int(options['workers']),
+            migration_interval=int(options['migration_interval']),
+            solver=options['solver']
+        )
+    
+    def optimize_layout(self, components: List[Dict], constraints: Dict,
+                        progress_callback: Optional[Callable] = None) -> Dict:
+        """优化组件布局 (默认PSO，solver 可选 cmaes/de/sa)
+        
+        constraints 中设置 time_budget_ms 时，到达截止时间后停止迭代并
+        返回截至当时的最优布局 (anytime)。progress_callback 每轮 (岛模型
+        为每个迁移周期) 以 (已完成轮数, 最大轮数, 当前最优适应度) 调用，
+        回调中抛出的异常会中止优化。
+        
+        constraints 中 method 为 greedy 时不搜索，直接返回天际线装箱
+        构造的无重叠布局 (毫秒级，不读写缓存)。
+        """
+        if constraints.get('method') == 'greedy':
+            return self._optimize(components, constraints, progress_callback)
+        
+        # 检查缓存 (按结构化键，组件顺序和ID不影响命中)，相同布局的并发请求只计算一次
+        order = self._canonical_order(components, constraints)
+        cache_key = self._generate_cache_key(components, constraints, order)
+        
+        def compute(remaining_seconds):
+            run_constraints = constraints
+            if remaining_seconds is not None:
+                # 等待其他请求的计算后只用剩余的时间预算
+                run_constraints = dict(constraints, time_budget_ms=max(remaining_seconds * 1000, 1))
+            result = self._optimize(components, run_constraints, progress_callback)
+            # 超时提前返回的结果不缓存，以便之后有更充足的时间重新优化
+            cacheable = None if result['timed_out'] else self._cacheable_result(result, order)
+            return result, cacheable
+        
+        time_budget_ms = constraints.get('time_budget_ms')
+        cached_result, result = compute_once(
+            cache_key, 'PSO_LAYOUT', compute,
+            time_budget=time_budget_ms / 1000 if time_budget_ms else None
+        )
         if cached_result:
-            return cached_result
-        
-        # 初始化粒子群
-        self._initialize_particles(components, constraints)
-        
+            return self._restore_cached_result(cached_result, components, constraints, order)
+        return result
+    
+    def _optimize(self, components: List[Dict], constraints: Dict,
+                  progress_callback: Optional[Callable] = None) -> Dict:
+        """执行优化并生成结果 (不读写缓存，可在进程池子进程中调用)"""
+        started_at = time.monotonic()
+        time_budget_ms = constraints.get('time_budget_ms')
+        self.deadline = started_at + time_budget_ms / 1000 if time_budget_ms else None
+        self.evaluations = 0
+        self.converged = False
+        self.progress_callback = progress_callback
+        
+        # 固定的组件作为障碍物，只搜索其余组件
+        pinned = self._pinned_mask(components)
+        if pinned.any():
+            return self._optimize_with_pinned(components, constraints, pinned, started_at)
+        
+        if constraints.get('method') == 'greedy':
+            return self._optimize_greedy(components, constraints, started_at)
+        
+        # 大页面拆分为多个簇分别优化
+        if self._should_decompose(components, constraints):
+            return self._optimize_hierarchical(components, constraints, started_at)
+        
+        sizes = self._component_sizes(components)
         best_fitness_history = []
         
-        # PSO主循环
-        for iteration in range(self.max_iterations):
-            # 评估每个粒子的适应度
-            for particle in self.particles:
-                fitness = self._evaluate_layout_fitness(
-                    particle.position, components, constraints
-                )
-                particle.current_fitness = fitness
-                
-                # 更新个体最佳
-                if fitness < particle.best_fitness:
-                    particle.best_fitness = fitness
-                    particle.best_position = particle.position.copy()
-                
-                # 更新全局最佳
-                if fitness < self.global_best_fitness:
-                    self.global_best_fitness = fitness
-                    self.global_best_position = particle.position.copy()
-            
-            # 更新粒子速度和位置
-            w = 0.9 - (0.5 * iteration / self.max_iterations)  # 递减惯性权重
-            for particle in self.particles:
-                particle.update_velocity(self.global_best_position, w)
-                particle.update_position()
-            
-            best_fitness_history.append(self.global_best_fitness)
+        if self.workers > 1 and self.solver == 'pso':
+            # 岛模型: 多个子群在进程池中并行，定期交换最优粒子
+            iterations = self._optimize_islands(
+                components, sizes, constraints, best_fitness_history
+            )
+        else:
+            # 初始化粒子群 (或其他算法的种群)
+            self._initialize_particles(components, constraints)
             
-            # 早停条件
-            if len(best_fitness_history) > 10:
-                recent_improvement = best_fitness_history[-10] - best_fitness_history[-1]
-                if recent_improvement < 0.01:  # 改进很小时提前停止
-                    break
+            # 优化主循环
+            iterations = self._run_iterations(
+                self.swarm, sizes, constraints, 0, self.max_iterations,
+                best_fitness_history, early_stop=True
+            )
+            self.global_best_fitness = self.swarm.global_best_fitness
+            self.global_best_position = self.swarm.global_best_position
+        
+        # PSO结束后的收尾处理
+        self._finalize_solution(sizes, constraints)
         
         # 生成优化结果
         optimized_positions = self._positions_to_layout(
             self.global_best_position, components, constraints
         )
         
+        timed_out = self._deadline_passed() and not self.converged
         result = {
             'optimized_layout': optimized_positions,
             'fitness_score': self.global_best_fitness,
-            'iterations': iteration + 1,
+            'solver': self.solver,
+            'iterations': iterations,
+            'evaluations': self.evaluations,
+            'converged': self.converged,
+            'timed_out': timed_out,
+            'elapsed_ms': round((time.monotonic() - started_at) * 1000, 1),
             'improvement': best_fitness_history[0] - self.global_best_fitness if best_fitness_history else 0,
             'fitness_history': best_fitness_history
         }
+        return result
+    
+    def _run_iterations(self, swarm: Solver, sizes: np.ndarray, constraints: Dict,
+                        start: int, stop: int, history: List[float],
+                        early_stop: bool = False) -> int:
+        """在 swarm 上运行第 start 到 stop-1 轮迭代
+        
+        每轮的全局最佳适应度追加到 history，返回已完成的总轮数。
+        """
+        iteration = start - 1
+        for iteration in range(start, stop):
+            # 批量评估本轮候选解的适应度，交回算法更新种群
+            candidates = swarm.ask()
+            fitness = self._evaluate_swarm_fitness(
+                candidates.reshape(len(candidates), -1, 2), sizes, constraints
+            )
+            swarm.tell(fitness, iteration / self.max_iterations)
+            
+            history.append(swarm.global_best_fitness)
+            self.evaluations += len(candidates)
+            self._report_progress(
+                iteration + 1, swarm.global_best_fitness, swarm.global_best_position
+            )
+            
+            # 早停条件
+            if early_stop and self._has_converged(history, swarm.CONVERGENCE_WINDOW):
+                self.converged = True
+                break
+            
+            # 到达截止时间，保留当前最优结果
+            if self._deadline_passed():
+                break
+        
+        return iteration + 1
+    
+    def _should_decompose(self, components: List[Dict], constraints: Dict) -> bool:
+        """判断是否分层优化
+        
+        decompose: true/false 强制开启或关闭; auto (默认) - 组件数达到
+        DECOMPOSE_THRESHOLD 或提供了 groups 时开启
+        """
+        decompose = constraints.get('decompose', 'auto')
+        if decompose == 'auto':
+            return len(components) >= self.DECOMPOSE_THRESHOLD or bool(constraints.get('groups'))
+        return bool(decompose) and len(components) > 1
+    
+    def _cluster_components(self, components: List[Dict], constraints: Dict) -> List[List[int]]:
+        """把组件划分为若干簇，返回每个簇的组件下标
+        
+        依次使用: 用户给出的 groups (组件ID列表的列表)、组件的 parent_id
+        (所属 Container)、已有坐标的空间邻近 (k-means)，都没有时按顺序分块。
+        没有被前两种方式分组的组件按空间邻近或顺序继续分簇，
+        超过 cluster_size 的簇再按顺序拆分。
+        """
+        cluster_size = max(2, int(constraints.get('cluster_size', self.DEFAULT_CLUSTER_SIZE)))
+        index_by_id = {comp.get('id', f'comp_{i}'): i for i, comp in enumerate(components)}
+        
+        clusters = []
+        assigned = set()
+        for group in constraints.get('groups') or []:
+            members = [index_by_id[cid] for cid in group
+                       if cid in index_by_id and index_by_id[cid] not in assigned]
+            if members:
+                clusters.append(members)
+                assigned.update(members)
+        
+        by_parent = {}
+        for i, comp in enumerate(components):
+            parent = comp.get('parent_id')
+            if i not in assigned and parent is not None:
+                by_parent.setdefault(parent, []).append(i)
+        for members in by_parent.values():
+            clusters.append(members)
+            assigned.update(members)
+        
+        remaining = [i for i in range(len(components)) if i not in assigned]
+        clusters.extend(self._cluster_by_proximity(components, remaining, cluster_size))
+        
+        # 拆分过大的簇
+        split = []
+        for members in clusters:
+            for start in range(0, len(members), cluster_size):
+                split.append(members[start:start + cluster_size])
+        return split
+    
+    def _cluster_by_proximity(self, components: List[Dict], indices: List[int],
+                              cluster_size: int) -> List[List[int]]:
+        """按已有坐标做 k-means 空间聚类，组件没有坐标时按顺序分块"""
+        if not indices:
+            return []
+        num_clusters = math.ceil(len(indices) / cluster_size)
+        has_positions = all('x' in components[i] and 'y' in components[i] for i in indices)
+        if num_clusters == 1 or not has_positions:
+            return [indices[start:start + cluster_size]
+                    for start in range(0, len(indices), cluster_size)]
+        
+        centers = np.array([
+            [components[i]['x'] + components[i].get('width', 100) / 2,
+             components[i]['y'] + components[i].get('height', 50) / 2]
+            for i in indices
+        ], dtype=float)
+        _, labels = kmeans2(centers, num_clusters, minit='++',
+                            seed=int(self.rng.integers(2 ** 32)))
+        clusters = [[indices[j] for j in np.flatnonzero(labels == label)]
+                    for label in range(num_clusters)]
+        return [members for members in clusters if members]
+    
+    def _cluster_canvas(self, sizes: np.ndarray, constraints: Dict) -> Tuple[float, float]:
+        """簇内优化使用的局部画布: 簇内组件天际线装箱后的包围盒
+        
+        装箱宽度取整页宽度的整数分之一 (接近面积为组件总面积 / CLUSTER_DENSITY
+        的正方形边长)，各簇整块排布时每行恰好放下整数个块，总面积与整页直接
+        装箱相近，填满程度较高的页面上各块仍然放得下。
+        """
+        canvas_width = constraints.get('canvas_width', 1200)
+        spacing = constraints.get('min_spacing', 10)
+        side = np.sqrt(sizes.prod(axis=1).sum() / self.CLUSTER_DENSITY)
+        columns = max(1, int(round(canvas_width / side)))
+        width = max((canvas_width + spacing) / columns - spacing, float(sizes[:, 0].max()))
+        extent = (skyline_pack(sizes, width, spacing) + sizes).max(axis=0)
+        return float(extent[0]), float(extent[1])
+    
+    def _optimize_hierarchical(self, components: List[Dict], constraints: Dict,
+                               started_at: float) -> Dict:
+        """分层优化: 各簇作为独立的小问题优化后视为整块，再排布各块的位置
+        
+        各簇的优化互不依赖，workers > 1 时在进程池中并行执行。
+        """
+        clusters = self._cluster_components(components, constraints)
+        base_constraints = {
+            key: value for key, value in constraints.items()
+            if key not in ('groups', 'time_budget_ms')
+        }
+        base_constraints['decompose'] = False
+        
+        # 簇内优化阶段的截止时间 (剩余预算的 CLUSTER_TIME_SHARE)，各簇分摊这段时间
+        clusters_deadline = None
+        if self.deadline is not None:
+            remaining = max(0.0, self.deadline - time.monotonic())
+            clusters_deadline = time.monotonic() + remaining * self.CLUSTER_TIME_SHARE
+        
+        # 热启动: 簇内使用相对簇左上角的当前坐标，簇整块使用簇的当前位置
+        current = self._current_positions(components, constraints)
+        origins = [current[members].min(axis=0) if current is not None else None
+                   for members in clusters]
+        
+        tasks = []
+        seeds = self.rng.integers(0, 2 ** 32, len(clusters) + 1)
+        for members, seed, origin in zip(clusters, seeds, origins):
+            cluster_components = [components[i] for i in members]
+            width, height = self._cluster_canvas(
+                self._component_sizes(cluster_components), constraints
+            )
+            if origin is not None:
+                cluster_components = [
+                    dict(comp, x=float(comp['x']) - origin[0], y=float(comp['y']) - origin[1])
+                    for comp in cluster_components
+                ]
+                extent = (current[members] + self._component_sizes(cluster_components)).max(axis=0) - origin
+                width = max(width, min(extent[0], constraints.get('canvas_width', 1200)))
+                height = max(height, extent[1])
+            cluster_constraints = dict(base_constraints, canvas_width=width, canvas_height=height)
+            optimizer = ComponentLayoutOptimizer(
+                self.swarm_size, self.max_iterations, seed=seed, solver=self.solver
+            )
+            tasks.append((optimizer, cluster_components, cluster_constraints))
+        
+        if self.workers > 1:
+            # 簇分 ceil(簇数 / 进程数) 批并行执行，每个簇分到一批的时间
+            if clusters_deadline is not None:
+                rounds = -(-len(tasks) // self.workers)
+                budget_ms = (clusters_deadline - time.monotonic()) * 1000 / rounds
+                for _, _, cluster_constraints in tasks:
+                    cluster_constraints['time_budget_ms'] = max(1.0, budget_ms)
+            pool = get_optimizer_pool()
+            futures = [pool.submit(_optimize_cluster, *task) for task in tasks]
+            cluster_results = []
+            for done, future in enumerate(futures, start=1):
+                cluster_results.append(future.result())
+                self._report_cluster_progress(done, len(tasks) + 1)
+        else:
+            cluster_results = []
+            for done, task in enumerate(tasks, start=1):
+                # 依次执行时，每个簇平分簇内阶段剩余的时间
+                if clusters_deadline is not None:
+                    budget_ms = (clusters_deadline - time.monotonic()) * 1000 / (len(tasks) - done + 1)
+                    task[2]['time_budget_ms'] = max(1.0, budget_ms)
+                cluster_results.append(_optimize_cluster(*task))
+                self._report_cluster_progress(done, len(tasks) + 1)
+        
+        # 每个簇的布局平移到原点，包围盒作为一个整块参与排布
+        blocks = []
+        local_offsets = []
+        for index, result in enumerate(cluster_results):
+            layout = result['optimized_layout']
+            xy = np.array([[item['x'], item['y']] for item in layout], dtype=float)
+            wh = np.array([[item['width'], item['height']] for item in layout], dtype=float)
+            origin = xy.min(axis=0)
+            extent = (xy + wh).max(axis=0) - origin
+            local_offsets.append(xy - origin)
+            block = {'id': f'cluster_{index}', 'width': float(extent[0]), 'height': float(extent[1])}
+            if origins[index] is not None:
+                block.update(x=float(origins[index][0]), y=float(origins[index][1]))
+            blocks.append(block)
+        
+        block_constraints = dict(base_constraints)
+        if self.deadline is not None:
+            block_constraints['time_budget_ms'] = max(1.0, (self.deadline - time.monotonic()) * 1000)
+        block_optimizer = ComponentLayoutOptimizer(
+            self.swarm_size, self.max_iterations, seed=seeds[-1], solver=self.solver
+        )
+        block_result = block_optimizer._optimize(blocks, block_constraints)
+        self._report_cluster_progress(len(tasks) + 1, len(tasks) + 1)
+        
+        # 合成整页布局
+        position = np.zeros((len(components), 2))
+        for members, offsets, block in zip(clusters, local_offsets, block_result['optimized_layout']):
+            position[members] = offsets + [block['x'], block['y']]
+        
+        sizes = self._component_sizes(components)
+        self.global_best_position = position.ravel()
+        self.global_best_fitness = self._evaluate_layout_fitness(
+            self.global_best_position, components, constraints
+        )
         
-        # 缓存结果
-        self._cache_result(cache_key, 'PSO_LAYOUT', result)
+        # 页面填满程度较高时各簇整块可能排布不下而互相重叠，此时改用整页天际线装箱
+        greedy_position = self._greedy_layout(sizes, constraints).ravel()
+        greedy_fitness = self._evaluate_layout_fitness(greedy_position, components, constraints)
+        fallback = greedy_fitness < self.global_best_fitness
+        if fallback:
+            self.global_best_position = greedy_position
+            self.global_best_fitness = greedy_fitness
+        self._finalize_solution(sizes, constraints)
+        
+        stages = cluster_results + [block_result]
+        self.evaluations += sum(result['evaluations'] for result in stages) + 1
+        self.converged = all(result['converged'] for result in stages)
+        return {
+            'optimized_layout': self._positions_to_layout(self.global_best_position, components, constraints),
+            'fitness_score': self.global_best_fitness,
+            'solver': self.solver,
+            'iterations': max(result['iterations'] for result in stages),
+            'evaluations': self.evaluations,
+            'converged': self.converged,
+            'timed_out': any(result['timed_out'] for result in stages),
+            'elapsed_ms': round((time.monotonic() - started_at) * 1000, 1),
+            'improvement': block_result['improvement'],
+            'fitness_history': block_result['fitness_history'],
+            'clusters': len(clusters),
+            'greedy_fallback': fallback
+        }
+    
+    def _pinned_mask(self, components: List[Dict]) -> np.ndarray:
+        """标记 pinned/locked 且带有 x/y 坐标的组件 (没有坐标的组件无法固定，照常参与优化)"""
+        return np.array([
+            bool(comp.get('pinned') or comp.get('locked')) and 'x' in comp and 'y' in comp
+            for comp in components
+        ], dtype=bool)
+    
+    def _optimize_with_pinned(self, components: List[Dict], constraints: Dict,
+                              pinned: np.ndarray, started_at: float) -> Dict:
+        """局部重新优化: 固定组件保持原位并作为障碍物参与适应度计算
+        
+        搜索维度只有自由组件的坐标，新增一个组件时只需搜索两个维度。
+        有固定组件时不做分层优化 (各簇的局部画布上没有障碍物)。
+        """
+        fixed = [comp for comp, is_pinned in zip(components, pinned) if is_pinned]
+        free = [comp for comp, is_pinned in zip(components, pinned) if not is_pinned]
+        fixed_positions = np.array([[float(comp['x']), float(comp['y'])] for comp in fixed])
+        
+        if free:
+            fixed_sizes = self._component_sizes(fixed)
+            self.obstacles = (fixed_positions, fixed_sizes)
+            self.pinned_mask = pinned
+            state = LayoutFitnessState(self, fixed_positions, fixed_sizes, constraints)
+            self.obstacle_totals = (
+                state.overlap_total, state.boundary.sum(), state.aligned_total,
+                state.distance_sum, state.distance_sq_sum, state.position_sum
+            )
+            try:
+                result = self._optimize(free, dict(constraints, decompose=False), self.progress_callback)
+            finally:
+                self.obstacles = None
+                self.obstacle_totals = None
+                self.pinned_mask = None
+            free_positions = self.global_best_position.reshape(-1, 2)
+        else:
+            free_positions = np.zeros((0, 2))
+            result = {'iterations': 0, 'evaluations': 0, 'converged': True, 'timed_out': False,
+                      'improvement': 0, 'fitness_history': []}
+        
+        # 按请求中的顺序合并固定组件和自由组件
+        position = np.zeros((len(components), 2))
+        position[pinned] = fixed_positions
+        position[~pinned] = free_positions
+        self.global_best_position = position.ravel()
+        self.global_best_fitness = self._evaluate_layout_fitness(
+            self.global_best_position, components, constraints
+        )
         
+        result = dict(result)
+        result.update({
+            'optimized_layout': self._positions_to_layout(self.global_best_position, components, constraints),
+            'fitness_score': self.global_best_fitness,
+            'pinned': int(pinned.sum()),
+            'elapsed_ms': round((time.monotonic() - started_at) * 1000, 1)
+        })
         return result
     
+    def _with_obstacles(self, positions: np.ndarray, sizes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """在每个候选布局后追加固定组件 (障碍物) 的坐标和尺寸"""
+        if self.obstacles is None:
+            return positions, sizes
+        obstacle_positions, obstacle_sizes = self.obstacles
+        obstacle_positions = np.broadcast_to(
+            obstacle_positions, (positions.shape[0],) + obstacle_positions.shape
+        )
+        return (
+            np.concatenate([positions, obstacle_positions], axis=1),
+            np.concatenate([sizes, obstacle_sizes])
+        )
+    
+    def _obstacle_bottom(self, spacing: float) -> float:
+        """固定组件的最低底边加上间距，没有固定组件时为 0"""
+        if self.obstacles is None or not len(self.obstacles[0]):
+            return 0.0
+        positions, sizes = self.obstacles
+        return float((positions[:, 1] + sizes[:, 1]).max()) + spacing
+    
+    def _optimize_greedy(self, components: List[Dict], constraints: Dict,
+                         started_at: float) -> Dict:
+        """构造式快速布局: 只做一次装箱和一次适应度评估"""
+        sizes = self._component_sizes(components)
+        self.global_best_position = self._greedy_layout(sizes, constraints).ravel()
+        self.global_best_fitness = self._evaluate_layout_fitness(
+            self.global_best_position, components, constraints
+        )
+        self.evaluations = 1
+        self._finalize_solution(sizes, constraints)
+        self.converged = True
+        return {
+            'optimized_layout': self._positions_to_layout(self.global_best_position, components, constraints),
+            'fitness_score': self.global_best_fitness,
+            'method': 'greedy',
+            'iterations': 0,
+            'evaluations': self.evaluations,
+            'converged': True,
+            'timed_out': False,
+            'elapsed_ms': round((time.monotonic() - started_at) * 1000, 1),
+            'improvement': 0,
+            'fitness_history': []
+        }
+    
+    def _greedy_layout(self, sizes: np.ndarray, constraints: Dict) -> np.ndarray:
+        """天际线装箱得到的组件坐标 (n, 2)，有固定组件时整体放在固定组件下方"""
+        spacing = constraints.get('min_spacing', 10)
+        positions = skyline_pack(sizes, constraints.get('canvas_width', 1200), spacing)
+        positions[:, 1] += self._obstacle_bottom(spacing)
+        return positions
+    
+    def _initial_candidates(self, components: List[Dict], sizes: np.ndarray,
+                            constraints: Dict) -> np.ndarray:
+        """放入初始种群的候选布局 (每行一个完整布局)
+        
+        热启动时先放入组件的当前布局，以及 warm_start_fraction 比例的
+        当前布局加高斯扰动 (标准差 warm_start_jitter)；greedy_seed 为真
+        (默认) 时再加入天际线装箱布局。其余个体仍随机初始化。
+        """
+        candidates = []
+        current = self._current_positions(components, constraints)
+        if current is not None:
+            fraction = constraints.get('warm_start_fraction', self.WARM_START_FRACTION)
+            jitter = constraints.get('warm_start_jitter', self.WARM_START_JITTER)
+            count = max(1, int(round(self.swarm_size * fraction)))
+            candidates.append(current.ravel())
+            for _ in range(count - 1):
+                candidates.append((current + self.rng.normal(0, jitter, current.shape)).ravel())
+        if constraints.get('greedy_seed', True):
+            candidates.append(self._greedy_layout(sizes, constraints).ravel())
+        return np.array(candidates).reshape(len(candidates), sizes.size)
+    
+    def _current_positions(self, components: List[Dict], constraints: Dict) -> Optional[np.ndarray]:
+        """热启动使用的当前坐标 (n, 2)
+        
+        warm_start: auto (默认) - 所有组件都带有 x/y 时使用; true/false 强制开启或关闭。
+        """
+        if not constraints.get('warm_start', 'auto'):
+            return None
+        try:
+            return np.array([[float(comp['x']), float(comp['y'])] for comp in components])
+        except (KeyError, TypeError, ValueError):
+            return None
+    
+    def _report_cluster_progress(self, completed: int, total: int):
+        """分层优化时按完成的阶段数报告进度 (此时没有整页的最优适应度)"""
+        if self.progress_callback is not None:
+            self.progress_callback(completed, total, None)
+    
+    def _report_progress(self, iterations: int, best_fitness: float,
+                         best_position: np.ndarray):
+        """记录当前最优解并向 progress_callback 报告进度"""
+        if self.progress_callback is not None:
+            self.global_best_fitness = best_fitness
+            self.global_best_position = best_position
+            self.progress_callback(iterations, self.max_iterations, best_fitness)
+    
+    def current_best_layout(self, components: List[Dict], constraints: Dict) -> List[Dict]:
+        """优化过程中 (例如在 progress_callback 内) 获取当前最优布局"""
+        if self.global_best_position is None:
+            return []
+        position = self.global_best_position
+        if self.pinned_mask is not None:
+            # 局部重新优化时当前最优解只包含自由组件，按请求顺序合并固定组件
+            merged = np.zeros((len(components), 2))
+            merged[self.pinned_mask] = self.obstacles[0]
+            merged[~self.pinned_mask] = position.reshape(-1, 2)
+            position = merged.ravel()
+        return self._positions_to_layout(position, components, constraints)
+    
+    def _deadline_passed(self) -> bool:
+        """是否已超过 time_budget_ms 设定的截止时间"""
+        return self.deadline is not None and time.monotonic() >= self.deadline
+    
+    def _has_converged(self, history: List[float], window: int = 10) -> bool:
+        """最近 window 轮改进很小时认为已收敛"""
+        if len(history) > window:
+            recent_improvement = history[-window] - history[-1]
+            return recent_improvement < 0.01
+        return False
+    
+    def _optimize_islands(self, components: List[Dict], sizes: np.ndarray,
+                          constraints: Dict, history: List[float]) -> int:
+        """岛模型PSO
+        
+        粒子群拆成 workers 个子群，每个子群在进程池中独立运行
+        migration_interval 轮，然后按环形拓扑把每个岛的最优粒子
+        迁移到下一个岛、替换其最差粒子。返回完成的总轮数。
+        """
+        bounds = self._layout_bounds(components, constraints)
+        island_size = max(self.MIN_ISLAND_SIZE, -(-self.swarm_size // self.workers))
+        seeds = self.rng.integers(0, 2 ** 32, self.workers)
+        islands = [
+            self._configure_swarm(SwarmEngine(bounds, island_size, np.random.default_rng(seed)))
+            for seed in seeds
+        ]
+        initial = self._initial_candidates(components, sizes, constraints)
+        if len(initial):
+            islands[0].seed(initial)
+        
+        pool = get_optimizer_pool()
+        iteration = 0
+        while iteration < self.max_iterations:
+            stop = min(iteration + self.migration_interval, self.max_iterations)
+            futures = [
+                pool.submit(_run_island_epoch, self, island, sizes, constraints,
+                            iteration, stop)
+                for island in islands
+            ]
+            results = [future.result() for future in futures]
+            islands = [island for island, _ in results]
+            self.evaluations += sum(
+                island.swarm_size * len(epoch) for island, epoch in results
+            )
+            
+            # 各轮的全局最佳为所有岛的最小值 (截止时间到达时各岛轮数可能不同)
+            completed = min(len(epoch) for _, epoch in results)
+            history.extend(
+                np.min([epoch[:completed] for _, epoch in results], axis=0).tolist()
+            )
+            iteration += completed
+            leader = min(islands, key=lambda island: island.global_best_fitness)
+            self._report_progress(
+                iteration, leader.global_best_fitness, leader.global_best_position
+            )
+            
+            # 环形迁移: 岛 i 的最优粒子替换岛 i+1 的最差粒子
+            migrants = [
+                (island.global_best_position, island.global_best_fitness)
+                for island in islands
+            ]
+            for index, island in enumerate(islands):
+                position, fitness = migrants[index - 1]
+                island.receive_migrant(position, fitness)
+            
+            if self._has_converged(history):
+                self.converged = True
+                break
+            
+            if self._deadline_passed():
+                break
+        
+        best = min(islands, key=lambda island: island.global_best_fitness)
+        self.swarm = best
+        self.global_best_fitness = best.global_best_fitness
+        self.global_best_position = best.global_best_position.copy()
+        return iteration
+    
+    def _finalize_solution(self, sizes: np.ndarray, constraints: Dict):
+        """PSO结束后的收尾: 可选的单组件局部搜索精修"""
+        local_search_steps = constraints.get('local_search_steps', 0)
+        if local_search_steps:
+            self._refine_layout(sizes, constraints, local_search_steps)
+    
+    def _refine_layout(self, sizes: np.ndarray, constraints: Dict, steps: int):
+        """基于增量适应度的局部搜索: 每步随机移动一个组件，只接受更优的移动"""
+        # 固定组件追加在最后，参与计算但不移动
+        movable = len(sizes)
+        positions, sizes = self._with_obstacles(self.global_best_position.reshape(1, -1, 2), sizes)
+        state = LayoutFitnessState(self, positions[0], sizes, constraints)
+        upper = np.maximum(state.canvas - sizes, 0)
+        step_size = constraints.get('local_search_step', 20)
+        
+        for _ in range(steps):
+            if self._deadline_passed():
+                break
+            self.evaluations += 1
+            index = int(self.rng.integers(movable))
+            candidate = state.positions[index] + self.rng.normal(0, step_size, 2)
+            candidate = np.clip(candidate, 0, upper[index])
+            if state.delta(index, *candidate) < 0:
+                state.move(index, *candidate)
+        
+        fitness = state.fitness
+        if fitness <= self.global_best_fitness:
+            self.global_best_fitness = fitness
+            self.global_best_position = state.positions[:movable].ravel().copy()
+    
+    def _configure_swarm(self, swarm: Solver) -> Solver:
+        """按搜索范围放宽粒子群的速度上限 (仅布局优化，颜色方案等其他优化不受影响)"""
+        if isinstance(swarm, SwarmEngine):
+            swarm.max_velocity = np.maximum(swarm.MAX_VELOCITY, self.MAX_VELOCITY_RATIO * swarm.span)
+        return swarm
+    
     def _initialize_particles(self, components: List[Dict], constraints: Dict):
-        """初始化粒子群"""
+        """初始化粒子群 (或 solver 指定算法的种群)"""
+        bounds = self._layout_bounds(components, constraints)
+        
+        # 创建粒子群
+        self.swarm = self._configure_swarm(create_solver(self.solver, bounds, self.swarm_size, self.rng))
+        initial = self._initial_candidates(components, self._component_sizes(components), constraints)
+        if len(initial):
+            self.swarm.seed(initial)
+    
+    def _layout_bounds(self, components: List[Dict],
+                       constraints: Dict) -> List[Tuple[float, float]]:
+        """每个组件 (x, y) 两个维度的搜索边界"""
         canvas_width = constraints.get('canvas_width', 1200)
         canvas_height = constraints.get('canvas_height', 800)
         
         # 每个组件需要2个维度 (x, y)
-        dimensions = len(components) * 2
-        
         # 设置边界
         bounds = []
         for comp in components:
@@ -157,202 +890,385 @@ class ComponentLayoutOptimizer:
             # y坐标边界  
             bounds.append((0, max(0, canvas_height - comp_height)))
         
-        # 创建粒子
-        self.particles = [
-            Particle(dimensions, bounds) 
-            for _ in range(self.swarm_size)
-        ]
+        return bounds
     
     def _evaluate_layout_fitness(self, position: np.ndarray, 
                                 components: List[Dict], constraints: Dict) -> float:
-        """评估布局质量的适应度函数"""
-        fitness = 0.0
+        """评估单个布局的适应度"""
+        sizes = self._component_sizes(components)
+        positions = np.asarray(position, dtype=float).reshape(1, -1, 2)
+        return float(self._evaluate_swarm_fitness(positions, sizes, constraints)[0])
+    
+    def _evaluate_swarm_fitness(self, positions: np.ndarray, sizes: np.ndarray,
+                                constraints: Dict) -> np.ndarray:
+        """一次评估整个粒子群的适应度
+        
+        positions: (swarm, n, 2) 组件坐标张量
+        sizes: (n, 2) 组件宽高
+        """
+        swarm_size, num_free = positions.shape[:2]
+        num_obstacles = 0 if self.obstacles is None else len(self.obstacles[1])
+        num_components = num_free + num_obstacles
+        scalable = self._use_scalable_metrics(num_components, constraints)
+        
+        if num_obstacles and not scalable:
+            # 固定组件之间的成对项已预先汇总，只计算与自由组件相关的组件对
+            num_pairs = num_free * (num_free - 1) // 2 + num_free * num_obstacles
+            evaluate = self._evaluate_against_obstacles
+        else:
+            positions, sizes = self._with_obstacles(positions, sizes)
+            if scalable:
+                num_pairs = num_components * self.SPACING_NEIGHBORS
+            else:
+                num_pairs = num_components * (num_components - 1) // 2
+            evaluate = self._evaluate_fitness_block
         
-        # 将位置向量转换为组件坐标
-        positions = []
-        for i in range(0, len(position), 2):
-            positions.append({
-                'x': position[i],
-                'y': position[i + 1]
-            })
+        # 按块评估，限制成对矩阵 (chunk × pairs) 的内存占用
+        chunk = max(1, self.PAIRWISE_CHUNK_ELEMENTS // max(1, num_pairs))
+        
+        fitness = np.empty(swarm_size)
+        for start in range(0, swarm_size, chunk):
+            block = positions[start:start + chunk]
+            fitness[start:start + chunk] = evaluate(block, sizes, constraints, scalable)
+        return fitness
+    
+    def _use_scalable_metrics(self, num_components: int, constraints: Dict) -> bool:
+        """判断是否使用可扩展 (排序/KD树) 的对齐和间距指标
+        
+        fitness_mode: exact - 始终逐对精确计算; fast - 始终使用可扩展指标;
+        auto (默认) - 组件数达到 SCALABLE_METRICS_THRESHOLD 时使用可扩展指标
+        """
+        mode = constraints.get('fitness_mode', 'auto')
+        if mode == 'exact':
+            return False
+        if mode == 'fast':
+            return True
+        return num_components >= self.SCALABLE_METRICS_THRESHOLD
+    
+    def _evaluate_fitness_block(self, positions: np.ndarray, sizes: np.ndarray,
+                                constraints: Dict, scalable: bool = False) -> np.ndarray:
+        """评估一块粒子的适应度"""
+        fitness = np.zeros(positions.shape[0])
         
         # 1. 重叠惩罚 (最重要)
-        overlap_penalty = self._calculate_overlap_penalty(positions, components)
+        overlap_penalty = self._calculate_overlap_penalty(positions, sizes)
         fitness += overlap_penalty * 1000
         
         # 2. 边界违反惩罚
         boundary_penalty = self._calculate_boundary_penalty(
-            positions, components, constraints
+            positions, sizes, constraints
         )
         fitness += boundary_penalty * 500
         
         # 3. 对齐奖励 (降低fitness值)
-        alignment_bonus = self._calculate_alignment_bonus(positions)
+        if scalable:
+            alignment_bonus = self._sorted_alignment_bonus(positions)
+        else:
+            alignment_bonus = self._calculate_alignment_bonus(positions)
         fitness -= alignment_bonus * 10
         
         # 4. 间距均匀性奖励
-        spacing_bonus = self._calculate_spacing_bonus(positions, components)
+        if scalable:
+            spacing_bonus = self._neighbor_spacing_bonus(positions, sizes)
+        else:
+            spacing_bonus = self._calculate_spacing_bonus(positions, sizes)
         fitness -= spacing_bonus * 5
         
         # 5. 视觉平衡奖励
         balance_bonus = self._calculate_visual_balance(positions, constraints)
         fitness -= balance_bonus * 20
         
-        return max(0, fitness)  # 确保fitness非负
+        return np.maximum(0, fitness)  # 确保fitness非负
+    
+    def _evaluate_against_obstacles(self, positions: np.ndarray, sizes: np.ndarray,
+                                    constraints: Dict, scalable: bool = False) -> np.ndarray:
+        """有固定组件时评估一块粒子的适应度 (精确模式) - O(f·n)
+        
+        自由组件之间、自由组件与固定组件之间的成对项逐个粒子计算，
+        加上预先汇总的固定组件之间的成对项，结果与完整计算一致。
+        """
+        obstacle_positions, obstacle_sizes = self.obstacles
+        (base_overlap, base_boundary, base_aligned, base_distance,
+         base_distance_sq, base_position) = self.obstacle_totals
+        
+        # 自由组件之间
+        pairs = self._gather_pairs(positions, sizes)
+        overlap = self._calculate_overlap_area(*pairs).sum(axis=1)
+        distances = self._min_distance_between_components(*pairs)
+        aligned = self._calculate_alignment_bonus(positions)
+        
+        # 自由组件与固定组件之间，形状 (swarm, free, obstacles)
+        cross = (
+            positions[..., 0, None], positions[..., 1, None], sizes[:, 0, None], sizes[:, 1, None],
+            obstacle_positions[:, 0], obstacle_positions[:, 1], obstacle_sizes[:, 0], obstacle_sizes[:, 1]
+        )
+        overlap += self._calculate_overlap_area(*cross).sum(axis=(1, 2))
+        cross_distances = self._min_distance_between_components(*cross)
+        deltas = np.abs(positions[:, :, None, :] - obstacle_positions)
+        aligned += np.count_nonzero(deltas <= self.ALIGNMENT_THRESHOLD, axis=(1, 2, 3))
+        
+        canvas = np.array([
+            constraints.get('canvas_width', 1200),
+            constraints.get('canvas_height', 800)
+        ], dtype=float)
+        fitness = self._fitness_from_totals(
+            positions.shape[1] + len(obstacle_sizes), canvas,
+            base_overlap + overlap,
+            base_boundary + self._calculate_boundary_penalty(positions, sizes, constraints),
+            base_aligned + aligned,
+            base_distance + distances.sum(axis=1) + cross_distances.sum(axis=(1, 2)),
+            base_distance_sq + (distances ** 2).sum(axis=1) + (cross_distances ** 2).sum(axis=(1, 2)),
+            base_position + positions.sum(axis=1)
+        )
+        return np.maximum(0, fitness)
+    
+    def _fitness_from_totals(self, num_components: int, canvas: np.ndarray,
+                             overlap_total, boundary_total, aligned_total,
+                             distance_sum, distance_sq_sum, position_sum) -> np.ndarray:
+        """由成对项和汇总量计算未截断的适应度 (各汇总量可以是按粒子的数组)"""
+        n = num_components
+        fitness = overlap_total * 1000 + boundary_total * 500
+        fitness = fitness - aligned_total * 10
+        
+        num_pairs = n * (n - 1) // 2
+        if num_pairs:
+            mean = distance_sum / num_pairs
+            variance = np.maximum(0.0, distance_sq_sum / num_pairs - mean ** 2)
+            fitness = fitness - np.maximum(0, 100 - variance) * 5
+        
+        if n:
+            offset = np.linalg.norm(position_sum / n - canvas / 2, axis=-1)
+            max_offset = np.linalg.norm(canvas) / 2
+            fitness = fitness - np.maximum(0, (max_offset - offset) / max_offset * 100) * 20
+        return fitness
     
-    def _calculate_overlap_penalty(self, positions: List[Dict], 
-                                  components: List[Dict]) -> float:
+    def _component_sizes(self, components: List[Dict]) -> np.ndarray:
+        """提取组件宽高数组 (n, 2)"""
+        return np.array([
+            [comp.get('width', 100), comp.get('height', 50)]
+            for comp in components
+        ], dtype=float).reshape(-1, 2)
+    
+    def _pair_indices(self, num_components: int) -> Tuple[np.ndarray, np.ndarray]:
+        """获取 i < j 的组件对索引 (按组件数缓存)"""
+        pairs = self._pair_index_cache.get(num_components)
+        if pairs is None:
+            pairs = np.triu_indices(num_components, k=1)
+            self._pair_index_cache[num_components] = pairs
+        return pairs
+    
+    def _gather_pairs(self, positions: np.ndarray, sizes: np.ndarray) -> Tuple:
+        """收集所有组件对的坐标和尺寸，每项形状为 (swarm, pairs)"""
+        first, second = self._pair_indices(positions.shape[1])
+        x, y = positions[..., 0], positions[..., 1]
+        return (
+            x[:, first], y[:, first], sizes[first, 0], sizes[first, 1],
+            x[:, second], y[:, second], sizes[second, 0], sizes[second, 1]
+        )
+    
+    def _calculate_overlap_penalty(self, positions: np.ndarray, 
+                                  sizes: np.ndarray) -> np.ndarray:
         """计算组件重叠惩罚"""
-        penalty = 0.0
-        
-        for i in range(len(positions)):
-            for j in range(i + 1, len(positions)):
-                comp1 = components[i]
-                comp2 = components[j]
-                pos1 = positions[i]
-                pos2 = positions[j]
-                
-                # 计算重叠面积
-                overlap_area = self._calculate_overlap_area(
-                    pos1['x'], pos1['y'], comp1.get('width', 100), comp1.get('height', 50),
-                    pos2['x'], pos2['y'], comp2.get('width', 100), comp2.get('height', 50)
-                )
-                
-                penalty += overlap_area
-        
-        return penalty
+        if positions.shape[1] >= self.BROAD_PHASE_THRESHOLD:
+            return self._sweep_and_prune_overlap(positions, sizes)
+        return self._brute_force_overlap(positions, sizes)
+    
+    def _brute_force_overlap(self, positions: np.ndarray,
+                             sizes: np.ndarray) -> np.ndarray:
+        """逐对计算重叠面积 - O(n²)"""
+        pairs = self._gather_pairs(positions, sizes)
+        return self._calculate_overlap_area(*pairs).sum(axis=1)
     
-    def _calculate_overlap_area(self, x1: float, y1: float, w1: float, h1: float,
-                               x2: float, y2: float, w2: float, h2: float) -> float:
-        """计算两个矩形的重叠面积"""
+    def _sweep_and_prune_overlap(self, positions: np.ndarray,
+                                 sizes: np.ndarray) -> np.ndarray:
+        """扫描剪枝计算重叠面积 - 只对投影区间相交的组件对做精确计算
+        
+        沿组件相对尺寸更稀疏的轴排序，每个组件只与排序后起点落在
+        自身区间内的组件组成候选对。整个粒子群通过给每个粒子加上
+        互不重叠的偏移量拼成一条轴，一次排序完成。
+        """
+        swarm_size, num_components = positions.shape[:2]
+        if num_components < 2:
+            return np.zeros(swarm_size)
+        
+        # 选择扫描轴: 坐标跨度与平均尺寸之比更大的轴候选对更少
+        extent = positions.max(axis=(0, 1)) - positions.min(axis=(0, 1))
+        axis = int(np.argmax(extent / np.maximum(sizes.mean(axis=0), 1e-9)))
+        
+        starts = positions[..., axis]
+        lengths = np.broadcast_to(sizes[:, axis], starts.shape)
+        
+        # 各粒子的区间平移到互不相交的区段
+        span = extent[axis] + sizes[:, axis].max() + 1
+        keys = (starts - starts.min()) + np.arange(swarm_size)[:, None] * span
+        order = np.argsort(keys, axis=None)
+        sorted_keys = keys.ravel()[order]
+        sorted_ends = sorted_keys + lengths.ravel()[order]
+        
+        # 每个区间之后、起点小于其终点的区间都是候选
+        stop = np.searchsorted(sorted_keys, sorted_ends, side='left')
+        counts = stop - np.arange(order.size) - 1
+        total = int(counts.sum())
+        if total == 0:
+            return np.zeros(swarm_size)
+        
+        first = np.repeat(np.arange(order.size), counts)
+        offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        second = first + 1 + offsets
+        
+        # 映射回 (粒子, 组件) 后做精确面积计算
+        first, second = order[first], order[second]
+        particle = first // num_components
+        first, second = first % num_components, second % num_components
+        xy = positions.reshape(-1, 2)
+        base = particle * num_components
+        areas = self._calculate_overlap_area(
+            xy[base + first, 0], xy[base + first, 1], sizes[first, 0], sizes[first, 1],
+            xy[base + second, 0], xy[base + second, 1], sizes[second, 0], sizes[second, 1]
+        )
+        return np.bincount(particle, weights=areas, minlength=swarm_size)
+    
+    def _calculate_overlap_area(self, x1, y1, w1, h1, x2, y2, w2, h2) -> np.ndarray:
+        """计算矩形对的重叠面积 (支持广播)"""
         # 计算重叠区域的边界
-        left = max(x1, x2)
-        right = min(x1 + w1, x2 + w2)
-        top = max(y1, y2)
-        bottom = min(y1 + h1, y2 + h2)
-        
-        # 如果有重叠
-        if left < right and top < bottom:
-            return (right - left) * (bottom - top)
+        overlap_w = np.minimum(x1 + w1, x2 + w2) - np.maximum(x1, x2)
+        overlap_h = np.minimum(y1 + h1, y2 + h2) - np.maximum(y1, y2)
         
-        return 0.0
+        # 没有重叠时面积为0
+        return np.maximum(overlap_w, 0) * np.maximum(overlap_h, 0)
     
-    def _calculate_boundary_penalty(self, positions: List[Dict], 
-                                   components: List[Dict], constraints: Dict) -> float:
+    def _calculate_boundary_penalty(self, positions: np.ndarray, 
+                                   sizes: np.ndarray, constraints: Dict) -> np.ndarray:
         """计算边界违反惩罚"""
-        penalty = 0.0
         canvas_width = constraints.get('canvas_width', 1200)
         canvas_height = constraints.get('canvas_height', 800)
+        x, y = positions[..., 0], positions[..., 1]
         
-        for i, pos in enumerate(positions):
-            comp = components[i]
-            comp_width = comp.get('width', 100)
-            comp_height = comp.get('height', 50)
-            
-            # 检查是否超出边界
-            if pos['x'] < 0:
-                penalty += abs(pos['x'])
-            if pos['y'] < 0:
-                penalty += abs(pos['y'])
-            if pos['x'] + comp_width > canvas_width:
-                penalty += pos['x'] + comp_width - canvas_width
-            if pos['y'] + comp_height > canvas_height:
-                penalty += pos['y'] + comp_height - canvas_height
-        
-        return penalty
+        # 检查是否超出边界
+        penalty = (
+            np.maximum(-x, 0) + np.maximum(-y, 0) +
+            np.maximum(x + sizes[:, 0] - canvas_width, 0) +
+            np.maximum(y + sizes[:, 1] - canvas_height, 0)
+        )
+        return penalty.sum(axis=1)
     
-    def _calculate_alignment_bonus(self, positions: List[Dict]) -> float:
+    def _calculate_alignment_bonus(self, positions: np.ndarray) -> np.ndarray:
         """计算对齐度奖励"""
-        if len(positions) < 2:
-            return 0.0
-        
-        bonus = 0.0
-        threshold = 5  # 对齐阈值
+        if positions.shape[1] < 2:
+            return np.zeros(positions.shape[0])
         
-        # 水平对齐检查
-        y_coords = [pos['y'] for pos in positions]
-        for i in range(len(y_coords)):
-            for j in range(i + 1, len(y_coords)):
-                if abs(y_coords[i] - y_coords[j]) <= threshold:
-                    bonus += 1.0
+        threshold = self.ALIGNMENT_THRESHOLD
+        first, second = self._pair_indices(positions.shape[1])
         
-        # 垂直对齐检查
-        x_coords = [pos['x'] for pos in positions]
-        for i in range(len(x_coords)):
-            for j in range(i + 1, len(x_coords)):
-                if abs(x_coords[i] - x_coords[j]) <= threshold:
-                    bonus += 1.0
-        
-        return bonus
+        # 水平对齐 (y 相近) 和垂直对齐 (x 相近) 的组件对数
+        deltas = np.abs(positions[:, first, :] - positions[:, second, :])
+        return np.count_nonzero(deltas <= threshold, axis=(1, 2)).astype(float)
+    
+    def _sorted_alignment_bonus(self, positions: np.ndarray) -> np.ndarray:
+        """排序窗口计数的对齐度奖励 - O(n log n)，结果与逐对计数相同
+        
+        坐标排序后，每个坐标之后落在 [c, c + threshold] 内的坐标个数
+        即为与它对齐的组件对数。x、y 两轴和所有粒子各自平移到互不
+        重叠的区段，拼成一条轴一次完成排序和窗口查找。
+        """
+        swarm_size, num_components = positions.shape[:2]
+        if num_components < 2:
+            return np.zeros(swarm_size)
+        
+        threshold = self.ALIGNMENT_THRESHOLD
+        rows = positions.transpose(0, 2, 1).reshape(-1, num_components)
+        lowest = rows.min()
+        span = rows.max() - lowest + threshold + 1
+        keys = (rows - lowest) + np.arange(len(rows))[:, None] * span
+        
+        # 各行区段互不重叠且递增，整体排序等价于逐行排序
+        sorted_keys = np.sort(keys, axis=None)
+        stop = np.searchsorted(sorted_keys, sorted_keys + threshold, side='right')
+        counts = stop - np.arange(sorted_keys.size) - 1
+        return counts.reshape(swarm_size, -1).sum(axis=1).astype(float)
     
-    def _calculate_spacing_bonus(self, positions: List[Dict], 
-                                components: List[Dict]) -> float:
+    def _calculate_spacing_bonus(self, positions: np.ndarray, 
+                                sizes: np.ndarray) -> np.ndarray:
         """计算间距均匀性奖励"""
-        if len(positions) < 2:
-            return 0.0
+        if positions.shape[1] < 2:
+            return np.zeros(positions.shape[0])
         
-        distances = []
-        for i in range(len(positions)):
-            for j in range(i + 1, len(positions)):
-                pos1, pos2 = positions[i], positions[j]
-                comp1, comp2 = components[i], components[j]
-                
-                # 计算组件边缘之间的最小距离
-                dist = self._min_distance_between_components(
-                    pos1, comp1, pos2, comp2
-                )
-                distances.append(dist)
-        
-        if not distances:
-            return 0.0
-        
-        # 计算距离的方差，方差越小奖励越高
-        mean_dist = np.mean(distances)
-        variance = np.var(distances)
+        # 计算组件边缘之间的最小距离
+        distances = self._min_distance_between_components(
+            *self._gather_pairs(positions, sizes)
+        )
         
         # 距离越均匀，方差越小，奖励越高
-        return max(0, 100 - variance)
+        variance = np.var(distances, axis=1)
+        return np.maximum(0, 100 - variance)
+    
+    def _neighbor_spacing_bonus(self, positions: np.ndarray,
+                                sizes: np.ndarray) -> np.ndarray:
+        """基于K近邻的间距均匀性奖励 - O(n log n)
+        
+        只统计每个组件与其 SPACING_NEIGHBORS 个最近组件 (按中心点，
+        KD树查询) 之间的边缘距离方差，替代全部组件对的距离方差。
+        所有粒子平移到互相远离的区域后共用一棵KD树。
+        """
+        swarm_size, num_components = positions.shape[:2]
+        if num_components < 2:
+            return np.zeros(swarm_size)
+        
+        neighbors = min(self.SPACING_NEIGHBORS, num_components - 1)
+        centers = positions + sizes / 2
+        
+        # 平移距离大于任一粒子内部的最大距离，近邻查询不会跨粒子
+        extent = centers.max(axis=(0, 1)) - centers.min(axis=(0, 1))
+        span = 2 * np.hypot(*extent) + 1
+        shifted = centers.copy()
+        shifted[..., 0] += np.arange(swarm_size)[:, None] * span
+        points = shifted.reshape(-1, 2)
+        
+        # 多查询一个近邻用于剔除自身 (中心重合时自身不一定排在第一位)
+        _, index = cKDTree(points).query(points, k=neighbors + 1)
+        own = np.arange(len(points))[:, None]
+        mask = (index != own).reshape(swarm_size, -1)
+        
+        xy = positions.reshape(-1, 2)
+        owner = np.broadcast_to(own, index.shape).ravel()
+        other = index.ravel()
+        first, second = owner % num_components, other % num_components
+        distances = self._min_distance_between_components(
+            xy[owner, 0], xy[owner, 1], sizes[first, 0], sizes[first, 1],
+            xy[other, 0], xy[other, 1], sizes[second, 0], sizes[second, 1]
+        ).reshape(swarm_size, -1)
+        
+        # 只对非自身的近邻距离求方差
+        counts = mask.sum(axis=1)
+        mean = np.where(mask, distances, 0).sum(axis=1) / counts
+        variance = np.where(mask, (distances - mean[:, None]) ** 2, 0).sum(axis=1) / counts
+        return np.maximum(0, 100 - variance)
     
-    def _calculate_visual_balance(self, positions: List[Dict], 
-                                 constraints: Dict) -> float:
+    def _calculate_visual_balance(self, positions: np.ndarray, 
+                                 constraints: Dict) -> np.ndarray:
         """计算视觉平衡奖励"""
-        if not positions:
-            return 0.0
+        if positions.shape[1] == 0:
+            return np.zeros(positions.shape[0])
         
         canvas_width = constraints.get('canvas_width', 1200)
         canvas_height = constraints.get('canvas_height', 800)
         
         # 计算重心
-        center_x = np.mean([pos['x'] for pos in positions])
-        center_y = np.mean([pos['y'] for pos in positions])
-        
-        # 理想重心位置（画布中心）
-        ideal_center_x = canvas_width / 2
-        ideal_center_y = canvas_height / 2
+        center = positions.mean(axis=1)
         
-        # 计算偏移
-        offset = np.sqrt(
-            (center_x - ideal_center_x) ** 2 + 
-            (center_y - ideal_center_y) ** 2
-        )
+        # 理想重心位置（画布中心）与偏移
+        ideal_center = np.array([canvas_width / 2, canvas_height / 2])
+        offset = np.linalg.norm(center - ideal_center, axis=1)
         
         # 偏移越小，奖励越高
         max_offset = np.sqrt(canvas_width ** 2 + canvas_height ** 2) / 2
-        balance_score = max(0, (max_offset - offset) / max_offset * 100)
-        
-        return balance_score
+        return np.maximum(0, (max_offset - offset) / max_offset * 100)
     
-    def _min_distance_between_components(self, pos1: Dict, comp1: Dict, 
-                                        pos2: Dict, comp2: Dict) -> float:
-        """计算两个组件之间的最小距离"""
-        x1, y1 = pos1['x'], pos1['y']
-        w1, h1 = comp1.get('width', 100), comp1.get('height', 50)
-        x2, y2 = pos2['x'], pos2['y']
-        w2, h2 = comp2.get('width', 100), comp2.get('height', 50)
-        
-        # 计算矩形边缘之间的最小距离
-        dx = max(0, max(x1 - (x2 + w2), x2 - (x1 + w1)))
-        dy = max(0, max(y1 - (y2 + h2), y2 - (y1 + h1)))
+    def _min_distance_between_components(self, x1, y1, w1, h1,
+                                        x2, y2, w2, h2) -> np.ndarray:
+        """计算组件对矩形边缘之间的最小距离 (支持广播)"""
+        dx = np.maximum(0, np.maximum(x1 - (x2 + w2), x2 - (x1 + w1)))
+        dy = np.maximum(0, np.maximum(y1 - (y2 + h2), y2 - (y1 + h1)))
         
         return np.sqrt(dx ** 2 + dy ** 2)
     
@@ -377,62 +1293,544 @@ class ComponentLayoutOptimizer:
         
         return layout
     
-    def _generate_cache_key(self, components: List[Dict], constraints: Dict) -> str:
-        """生成缓存键"""
+    # 不影响优化结果的约束，不参与缓存键 (超时的结果不会被缓存)
+    CACHE_KEY_IGNORED_CONSTRAINTS = ('time_budget_ms', 'stream_interval_ms', 'workers', 'groups')
+    
+    def _structural_features(self, components: List[Dict], constraints: Dict) -> List[Tuple]:
+        """每个组件中影响优化结果的数据
+        
+        尺寸、是否固定、坐标 (仅固定组件或热启动时) 以及在 groups 中的分组序号，
+        不包含 ID、类型和 properties。
+        """
+        sizes = self._component_sizes(components)
+        pinned = self._pinned_mask(components)
+        warm_start = self._current_positions(components, constraints) is not None
+        
+        group_of = {}
+        for index, group in enumerate(constraints.get('groups') or []):
+            for component_id in group:
+                group_of.setdefault(component_id, index)
+        
+        features = []
+        for i, comp in enumerate(components):
+            position = (float(comp['x']), float(comp['y'])) if pinned[i] or warm_start else ()
+            group = group_of.get(comp.get('id', f'comp_{i}'), -1)
+            features.append((tuple(sizes[i].tolist()), bool(pinned[i]), position, group))
+        return features
+    
+    def _canonical_order(self, components: List[Dict], constraints: Dict) -> List[int]:
+        """按结构特征排序后的组件下标，特征相同的组件可以互换"""
+        features = self._structural_features(components, constraints)
+        return sorted(range(len(components)), key=lambda i: features[i])
+    
+    def _generate_cache_key(self, components: List[Dict], constraints: Dict,
+                            order: List[int]) -> str:
+        """生成结构化缓存键
+        
+        按 order 排列组件的结构特征，parent_id 按首次出现的顺序重新编号，
+        因此组件顺序、ID和属性不同但矩形相同的页面 (例如同一模板) 共享缓存。
+        """
+        features = self._structural_features(components, constraints)
+        parents = {}
+        canonical = []
+        for i in order:
+            parent = components[i].get('parent_id')
+            label = None if parent is None else parents.setdefault(parent, len(parents))
+            canonical.append(list(features[i]) + [label])
+        
         data = {
-            'components': components,
-            'constraints': constraints,
-            'version': '1.0'
+            'components': canonical,
+            'constraints': {
+                key: value for key, value in constraints.items()
+                if key not in self.CACHE_KEY_IGNORED_CONSTRAINTS
+            },
+            'optimizer': type(self).__name__,
+            'version': '2.0'
         }
         json_str = json.dumps(data, sort_keys=True)
         return hashlib.md5(json_str.encode()).hexdigest()
     
-    def _get_cached_result(self, cache_key: str, cache_type: str) -> Optional[Dict]:
-        """获取缓存结果"""
-        try:
-            cache_entry = AICache.objects.get(
-                cache_type=cache_type,
-                input_hash=cache_key
-            )
-            # 更新命中次数和最后使用时间
-            cache_entry.hit_count += 1
-            cache_entry.last_used = timezone.now()
-            cache_entry.save()
-            
-            return cache_entry.result_data
-        except AICache.DoesNotExist:
-            return None
+    def _cacheable_result(self, result: Dict, order: List[int]) -> Dict:
+        """缓存用的结果: 布局只保存按 order 排列的坐标，不含调用方的组件ID和属性"""
+        layout = result['optimized_layout']
+        cached = {key: value for key, value in result.items() if key != 'optimized_layout'}
+        cached['positions'] = [[float(layout[i]['x']), float(layout[i]['y'])] for i in order]
+        return cached
+    
+    def _restore_cached_result(self, cached: Dict, components: List[Dict],
+                               constraints: Dict, order: List[int]) -> Dict:
+        """把缓存的坐标按 order 放回调用方的组件上"""
+        position = np.zeros((len(components), 2))
+        position[order] = cached['positions']
+        result = {key: value for key, value in cached.items() if key != 'positions'}
+        result['optimized_layout'] = self._positions_to_layout(position.ravel(), components, constraints)
+        return result
+
+
+class LayoutFitnessState:
+    """增量适应度状态 - 单个组件移动时以 O(n) 更新适应度
+    
+    保存每对组件的重叠面积、x/y 对齐标记和边缘距离，以及边界惩罚、
+    距离和/平方和、坐标和等汇总量。移动一个组件只需重算它所在的
+    一行成对项，结果与精确模式 (fitness_mode=exact) 的完整计算一致。
+    """
+    
+    def __init__(self, optimizer: 'ComponentLayoutOptimizer', positions: np.ndarray,
+                 sizes: np.ndarray, constraints: Dict):
+        self.optimizer = optimizer
+        self.positions = np.array(positions, dtype=float).reshape(-1, 2)
+        self.sizes = np.asarray(sizes, dtype=float).reshape(-1, 2)
+        self.constraints = constraints
+        self.canvas = np.array([
+            constraints.get('canvas_width', 1200),
+            constraints.get('canvas_height', 800)
+        ], dtype=float)
+        self.recompute()
+    
+    @property
+    def num_components(self) -> int:
+        return len(self.positions)
+    
+    def recompute(self):
+        """从头重建所有成对项和汇总量"""
+        n = self.num_components
+        self.overlap = np.zeros((n, n))
+        self.aligned = np.zeros((n, n, 2), dtype=bool)
+        self.distance = np.zeros((n, n))
+        for index in range(n):
+            overlap, aligned, distance = self._pair_terms(index, self.positions[index])
+            self.overlap[index] = overlap
+            self.aligned[index] = aligned
+            self.distance[index] = distance
+        
+        self.boundary = self._boundary_terms(self.positions)
+        
+        # 成对矩阵对称，汇总量只计 i < j 的一半
+        self.overlap_total = self.overlap.sum() / 2
+        self.aligned_total = int(self.aligned.sum()) // 2
+        self.distance_sum = self.distance.sum() / 2
+        self.distance_sq_sum = (self.distance ** 2).sum() / 2
+        self.position_sum = self.positions.sum(axis=0)
+    
+    def _pair_terms(self, index: int, position: np.ndarray) -> Tuple:
+        """计算组件 index 位于 position 时与其他所有组件的成对项"""
+        x, y = position
+        w, h = self.sizes[index]
+        others, other_sizes = self.positions, self.sizes
+        
+        overlap = self.optimizer._calculate_overlap_area(
+            x, y, w, h, others[:, 0], others[:, 1], other_sizes[:, 0], other_sizes[:, 1]
+        )
+        aligned = np.abs(others - position) <= self.optimizer.ALIGNMENT_THRESHOLD
+        distance = self.optimizer._min_distance_between_components(
+            x, y, w, h, others[:, 0], others[:, 1], other_sizes[:, 0], other_sizes[:, 1]
+        )
+        
+        # 组件与自身不构成组件对
+        overlap[index] = 0
+        aligned[index] = False
+        distance[index] = 0
+        return overlap, aligned, distance
+    
+    def _boundary_terms(self, positions: np.ndarray, sizes: np.ndarray = None) -> np.ndarray:
+        """每个组件的边界违反量"""
+        sizes = self.sizes if sizes is None else sizes
+        overflow = np.maximum(-positions, 0) + np.maximum(positions + sizes - self.canvas, 0)
+        return overflow.sum(axis=-1)
+    
+    def _raw_fitness(self, overlap_total: float, boundary_total: float,
+                     aligned_total: int, distance_sum: float,
+                     distance_sq_sum: float, position_sum: np.ndarray) -> float:
+        """由汇总量计算未截断的适应度"""
+        return float(self.optimizer._fitness_from_totals(
+            self.num_components, self.canvas, overlap_total, boundary_total,
+            aligned_total, distance_sum, distance_sq_sum, position_sum
+        ))
+    
+    @property
+    def raw_fitness(self) -> float:
+        return self._raw_fitness(
+            self.overlap_total, self.boundary.sum(), self.aligned_total,
+            self.distance_sum, self.distance_sq_sum, self.position_sum
+        )
     
-    def _cache_result(self, cache_key: str, cache_type: str, result: Dict):
-        """缓存结果"""
+    @property
+    def fitness(self) -> float:
+        """当前布局的适应度 (与 _evaluate_layout_fitness 相同)"""
+        return max(0.0, self.raw_fitness)
+    
+    def _moved_totals(self, index: int, position: np.ndarray) -> Tuple:
+        """组件 index 移动到 position 后的成对项和汇总量"""
+        overlap, aligned, distance = self._pair_terms(index, position)
+        old_position = self.positions[index]
+        old_boundary = self.boundary[index]
+        new_boundary = self._boundary_terms(position, self.sizes[index])
+        
+        totals = (
+            self.overlap_total - self.overlap[index].sum() + overlap.sum(),
+            self.boundary.sum() - old_boundary + new_boundary,
+            self.aligned_total - int(self.aligned[index].sum()) + int(aligned.sum()),
+            self.distance_sum - self.distance[index].sum() + distance.sum(),
+            self.distance_sq_sum - (self.distance[index] ** 2).sum() + (distance ** 2).sum(),
+            self.position_sum - old_position + position,
+        )
+        return (overlap, aligned, distance, new_boundary), totals
+    
+    def delta(self, index: int, x: float, y: float) -> float:
+        """组件 index 移动到 (x, y) 后未截断适应度的变化量 (不修改状态)"""
+        _, totals = self._moved_totals(index, np.array([x, y], dtype=float))
+        return self._raw_fitness(*totals) - self.raw_fitness
+    
+    def move(self, index: int, x: float, y: float) -> float:
+        """将组件 index 移动到 (x, y)，返回新的适应度"""
+        position = np.array([x, y], dtype=float)
+        (overlap, aligned, distance, boundary), totals = self._moved_totals(index, position)
+        
+        # 更新第 index 行和第 index 列
+        self.overlap[index], self.overlap[:, index] = overlap, overlap
+        self.aligned[index], self.aligned[:, index] = aligned, aligned
+        self.distance[index], self.distance[:, index] = distance, distance
+        self.boundary[index] = boundary
+        self.positions[index] = position
+        (self.overlap_total, _, self.aligned_total, self.distance_sum,
+         self.distance_sq_sum, self.position_sum) = totals
+        return self.fitness
+    
+    def full_fitness(self) -> float:
+        """用完整的精确计算重新评估当前布局，用于一致性校验"""
+        constraints = {**self.constraints, 'fitness_mode': 'exact'}
+        return float(self.optimizer._evaluate_swarm_fitness(
+            self.positions[None], self.sizes, constraints
+        )[0])
+
+
+class GridLayoutOptimizer(ComponentLayoutOptimizer):
+    """网格布局PSO优化器 - 直接在页面网格上搜索整数坐标
+    
+    组件使用 layout_config 中的网格单位 (x, y, w, h)，粒子位置取整后
+    用占用位图检测重叠。搜索空间远小于像素模式，结果可以直接写回
+    layout_config。
+    """
+    
+    # 默认网格列数 (与编辑器的网格布局一致)
+    DEFAULT_GRID_COLUMNS = 12
+    
+    # 热启动扰动的标准差 (格)
+    WARM_START_JITTER = 1
+    
+    def optimize_layout(self, components: List[Dict], constraints: Dict,
+                        progress_callback: Optional[Callable] = None) -> Dict:
+        """在网格上优化组件布局，未指定 grid_rows 时按组件总面积估算"""
+        constraints = dict(constraints)
+        constraints.setdefault('grid_columns', self.DEFAULT_GRID_COLUMNS)
+        if not constraints.get('grid_rows'):
+            constraints['grid_rows'] = self._default_grid_rows(components, constraints)
+        return super().optimize_layout(components, constraints, progress_callback)
+    
+    def _default_grid_rows(self, components: List[Dict], constraints: Dict) -> int:
+        """默认行数: 组件总面积平铺所需行数的 1.5 倍，且不小于最高的组件"""
+        sizes = self._component_sizes(components)
+        columns = constraints['grid_columns']
+        packed_rows = math.ceil(sizes.prod(axis=1).sum() / columns * 1.5)
+        return int(max(packed_rows, sizes[:, 1].max(initial=1)))
+    
+    def _component_sizes(self, components: List[Dict]) -> np.ndarray:
+        """提取组件网格宽高 (n, 2)"""
+        return np.array([
+            [max(1, int(comp.get('w', 2))), max(1, int(comp.get('h', 1)))]
+            for comp in components
+        ], dtype=float).reshape(-1, 2)
+    
+    def _layout_bounds(self, components: List[Dict],
+                       constraints: Dict) -> List[Tuple[float, float]]:
+        """每个组件网格坐标 (x, y) 的搜索边界"""
+        columns, rows = constraints['grid_columns'], constraints['grid_rows']
+        bounds = []
+        for width, height in self._component_sizes(components):
+            bounds.append((0, max(0, columns - width)))
+            bounds.append((0, max(0, rows - height)))
+        return bounds
+    
+    def _evaluate_swarm_fitness(self, positions: np.ndarray, sizes: np.ndarray,
+                                constraints: Dict) -> np.ndarray:
+        """一次评估整个粒子群的网格布局适应度
+        
+        1. 重叠格子数 (占用位图中被多个组件覆盖的格子)
+        2. 页面占用高度，越矮越紧凑
+        3. 组件纵向/横向坐标之和，使组件向左上方靠拢、行列整齐
+        """
+        positions, sizes = self._with_obstacles(positions, sizes)
+        cells = np.rint(positions).astype(int)
+        widths, heights = sizes[:, 0].astype(int), sizes[:, 1].astype(int)
+        
+        occupancy = self._occupancy_bitmap(cells, widths, heights, constraints)
+        overlap_cells = np.maximum(occupancy - 1, 0).sum(axis=(1, 2))
+        
+        bottom = (cells[..., 1] + heights).max(axis=1)
+        gravity = cells[..., 1].sum(axis=1) + 0.1 * cells[..., 0].sum(axis=1)
+        
+        return overlap_cells * 1000.0 + bottom * 10.0 + gravity
+    
+    def _occupancy_bitmap(self, cells: np.ndarray, widths: np.ndarray,
+                          heights: np.ndarray, constraints: Dict) -> np.ndarray:
+        """用二维差分数组计算每个格子被多少个组件覆盖，形状 (swarm, rows, columns)"""
+        swarm_size = cells.shape[0]
+        x, y = cells[..., 0], cells[..., 1]
+        
+        # 整理后的组件可能顺延到 grid_rows 以下
+        rows = int(max(constraints['grid_rows'], (y + heights).max(initial=1))) + 1
+        columns = int(max(constraints['grid_columns'], (x + widths).max(initial=1))) + 1
+        
+        base = np.arange(swarm_size)[:, None] * rows * columns
+        
+        # 矩形四个角在差分数组上分别 +1/-1/-1/+1
+        corners = np.concatenate([
+            (base + y * columns + x).ravel(),
+            (base + y * columns + x + widths).ravel(),
+            (base + (y + heights) * columns + x).ravel(),
+            (base + (y + heights) * columns + x + widths).ravel(),
+        ])
+        signs = np.repeat([1, -1, -1, 1], cells.shape[0] * cells.shape[1])
+        
+        diff = np.bincount(corners, weights=signs, minlength=swarm_size * rows * columns)
+        diff = diff.reshape(swarm_size, rows, columns)
+        return diff.cumsum(axis=1).cumsum(axis=2)[:, :-1, :-1]
+    
+    def _greedy_layout(self, sizes: np.ndarray, constraints: Dict) -> np.ndarray:
+        """在 grid_columns 列宽上做天际线装箱 (网格单位，无额外间距)"""
+        positions = skyline_pack(sizes, constraints['grid_columns'])
+        positions[:, 1] += self._obstacle_bottom(0)
+        return positions
+    
+    def _should_decompose(self, components: List[Dict], constraints: Dict) -> bool:
+        """网格模式的搜索空间已经很小，不做分层优化"""
+        return False
+    
+    def _finalize_solution(self, sizes: np.ndarray, constraints: Dict):
+        """PSO结束后消除剩余重叠，保证结果可以直接写回 layout_config"""
+        cells = self._legalize(
+            np.rint(self.global_best_position.reshape(-1, 2)).astype(int),
+            sizes.astype(int), constraints
+        )
+        self.global_best_position = cells.ravel().astype(float)
+        self.global_best_fitness = float(self._evaluate_swarm_fitness(
+            cells[None].astype(float), sizes, constraints
+        )[0])
+    
+    def _legalize(self, cells: np.ndarray, sizes: np.ndarray,
+                  constraints: Dict) -> np.ndarray:
+        """按 (y, x) 顺序依次放置组件，每个组件上移到所在列范围内第一个空位
+        
+        与编辑器网格的纵向压缩一致: 组件保持列位置，只在纵向移动，
+        放不下时向下顺延，因此结果一定没有重叠。
+        """
+        columns = int(max(constraints['grid_columns'], sizes[:, 0].max(initial=1)))
+        occupied = np.zeros(
+            (int(constraints['grid_rows'] + sizes[:, 1].sum() + self._obstacle_bottom(0)), columns),
+            dtype=bool
+        )
+        
+        # 固定组件的格子预先占用
+        if self.obstacles is not None:
+            for (x, y), (width, height) in zip(*self.obstacles):
+                occupied[int(y):int(y + height), int(x):int(x + width)] = True
+        
+        legalized = cells.copy()
+        for index in np.lexsort((cells[:, 0], cells[:, 1])):
+            x = int(cells[index, 0])
+            width, height = sizes[index]
+            row = 0
+            while occupied[row:row + height, x:x + width].any():
+                row += 1
+            occupied[row:row + height, x:x + width] = True
+            legalized[index, 1] = row
+        return legalized
+    
+    def _positions_to_layout(self, position: np.ndarray,
+                            components: List[Dict], constraints: Dict) -> List[Dict]:
+        """将粒子位置转换为 layout_config 格式的组件 (网格单位)"""
+        cells = np.rint(np.asarray(position).reshape(-1, 2)).astype(int)
+        sizes = self._component_sizes(components).astype(int)
+        
+        layout = []
+        for i, comp in enumerate(components):
+            item = dict(comp)
+            item.update({
+                'id': comp.get('id', f'comp_{i}'),
+                'x': int(cells[i, 0]),
+                'y': int(cells[i, 1]),
+                'w': int(sizes[i, 0]),
+                'h': int(sizes[i, 1])
+            })
+            layout.append(item)
+        return layout
+
+
+def create_layout_optimizer(constraints: Dict) -> ComponentLayoutOptimizer:
+    """按约束中的 mode 创建像素 (默认) 或网格 (mode=grid) 布局优化器"""
+    optimizer_class = GridLayoutOptimizer if constraints.get('mode') == 'grid' else ComponentLayoutOptimizer
+    return optimizer_class.from_constraints(constraints)
+
+
+def _positive_number(constraints: Dict, key: str, allow_zero: bool = False) -> Optional[float]:
+    """读取约束中的正数 (可以是数字字符串)，未提供时返回 None，不合法时抛出 InvalidLayoutConstraints"""
+    value = constraints.get(key)
+    if value is None:
+        return None
+    try:
+        if isinstance(value, bool):
+            raise ValueError
+        number = float(value)
+    except (TypeError, ValueError):
+        raise InvalidLayoutConstraints(f'{key} 必须是数字: {value!r}')
+    if not math.isfinite(number) or number < 0 or (number == 0 and not allow_zero):
+        raise InvalidLayoutConstraints(f'{key} 必须大于 0: {value!r}')
+    return number
+
+
+def build_layout_constraints(constraints: Dict) -> Dict:
+    """合并默认约束，并把 time_budget_ms 限制在 AI_OPTIMIZER_MAX_TIME_BUDGET_MS 以内
+    
+    constraints 不是对象、time_budget_ms 不是正数或 stream_interval_ms 为负数、
+    非数字时抛出 InvalidLayoutConstraints; stream_interval_ms 不小于 MIN_STREAM_INTERVAL_MS。
+    """
+    if constraints is not None and not isinstance(constraints, dict):
+        raise InvalidLayoutConstraints('constraints 必须是对象')
+    merged = dict(DEFAULT_LAYOUT_CONSTRAINTS)
+    merged.update(constraints or {})
+    
+    max_budget = settings.AI_OPTIMIZER_MAX_TIME_BUDGET_MS
+    time_budget_ms = _positive_number(merged, 'time_budget_ms') or max_budget
+    merged['time_budget_ms'] = max(1, min(int(time_budget_ms), max_budget))
+    
+    stream_interval_ms = _positive_number(merged, 'stream_interval_ms', allow_zero=True)
+    if stream_interval_ms is None:
+        stream_interval_ms = DEFAULT_LAYOUT_CONSTRAINTS['stream_interval_ms']
+    merged['stream_interval_ms'] = max(stream_interval_ms, MIN_STREAM_INTERVAL_MS)
+    return merged
+
+
+def record_layout_history(user, project_id, page_id, components: List[Dict],
+                          constraints: Dict, result: Dict) -> Optional[OptimizationHistory]:
+    """保存布局优化历史，项目或页面不属于该用户时跳过
+    
+    输入和结果按内容哈希保存在 AIResultBlob 中，重复的请求 (例如命中缓存) 只写入一行历史。
+    """
+    if not project_id:
+        return None
+    try:
+        project = Project.objects.get(id=project_id, owner=user)
+        page = None
+        if page_id:
+            page = Page.objects.get(id=page_id, project=project)
+    except (Project.DoesNotExist, Page.DoesNotExist):
+        return None  # 不影响主要功能
+    
+    input_hash, output_hash = store_result_blobs(
+        {'components': components, 'constraints': constraints}, result
+    )
+    with transaction.atomic():
+        history = OptimizationHistory.objects.create(
+            project=project,
+            page=page,
+            optimization_type='PSO',
+            input_blob_id=input_hash,
+            output_blob_id=output_hash,
+            performance_metrics={
+                'fitness_score': result.get('fitness_score', 0),
+                'iterations': result.get('iterations', 0),
+                'evaluations': result.get('evaluations', 0),
+                'converged': result.get('converged', False),
+                'elapsed_ms': result.get('elapsed_ms', 0),
+                'improvement': result.get('improvement', 0)
+            },
+            user=user
+        )
+        increment_usage({OPTIMIZATION_COUNTER.format(history.optimization_type): 1}, user.id)
+    return history
+
+
+def build_batch_page_constraints(global_constraints: Dict, page_data: Dict) -> Dict:
+    """批量优化中单个页面的约束: 页面约束覆盖全局约束，再按单页请求的规则合并默认值"""
+    page_constraints = page_data.get('constraints') or {}
+    if not isinstance(global_constraints or {}, dict) or not isinstance(page_constraints, dict):
+        raise InvalidLayoutConstraints('constraints 必须是对象')
+    return build_layout_constraints({**(global_constraints or {}), **page_constraints})
+
+
+def optimize_layout_batch(pages_data: List[Dict], global_constraints: Dict,
+                          progress_callback: Optional[Callable] = None) -> List[Dict]:
+    """批量优化多个页面的布局
+    
+    progress_callback 以 (已完成页面数, 页面总数) 调用，已完成页面数
+    包含当前页面按迭代轮数折算的部分。
+    """
+    results = []
+    
+    for index, page_data in enumerate(pages_data):
+        page_id = page_data.get('page_id')
+        components = page_data.get('components', [])
+        page_constraints = build_batch_page_constraints(global_constraints, page_data)
+        optimizer = create_layout_optimizer(page_constraints)
+        
+        page_progress = None
+        if progress_callback is not None:
+            def page_progress(iterations, max_iterations, best_fitness, index=index):
+                progress_callback(index + iterations / max(1, max_iterations), len(pages_data))
+        
         try:
-            AICache.objects.create(
-                cache_type=cache_type,
-                input_hash=cache_key,
-                result_data=result
-            )
+            result = optimizer.optimize_layout(components, page_constraints, page_progress)
+            results.append({
+                'page_id': page_id,
+                'success': True,
+                'result': result
+            })
+        except OptimizationCancelled:
+            raise
         except Exception as e:
-            # 缓存失败不影响主要功能
-            print(f"Cache save failed: {e}")
+            results.append({
+                'page_id': page_id,
+                'success': False,
+                'error': str(e)
+            })
+        
+        if progress_callback is not None:
+            progress_callback(index + 1, len(pages_data))
+    
+    return results
+
+
+def summarize_layout_batch(results: List[Dict]) -> Dict:
+    """批量优化结果汇总"""
+    successful_count = sum(1 for r in results if r['success'])
+    return {
+        'total_pages': len(results),
+        'successful_optimizations': successful_count,
+        'failed_optimizations': len(results) - successful_count
+    }
 
 
 class ColorSchemeOptimizer:
-    """颜色方案PSO优化器"""
+    """颜色方案优化器 (默认PSO，solver 可选 cmaes/de/sa)"""
     
-    def __init__(self, swarm_size: int = 20, max_iterations: int = 50):
+    def __init__(self, swarm_size: int = 20, max_iterations: int = 50,
+                 solver: str = 'pso', seed: Optional[int] = None):
+        if solver not in SOLVERS:
+            raise ValueError(f"不支持的优化算法: {solver}，可选: {', '.join(SOLVERS)}")
         self.swarm_size = swarm_size
         self.max_iterations = max_iterations
+        self.solver = solver
+        self.rng = np.random.default_rng(seed)
     
     def optimize_color_scheme(self, base_color: str, 
                              requirements: Dict) -> Dict:
-        """使用PSO优化颜色方案"""
+        """优化颜色方案"""
         
         # 将基础颜色转换为HSL
         base_hsl = self._hex_to_hsl(base_color)
         
-        # 初始化粒子群 (H, S, L for each color in palette)
+        # 初始化种群 (H, S, L for each color in palette)
         num_colors = requirements.get('num_colors', 5)
-        dimensions = num_colors * 3  # HSL for each color
         
         # 设置边界
         bounds = []
@@ -443,39 +1841,25 @@ class ColorSchemeOptimizer:
                 (0, 100)     # Lightness
             ])
         
-        particles = [Particle(dimensions, bounds) for _ in range(self.swarm_size)]
-        global_best_position = None
-        global_best_fitness = float('inf')
+        solver = create_solver(self.solver, bounds, self.swarm_size, self.rng)
         
-        # PSO主循环
+        # 优化主循环
         for iteration in range(self.max_iterations):
-            for particle in particles:
-                fitness = self._evaluate_color_fitness(
-                    particle.position, base_hsl, requirements
-                )
-                particle.current_fitness = fitness
-                
-                if fitness < particle.best_fitness:
-                    particle.best_fitness = fitness
-                    particle.best_position = particle.position.copy()
-                
-                if fitness < global_best_fitness:
-                    global_best_fitness = fitness
-                    global_best_position = particle.position.copy()
-            
-            # 更新粒子
-            w = 0.9 - (0.5 * iteration / self.max_iterations)
-            for particle in particles:
-                particle.update_velocity(global_best_position, w)
-                particle.update_position()
+            candidates = solver.ask()
+            fitness = np.array([
+                self._evaluate_color_fitness(candidate, base_hsl, requirements)
+                for candidate in candidates
+            ])
+            solver.tell(fitness, iteration / self.max_iterations)
         
         # 生成最终配色方案
-        color_scheme = self._position_to_colors(global_best_position, num_colors)
+        color_scheme = self._position_to_colors(solver.global_best_position, num_colors)
         
         return {
             'colors': color_scheme,
-            'fitness_score': global_best_fitness,
+            'fitness_score': solver.global_best_fitness,
             'base_color': base_color,
+            'solver': self.solver,
             'accessibility_score': self._calculate_accessibility_score(color_scheme)
         }
     
@@ -0,0 +1,194 @@
+"""
+AI历史数据保留策略
+超过保留期的 OptimizationHistory 和 NLPTrainingData 记录按批处理: 先导出为 gzip 压缩的
+JSONL 归档文件，再在同一事务中累加到 AIUsageRollup 每日统计并删除; 记录转入汇总后
+AIUsageCounter 计数保持不变，删除时不逐行更新计数器。
+每批以 id 范围命名归档文件，中断后重新执行会覆盖同名文件，不会重复统计。
+"""
+
+import gzip
+import json
+import os
+from datetime import timedelta
+from typing import Dict, List
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .ai_usage import keep_counters_on_delete
+from .models import AIResultBlob, AIUsageRollup, NLPTrainingData, OptimizationHistory
+
+
+def _history_rows(ids: List[int]) -> List[Dict]:
+    records = OptimizationHistory.objects.filter(id__in=ids).select_related(
+        'input_blob', 'output_blob'
+    ).order_by('id')
+    return [
+        {
+            'id': record.id,
+            'project_id': record.project_id,
+            'page_id': record.page_id,
+            'optimization_type': record.optimization_type,
+            'input_data': record.input_data,
+            'output_data': record.output_data,
+            'performance_metrics': record.performance_metrics,
+            'user_id': record.user_id,
+            'created_at': record.created_at.isoformat(),
+        }
+        for record in records
+    ]
+
+
+def _training_rows(ids: List[int]) -> List[Dict]:
+    records = NLPTrainingData.objects.filter(id__in=ids).order_by('id')
+    return [
+        {
+            'id': record.id,
+            'description': record.description,
+            'generated_component': record.generated_component,
+            'user_feedback': record.user_feedback,
+            'is_correct': record.is_correct,
+            'corrected_component': record.corrected_component,
+            'created_by_id': record.created_by_id,
+            'created_at': record.created_at.isoformat(),
+        }
+        for record in records
+    ]
+
+
+def _history_rollups(ids: List[int]):
+    return OptimizationHistory.objects.filter(id__in=ids).values(
+        'user_id', 'optimization_type', day=TruncDate('created_at')
+    ).annotate(count=Count('id')).values_list('day', 'user_id', 'optimization_type', 'count')
+
+
+def _training_rollups(ids: List[int]):
+    return NLPTrainingData.objects.filter(id__in=ids).values(
+        'created_by_id', day=TruncDate('created_at')
+    ).annotate(
+        count=Count('id'),
+        positive=Count('id', filter=Q(user_feedback__gte=4)),
+        corrections=Count('id', filter=Q(corrected_component__isnull=False)),
+    ).values_list('day', 'created_by_id', 'count', 'positive', 'corrections')
+
+
+def _add_rollup(day, user_id, source: str, category: str, count: int,
+                positive_feedback: int = 0, corrections: int = 0):
+    rollup = AIUsageRollup.objects.filter(day=day, user_id=user_id, source=source, category=category)
+    increments = {
+        'count': F('count') + count,
+        'positive_feedback': F('positive_feedback') + positive_feedback,
+        'corrections': F('corrections') + corrections,
+    }
+    if not rollup.update(**increments):
+        try:
+            with transaction.atomic():
+                AIUsageRollup.objects.create(
+                    day=day, user_id=user_id, source=source, category=category, count=count,
+                    positive_feedback=positive_feedback, corrections=corrections
+                )
+        except IntegrityError:
+            # 并发执行的任务创建了同一天的汇总行
+            rollup.update(**increments)
+
+
+def _write_archive(archive_dir: str, name: str, rows: List[Dict]) -> str:
+    """写入 gzip JSONL 归档 (先写临时文件再改名，避免留下不完整的文件)"""
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f'{name}.jsonl.gz')
+    temp_path = f'{path}.tmp'
+    with gzip.open(temp_path, 'wt', encoding='utf-8') as archive:
+        for row in rows:
+            archive.write(json.dumps(row, ensure_ascii=False) + '\n')
+    os.replace(temp_path, path)
+    return path
+
+
+def _archive_table(model, name: str, cutoff, archive_dir: str, batch_size: int,
+                   export_rows, apply_rollups) -> Dict:
+    """分批归档、汇总并删除 cutoff 之前的记录，返回 {'rows', 'files'}"""
+    totals = {'rows': 0, 'files': []}
+    while True:
+        with transaction.atomic():
+            # 锁定本批记录，并发执行的任务会跳过它们
+            ids = list(
+                model.objects.filter(created_at__lt=cutoff).order_by('id')
+                .select_for_update(skip_locked=True).values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                return totals
+
+            rows = export_rows(ids)
+            day = rows[0]['created_at'][:10]
+            totals['files'].append(_write_archive(
+                os.path.join(archive_dir, name), f'{day}_{ids[0]}-{ids[-1]}', rows
+            ))
+            apply_rollups(ids)
+            # 本批记录已计入汇总，计数器不变
+            with keep_counters_on_delete():
+                model.objects.filter(id__in=ids).delete()
+        totals['rows'] += len(ids)
+
+
+def _apply_history_rollups(ids: List[int]):
+    for day, user_id, optimization_type, count in _history_rollups(ids):
+        _add_rollup(day, user_id, 'OPTIMIZATION', optimization_type, count)
+
+
+def _apply_training_rollups(ids: List[int]):
+    for day, user_id, count, positive, corrections in _training_rollups(ids):
+        _add_rollup(day, user_id, 'NLP', '', count, positive, corrections)
+
+
+def delete_unreferenced_blobs(cutoff, batch_size: int) -> int:
+    """删除 cutoff 之前创建 (或最后复用)、已不被任何历史记录引用的 AIResultBlob
+    
+    store_result_blobs 复用已有数据时会刷新 created_at，删除时重新检查条件，
+    选出后又被复用或引用的数据不会被删除。
+    """
+    unreferenced = (
+        AIResultBlob.objects.filter(created_at__lt=cutoff)
+        .exclude(pk__in=OptimizationHistory.objects.values('input_blob'))
+        .exclude(pk__in=OptimizationHistory.objects.values('output_blob'))
+    )
+    deleted = 0
+    while True:
+        ids = list(unreferenced.values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += unreferenced.filter(pk__in=ids).delete()[0]
+
+
+def count_expired_records(retention_days: int = None) -> Dict[str, int]:
+    """统计超过保留期的记录数"""
+    retention_days = settings.AI_RETENTION_DAYS if retention_days is None else retention_days
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    return {
+        'optimization_history': OptimizationHistory.objects.filter(created_at__lt=cutoff).count(),
+        'nlp_training_data': NLPTrainingData.objects.filter(created_at__lt=cutoff).count(),
+    }
+
+
+def apply_retention(retention_days: int = None, archive_dir: str = None,
+                    batch_size: int = None) -> Dict[str, Dict]:
+    """对 OptimizationHistory 和 NLPTrainingData 执行保留策略，返回各表处理的行数和归档文件"""
+    retention_days = settings.AI_RETENTION_DAYS if retention_days is None else retention_days
+    archive_dir = archive_dir or settings.AI_ARCHIVE_DIR
+    batch_size = batch_size or settings.AI_RETENTION_BATCH_SIZE
+    cutoff = timezone.now() - timedelta(days=retention_days)
+
+    results = {
+        'optimization_history': _archive_table(
+            OptimizationHistory, 'optimization_history', cutoff, archive_dir, batch_size,
+            _history_rows, _apply_history_rollups
+        ),
+        'nlp_training_data': _archive_table(
+            NLPTrainingData, 'nlp_training_data', cutoff, archive_dir, batch_size,
+            _training_rows, _apply_training_rollups
+        ),
+    }
+    results['result_blobs'] = {'rows': delete_unreferenced_blobs(cutoff, batch_size), 'files': []}
+    return results
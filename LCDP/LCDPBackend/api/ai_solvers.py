@@ -0,0 +1,359 @@
+"""
+AI优化算法模块 - 布局和配色优化共用的批量黑盒最小化算法
+
+所有算法实现相同的 ask/tell 接口: ask() 返回本轮待评估的候选解矩阵
+(population × dims)，调用方批量计算适应度后通过 tell() 交回，
+因此各算法共享同一个适应度函数，可以按名称互相替换。
+"""
+
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+
+class Solver:
+    """批量黑盒最小化算法的公共接口"""
+
+    name = None
+
+    # 连续多少轮全局最佳几乎没有改进时认为已收敛
+    CONVERGENCE_WINDOW = 50
+
+    def __init__(self, bounds: List[Tuple[float, float]], population_size: int,
+                 rng: Optional[np.random.Generator] = None):
+        self.rng = rng if rng is not None else np.random.default_rng()
+        bounds = np.asarray(bounds, dtype=float).reshape(-1, 2)
+        self.lower = bounds[:, 0]
+        self.upper = bounds[:, 1]
+        self.span = self.upper - self.lower
+        self.dimensions = len(bounds)
+        self.population_size = population_size
+
+        # 全局最佳
+        self.global_best_position = None
+        self.global_best_fitness = float('inf')
+
+    def ask(self) -> np.ndarray:
+        """返回本轮待评估的候选解，形状 (population, dims)"""
+        raise NotImplementedError
+
+    def tell(self, fitness: np.ndarray, progress: float):
+        """接收 ask() 候选解的适应度; progress 为已完成的迭代比例 (0~1)"""
+        raise NotImplementedError
+
+    def seed(self, candidates: np.ndarray):
+        """用给定的候选解替换初始种群中的前几个个体 (在第一次 ask() 之前调用)"""
+        raise NotImplementedError
+
+    def _clip_seeds(self, candidates: np.ndarray) -> np.ndarray:
+        """截断到边界，最多保留 population_size 个"""
+        candidates = np.atleast_2d(np.asarray(candidates, dtype=float))[:self.population_size]
+        return np.clip(candidates, self.lower, self.upper)
+
+    def _update_global_best(self, candidates: np.ndarray, fitness: np.ndarray):
+        """用本轮候选解更新全局最佳"""
+        best_index = int(np.argmin(fitness))
+        if fitness[best_index] < self.global_best_fitness:
+            self.global_best_fitness = float(fitness[best_index])
+            self.global_best_position = candidates[best_index].copy()
+
+
+class SwarmEngine(Solver):
+    """向量化粒子群引擎 - 以 (swarm_size × dims) 矩阵存储整个粒子群"""
+
+    name = 'pso'
+
+    # 粒子群的全局最佳几乎每轮都在改进，停滞10轮即可判定收敛
+    CONVERGENCE_WINDOW = 10
+
+    # 默认的速度上限，调用方可以按搜索范围调整 max_velocity
+    MAX_VELOCITY = 2.0
+
+    def __init__(self, bounds: List[Tuple[float, float]], swarm_size: int,
+                 rng: Optional[np.random.Generator] = None):
+        super().__init__(bounds, swarm_size, rng)
+        self.swarm_size = swarm_size
+        self.max_velocity = np.full(self.dimensions, self.MAX_VELOCITY)
+
+        # 初始化位置和速度
+        shape = (swarm_size, self.dimensions)
+        self.positions = self.rng.uniform(self.lower, self.upper, size=shape)
+        self.velocities = self.rng.uniform(-1, 1, size=shape)
+
+        # 历史最佳位置和适应度
+        self.best_positions = self.positions.copy()
+        self.best_fitness = np.full(swarm_size, np.inf)
+        self.current_fitness = np.full(swarm_size, np.inf)
+
+    def ask(self) -> np.ndarray:
+        return self.positions
+
+    def seed(self, candidates: np.ndarray):
+        candidates = self._clip_seeds(candidates)
+        self.positions[:len(candidates)] = candidates
+        self.best_positions[:len(candidates)] = candidates
+
+    def tell(self, fitness: np.ndarray, progress: float):
+        self.update_bests(fitness)
+        self.step(0.9 - 0.5 * progress)  # 递减惯性权重
+
+    def update_bests(self, fitness: np.ndarray):
+        """根据本轮适应度更新个体最佳和全局最佳"""
+        self.current_fitness = np.asarray(fitness, dtype=float)
+
+        improved = self.current_fitness < self.best_fitness
+        self.best_fitness[improved] = self.current_fitness[improved]
+        self.best_positions[improved] = self.positions[improved]
+
+        self._update_global_best(self.positions, self.current_fitness)
+
+    def receive_migrant(self, position: np.ndarray, fitness: float):
+        """用迁入粒子替换当前最差的粒子 (岛模型)"""
+        worst = int(np.argmax(self.best_fitness))
+        self.positions[worst] = position
+        self.best_positions[worst] = position
+        self.best_fitness[worst] = fitness
+        self.current_fitness[worst] = fitness
+        if fitness < self.global_best_fitness:
+            self.global_best_fitness = float(fitness)
+            self.global_best_position = np.array(position, dtype=float)
+
+    def step(self, w: float = 0.5, c1: float = 1.5, c2: float = 1.5):
+        """整群更新速度和位置"""
+        # 每个粒子一组随机系数
+        r1 = self.rng.random((self.swarm_size, 1))
+        r2 = self.rng.random((self.swarm_size, 1))
+
+        # PSO速度更新公式
+        cognitive = c1 * r1 * (self.best_positions - self.positions)
+        social = c2 * r2 * (self.global_best_position - self.positions)
+
+        self.velocities = w * self.velocities + cognitive + social
+
+        # 限制速度范围 (按维度的搜索范围缩放，固定的 ±2 在像素坐标下几乎无法移动粒子)
+        np.clip(self.velocities, -self.max_velocity, self.max_velocity, out=self.velocities)
+
+        self.positions += self.velocities
+
+        # 越界的维度贴边并反弹
+        below = self.positions < self.lower
+        above = self.positions > self.upper
+        out_of_bounds = below | above
+        self.positions = np.clip(self.positions, self.lower, self.upper)
+        self.velocities[out_of_bounds] *= -0.5
+
+
+class DifferentialEvolutionSolver(Solver):
+    """差分进化 (DE/rand/1/bin，缩放因子每个个体随机抖动)"""
+
+    name = 'de'
+
+    CROSSOVER_RATE = 0.9
+    MIN_SCALE, MAX_SCALE = 0.5, 1.0
+
+    def __init__(self, bounds: List[Tuple[float, float]], population_size: int,
+                 rng: Optional[np.random.Generator] = None):
+        super().__init__(bounds, max(4, population_size), rng)
+        shape = (self.population_size, self.dimensions)
+        self.population = self.rng.uniform(self.lower, self.upper, size=shape)
+        self.fitness = None
+        self.trials = self.population
+
+    def seed(self, candidates: np.ndarray):
+        candidates = self._clip_seeds(candidates)
+        self.population[:len(candidates)] = candidates
+
+    def ask(self) -> np.ndarray:
+        if self.fitness is None:
+            return self.population
+
+        size = self.population_size
+
+        # 每个个体随机选三个互不相同、且不同于自身的个体
+        keys = self.rng.random((size, size))
+        keys[np.arange(size), np.arange(size)] = np.inf
+        r1, r2, r3 = np.argsort(keys, axis=1)[:, :3].T
+
+        scale = self.rng.uniform(self.MIN_SCALE, self.MAX_SCALE, (size, 1))
+        mutants = self.population[r1] + scale * (self.population[r2] - self.population[r3])
+
+        # 二项交叉，至少保留一个变异维度
+        crossover = self.rng.random((size, self.dimensions)) < self.CROSSOVER_RATE
+        crossover[np.arange(size), self.rng.integers(self.dimensions, size=size)] = True
+
+        self.trials = np.clip(
+            np.where(crossover, mutants, self.population), self.lower, self.upper
+        )
+        return self.trials
+
+    def tell(self, fitness: np.ndarray, progress: float):
+        fitness = np.asarray(fitness, dtype=float)
+        self._update_global_best(self.trials, fitness)
+        if self.fitness is None:
+            self.fitness = fitness
+            return
+
+        # 一对一选择: 试验个体不差于父代时替换
+        improved = fitness <= self.fitness
+        self.population[improved] = self.trials[improved]
+        self.fitness[improved] = fitness[improved]
+
+
+class CMAESSolver(Solver):
+    """协方差矩阵自适应进化策略 (CMA-ES)
+
+    在按边界归一化到 [0, 1] 的坐标中搜索，越界的样本截断到边界后参与更新。
+    """
+
+    name = 'cmaes'
+
+    INITIAL_SIGMA = 0.3
+
+    def __init__(self, bounds: List[Tuple[float, float]], population_size: int,
+                 rng: Optional[np.random.Generator] = None):
+        super().__init__(bounds, population_size, rng)
+        n = self.dimensions
+        self.population_size = max(population_size, 4 + int(3 * np.log(n)))
+        self.mu = self.population_size // 2
+
+        # 重组权重
+        weights = np.log(self.mu + 0.5) - np.log(np.arange(1, self.mu + 1))
+        self.weights = weights / weights.sum()
+        self.mu_eff = 1 / np.sum(self.weights ** 2)
+
+        # 步长和协方差的学习率
+        self.cc = (4 + self.mu_eff / n) / (n + 4 + 2 * self.mu_eff / n)
+        self.cs = (self.mu_eff + 2) / (n + self.mu_eff + 5)
+        self.c1 = 2 / ((n + 1.3) ** 2 + self.mu_eff)
+        self.cmu = min(
+            1 - self.c1,
+            2 * (self.mu_eff - 2 + 1 / self.mu_eff) / ((n + 2) ** 2 + self.mu_eff)
+        )
+        self.damps = 1 + 2 * max(0, np.sqrt((self.mu_eff - 1) / (n + 1)) - 1) + self.cs
+        self.chi_n = np.sqrt(n) * (1 - 1 / (4 * n) + 1 / (21 * n ** 2))
+
+        self.mean = self.rng.random(n)
+        self.sigma = self.INITIAL_SIGMA
+        self.pc = np.zeros(n)
+        self.ps = np.zeros(n)
+        self.C = np.eye(n)
+        self.B = np.eye(n)
+        self.D = np.ones(n)
+        self.generation = 0
+        self.eigen_generation = 0
+        self.samples = None
+
+    def seed(self, candidates: np.ndarray):
+        """CMA-ES 只有一个分布中心，以第一个候选解作为初始均值"""
+        candidates = self._clip_seeds(candidates)
+        self.mean = (candidates[0] - self.lower) / np.where(self.span > 0, self.span, 1)
+
+    def ask(self) -> np.ndarray:
+        z = self.rng.standard_normal((self.population_size, self.dimensions))
+        self.samples = np.clip(self.mean + self.sigma * (z * self.D) @ self.B.T, 0, 1)
+        return self.lower + self.samples * self.span
+
+    def tell(self, fitness: np.ndarray, progress: float):
+        fitness = np.asarray(fitness, dtype=float)
+        self._update_global_best(self.lower + self.samples * self.span, fitness)
+        n = self.dimensions
+        self.generation += 1
+
+        selected = (self.samples[np.argsort(fitness)[:self.mu]] - self.mean) / self.sigma
+        step = self.weights @ selected
+        self.mean = self.mean + self.sigma * step
+
+        # 进化路径
+        inv_sqrt_step = self.B @ ((self.B.T @ step) / self.D)
+        self.ps = (1 - self.cs) * self.ps + np.sqrt(self.cs * (2 - self.cs) * self.mu_eff) * inv_sqrt_step
+        ps_norm = np.linalg.norm(self.ps)
+        hsig = ps_norm / np.sqrt(1 - (1 - self.cs) ** (2 * self.generation)) / self.chi_n < 1.4 + 2 / (n + 1)
+        self.pc = (1 - self.cc) * self.pc + hsig * np.sqrt(self.cc * (2 - self.cc) * self.mu_eff) * step
+
+        # 协方差矩阵: rank-one + rank-mu 更新
+        rank_mu = (selected.T * self.weights) @ selected
+        self.C = (
+            (1 - self.c1 - self.cmu) * self.C
+            + self.c1 * (np.outer(self.pc, self.pc) + (1 - hsig) * self.cc * (2 - self.cc) * self.C)
+            + self.cmu * rank_mu
+        )
+        self.sigma = min(1.0, self.sigma * np.exp((self.cs / self.damps) * (ps_norm / self.chi_n - 1)))
+
+        # 特征分解是 O(n^3)，间隔若干代才更新一次
+        if self.generation - self.eigen_generation > self.population_size / (self.c1 + self.cmu) / n / 10:
+            self.eigen_generation = self.generation
+            self.C = np.triu(self.C) + np.triu(self.C, 1).T
+            eigenvalues, self.B = np.linalg.eigh(self.C)
+            self.D = np.sqrt(np.maximum(eigenvalues, 1e-20))
+
+
+class SimulatedAnnealingSolver(Solver):
+    """模拟退火 - population_size 条独立的退火链批量推进
+
+    每步随机扰动约两个维度，温度和扰动步长随 progress 指数/线性下降，
+    初始温度取初始解适应度的标准差。
+    """
+
+    name = 'sa'
+
+    FINAL_TEMPERATURE_RATIO = 1e-3
+    MAX_STEP_RATIO, MIN_STEP_RATIO = 0.3, 0.02
+
+    def __init__(self, bounds: List[Tuple[float, float]], population_size: int,
+                 rng: Optional[np.random.Generator] = None):
+        super().__init__(bounds, population_size, rng)
+        shape = (self.population_size, self.dimensions)
+        self.current = self.rng.uniform(self.lower, self.upper, size=shape)
+        self.current_fitness = None
+        self.proposals = self.current
+        self.initial_temperature = 1.0
+        self.progress = 0.0
+        self.mutation_rate = min(1.0, 2 / self.dimensions)
+
+    def seed(self, candidates: np.ndarray):
+        candidates = self._clip_seeds(candidates)
+        self.current[:len(candidates)] = candidates
+
+    def ask(self) -> np.ndarray:
+        if self.current_fitness is None:
+            return self.current
+
+        shape = self.current.shape
+        mask = self.rng.random(shape) < self.mutation_rate
+        mask[np.arange(shape[0]), self.rng.integers(shape[1], size=shape[0])] = True
+
+        step_ratio = self.MIN_STEP_RATIO + (self.MAX_STEP_RATIO - self.MIN_STEP_RATIO) * (1 - self.progress)
+        noise = self.rng.standard_normal(shape) * self.span * step_ratio
+        self.proposals = np.clip(self.current + mask * noise, self.lower, self.upper)
+        return self.proposals
+
+    def tell(self, fitness: np.ndarray, progress: float):
+        fitness = np.asarray(fitness, dtype=float)
+        self._update_global_best(self.proposals, fitness)
+        self.progress = progress
+        if self.current_fitness is None:
+            self.current_fitness = fitness
+            self.initial_temperature = float(np.std(fitness)) or 1.0
+            return
+
+        # Metropolis 准则
+        temperature = self.initial_temperature * self.FINAL_TEMPERATURE_RATIO ** progress
+        delta = fitness - self.current_fitness
+        accept_probability = np.exp(-np.maximum(delta, 0) / temperature)
+        accepted = self.rng.random(len(fitness)) < accept_probability
+        self.current[accepted] = self.proposals[accepted]
+        self.current_fitness[accepted] = fitness[accepted]
+
+
+# 可选的优化算法，按名称注册
+SOLVERS: Dict[str, type] = {
+    solver_class.name: solver_class
+    for solver_class in (SwarmEngine, CMAESSolver, DifferentialEvolutionSolver, SimulatedAnnealingSolver)
+}
+
+
+def create_solver(name: str, bounds: List[Tuple[float, float]], population_size: int,
+                  rng: Optional[np.random.Generator] = None) -> Solver:
+    """按名称创建优化算法实例"""
+    if name not in SOLVERS:
+        raise ValueError(f"不支持的优化算法: {name}，可选: {', '.join(SOLVERS)}")
+    return SOLVERS[name](bounds, population_size, rng)
@@ -0,0 +1,167 @@
+"""
+AI使用量计数器
+OptimizationHistory、NLPTrainingData 和 AICache 写入和删除时增量更新 AIUsageCounter，
+ai_statistics 只需一次查询读取; rebuild_usage_counters 从源数据重新计算全部计数。
+计数始终等于现存记录加上保留策略写入的每日汇总: 记录被删除 (包括项目、页面删除时的
+级联删除) 时减少计数; 保留策略在 keep_counters_on_delete 内删除已计入汇总的记录，计数不变。
+"""
+
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import AICache, AIUsageCounter, AIUsageRollup, NLPTrainingData, OptimizationHistory
+
+
+# 计数器名称
+OPTIMIZATION_COUNTER = 'optimization.{}'  # 按优化类型计数
+NLP_GENERATIONS = 'nlp.generations'
+NLP_POSITIVE_FEEDBACK = 'nlp.positive_feedback'
+NLP_CORRECTIONS = 'nlp.corrections'
+CACHE_ENTRIES = 'cache.entries'
+CACHE_HITS = 'cache.hits'
+
+_delete_state = threading.local()
+
+
+def increment_usage(deltas: Dict[str, int], user_id: Optional[int] = None):
+    """累加计数器，user_id 为空时累加全局计数器"""
+    for name, delta in deltas.items():
+        if not delta:
+            continue
+        counter = AIUsageCounter.objects.filter(user_id=user_id, name=name)
+        if counter.update(value=F('value') + delta) or delta < 0:
+            # 计数器不存在时 (例如随用户一起被删除) 无需减少
+            continue
+        try:
+            with transaction.atomic():
+                AIUsageCounter.objects.create(user_id=user_id, name=name, value=delta)
+        except IntegrityError:
+            # 并发创建了同一计数器
+            counter.update(value=F('value') + delta)
+
+
+def record_training_data_usage(training_data: NLPTrainingData):
+    """新增NLP训练数据后更新计数"""
+    increment_usage({
+        NLP_GENERATIONS: 1,
+        NLP_POSITIVE_FEEDBACK: int((training_data.user_feedback or 0) >= 4),
+        NLP_CORRECTIONS: int(training_data.corrected_component is not None),
+    }, training_data.created_by_id)
+
+
+def rollup_usage_deltas(source: str, category: str, count: int,
+                        positive_feedback: int = 0, corrections: int = 0) -> Dict[str, int]:
+    """AIUsageRollup 一行汇总对应的计数器增量"""
+    if source == 'OPTIMIZATION':
+        return {OPTIMIZATION_COUNTER.format(category): count}
+    return {
+        NLP_GENERATIONS: count,
+        NLP_POSITIVE_FEEDBACK: positive_feedback,
+        NLP_CORRECTIONS: corrections,
+    }
+
+
+@contextmanager
+def keep_counters_on_delete():
+    """块内 (当前线程) 删除的记录不减少计数，用于删除后仍计入每日汇总的记录"""
+    previous = getattr(_delete_state, 'keep_counters', False)
+    _delete_state.keep_counters = True
+    try:
+        yield
+    finally:
+        _delete_state.keep_counters = previous
+
+
+def _counters_kept():
+    return getattr(_delete_state, 'keep_counters', False)
+
+
+@receiver(post_delete, sender=OptimizationHistory)
+def _history_deleted(sender, instance, **kwargs):
+    if _counters_kept():
+        return
+    increment_usage({OPTIMIZATION_COUNTER.format(instance.optimization_type): -1}, instance.user_id)
+
+
+@receiver(post_delete, sender=NLPTrainingData)
+def _training_data_deleted(sender, instance, **kwargs):
+    if _counters_kept():
+        return
+    increment_usage({
+        NLP_GENERATIONS: -1,
+        NLP_POSITIVE_FEEDBACK: -int((instance.user_feedback or 0) >= 4),
+        NLP_CORRECTIONS: -int(instance.corrected_component is not None),
+    }, instance.created_by_id)
+
+
+def get_usage_counters(user_id: int) -> Dict[str, Dict[str, int]]:
+    """一次查询读取用户计数和全局计数，返回 {'user': {...}, 'global': {...}}"""
+    counters = {'user': {}, 'global': {}}
+    rows = AIUsageCounter.objects.filter(
+        Q(user_id=user_id) | Q(user__isnull=True)
+    ).values_list('user_id', 'name', 'value')
+    for owner, name, value in rows:
+        counters['global' if owner is None else 'user'][name] = value
+    return counters
+
+
+def rebuild_usage_counters(apps=None) -> int:
+    """从源数据 (含已归档记录的每日汇总) 重新计算全部计数器，返回计数器数量
+    
+    apps 为数据迁移中的历史模型注册表，默认使用当前模型。
+    """
+    if apps is None:
+        from django.apps import apps
+    OptimizationHistory = apps.get_model('api', 'OptimizationHistory')
+    NLPTrainingData = apps.get_model('api', 'NLPTrainingData')
+    AIUsageRollup = apps.get_model('api', 'AIUsageRollup')
+    AICache = apps.get_model('api', 'AICache')
+    AIUsageCounter = apps.get_model('api', 'AIUsageCounter')
+    totals = {}
+
+    def add(user_id, name, value):
+        if value:
+            totals[(user_id, name)] = totals.get((user_id, name), 0) + value
+
+    history = OptimizationHistory.objects.values('user_id', 'optimization_type').annotate(count=Count('id'))
+    for row in history.values_list('user_id', 'optimization_type', 'count'):
+        add(row[0], OPTIMIZATION_COUNTER.format(row[1]), row[2])
+
+    training = NLPTrainingData.objects.values('created_by_id').annotate(
+        count=Count('id'),
+        positive=Count('id', filter=Q(user_feedback__gte=4)),
+        corrections=Count('id', filter=Q(corrected_component__isnull=False)),
+    )
+    for user_id, count, positive, corrections in training.values_list(
+        'created_by_id', 'count', 'positive', 'corrections'
+    ):
+        add(user_id, NLP_GENERATIONS, count)
+        add(user_id, NLP_POSITIVE_FEEDBACK, positive)
+        add(user_id, NLP_CORRECTIONS, corrections)
+
+    rollups = AIUsageRollup.objects.values('user_id', 'source', 'category').annotate(
+        total=Sum('count'), positive=Sum('positive_feedback'), corrections=Sum('corrections')
+    )
+    for user_id, source, category, total, positive, corrections in rollups.values_list(
+        'user_id', 'source', 'category', 'total', 'positive', 'corrections'
+    ):
+        for name, value in rollup_usage_deltas(source, category, total, positive, corrections).items():
+            add(user_id, name, value)
+
+    cache = AICache.objects.aggregate(entries=Count('id'), hits=Sum('hit_count'))
+    add(None, CACHE_ENTRIES, cache['entries'])
+    add(None, CACHE_HITS, cache['hits'] or 0)
+
+    with transaction.atomic():
+        AIUsageCounter.objects.all().delete()
+        AIUsageCounter.objects.bulk_create([
+            AIUsageCounter(user_id=user_id, name=name, value=value)
+            for (user_id, name), value in totals.items()
+        ])
+    return len(totals)
@@ -0,0 +1,40 @@
+"""
+执行AI历史数据保留策略 - 归档、汇总并删除超过保留期的优化历史和NLP训练数据
+"""
+
+from django.core.management.base import BaseCommand
+
+from api.ai_retention import apply_retention, count_expired_records
+
+
+class Command(BaseCommand):
+    help = '把超过保留期的 OptimizationHistory/NLPTrainingData 汇总为每日统计，归档为 gzip JSONL 后分批删除'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=None,
+            help='保留天数; 默认使用 AI_RETENTION_DAYS'
+        )
+        parser.add_argument(
+            '--archive-dir', default=None,
+            help='归档目录; 默认使用 AI_ARCHIVE_DIR'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=None,
+            help='每个事务处理的记录数; 默认使用 AI_RETENTION_BATCH_SIZE'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='只统计超过保留期的记录数')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            for table, count in count_expired_records(options['days']).items():
+                self.stdout.write(f'{table}: {count} 条待归档')
+            return
+
+        results = apply_retention(
+            retention_days=options['days'], archive_dir=options['archive_dir'],
+            batch_size=options['batch_size']
+        )
+        for table, totals in results.items():
+            self.stdout.write(f"{table}: 删除 {totals['rows']} 条, 归档文件 {len(totals['files'])} 个")
+        self.stdout.write(self.style.SUCCESS('保留策略执行完成'))
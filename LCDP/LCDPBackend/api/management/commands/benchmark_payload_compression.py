@@ -0,0 +1,92 @@
+"""
+载荷压缩基准测试 - 对比AI缓存和优化历史载荷在各压缩级别下的大小和编解码耗时
+"""
+
+import json
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from api.ai_optimizer import ComponentLayoutOptimizer
+from api.models import AICache, OptimizationHistory, decode_payload, encode_payload
+
+
+class Command(BaseCommand):
+    help = '统计 AICache/OptimizationHistory 载荷压缩后节省的字节数和编解码耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--levels', type=int, nargs='+', default=[0, 1, 6, 9],
+            help='要对比的 zlib 压缩级别，0 表示不压缩的规范JSON'
+        )
+        parser.add_argument('--limit', type=int, default=500, help='每个表最多读取的行数')
+        parser.add_argument(
+            '--synthetic', type=int, nargs='*', default=None, metavar='SIZE',
+            help='不读数据库，改用指定组件数的布局优化结果作为样本 (默认 10 40 100)'
+        )
+        parser.add_argument('--repeat', type=int, default=5, help='每个样本编解码的重复次数')
+        parser.add_argument('--seed', type=int, default=0, help='随机种子')
+
+    def handle(self, *args, **options):
+        if options['synthetic'] is not None:
+            samples = {'synthetic': self._synthetic_payloads(options['synthetic'] or [10, 40, 100], options['seed'])}
+        else:
+            samples = {
+                'AICache': list(AICache.objects.values_list('result_data', flat=True)[:options['limit']]),
+                'OptimizationHistory': list(
+                    OptimizationHistory.objects.values_list('output_blob__data', flat=True)[:options['limit']]
+                ),
+            }
+
+        self.stdout.write(
+            f"{'数据':>20} {'行数':>6} {'级别':>4} {'JSON字节':>12} {'存储字节':>12} "
+            f"{'节省':>7} {'编码(us)':>10} {'解码(us)':>10}"
+        )
+        for name, payloads in samples.items():
+            if not payloads:
+                self.stdout.write(f'{name:>20} {0:>6}')
+                continue
+            # JSONField 的存储形式作为对比基准
+            json_bytes = sum(len(json.dumps(payload).encode('utf-8')) for payload in payloads)
+            for level in options['levels']:
+                stored_bytes, encode_time, decode_time = self._measure(payloads, level, options['repeat'])
+                saved = 1 - stored_bytes / json_bytes
+                self.stdout.write(
+                    f'{name:>20} {len(payloads):>6} {level:>4} {json_bytes:>12} {stored_bytes:>12} '
+                    f'{saved:>6.1%} {encode_time / len(payloads) * 1e6:>10.1f} '
+                    f'{decode_time / len(payloads) * 1e6:>10.1f}'
+                )
+
+    def _measure(self, payloads, level, repeat):
+        """返回 (编码后总字节数, 编码总耗时, 解码总耗时)，耗时取多次重复的最小值"""
+        encode_times, decode_times = [], []
+        for _ in range(repeat):
+            started_at = time.perf_counter()
+            encoded = [encode_payload(payload, level) for payload in payloads]
+            encode_times.append(time.perf_counter() - started_at)
+
+            started_at = time.perf_counter()
+            for data in encoded:
+                decode_payload(data)
+            decode_times.append(time.perf_counter() - started_at)
+        return sum(len(data) for data in encoded), min(encode_times), min(decode_times)
+
+    def _synthetic_payloads(self, sizes, seed):
+        """生成布局优化结果 (与优化历史 output_blob 中存储的结构相同)"""
+        rng = np.random.default_rng(seed)
+        payloads = []
+        for num_components in sizes:
+            components = [
+                {
+                    'id': f'comp_{i}',
+                    'type': 'Button',
+                    'width': float(rng.integers(60, 240)),
+                    'height': float(rng.integers(30, 120)),
+                    'properties': {'text': f'按钮 {i}'},
+                }
+                for i in range(num_components)
+            ]
+            optimizer = ComponentLayoutOptimizer(max_iterations=100, seed=int(rng.integers(2 ** 32)))
+            payloads.append(optimizer._optimize(components, {'canvas_height': 400 + num_components * 40}))
+        return payloads
@@ -0,0 +1,118 @@
+"""
+优化算法基准测试 - 对比各算法在不同页面规模下达到目标适应度的耗时
+"""
+
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from api.ai_optimizer import ComponentLayoutOptimizer
+from api.ai_solvers import SOLVERS
+
+
+class Command(BaseCommand):
+    help = '对比 PSO/CMA-ES/差分进化/模拟退火 在布局优化上达到目标适应度的耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[10, 20, 40, 80],
+            help='要测试的组件数量'
+        )
+        parser.add_argument(
+            '--solvers', nargs='+', default=list(SOLVERS), choices=list(SOLVERS),
+            help='要对比的优化算法'
+        )
+        parser.add_argument('--repeat', type=int, default=3, help='每种规模测试的页面数')
+        parser.add_argument('--swarm-size', type=int, default=30, help='种群大小')
+        parser.add_argument('--iterations', type=int, default=300, help='最大迭代轮数')
+        parser.add_argument('--time-budget-ms', type=int, default=2000, help='每次运行的时间预算')
+        parser.add_argument(
+            '--target', type=float, default=None,
+            help='目标适应度; 默认取同一页面上所有算法的最优结果'
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=0.05,
+            help='默认目标适应度的相对容差'
+        )
+        parser.add_argument(
+            '--density', type=float, default=0.3,
+            help='组件总面积占画布面积的比例，画布高度按此比例随组件数增长'
+        )
+        parser.add_argument('--seed', type=int, default=0, help='随机种子')
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        solvers = options['solvers']
+
+        self.stdout.write(
+            f"{'组件数':>8} {'算法':>8} {'达标':>6} {'达标耗时(ms)':>14} "
+            f"{'最终适应度':>14} {'评估/秒':>10}"
+        )
+        for num_components in options['sizes']:
+            runs = {solver: [] for solver in solvers}
+            for _ in range(options['repeat']):
+                components, constraints = self._random_page(num_components, rng, options)
+                seed = int(rng.integers(2 ** 32))
+                traces = {
+                    solver: self._run(solver, seed, components, constraints, options)
+                    for solver in solvers
+                }
+
+                target = options['target']
+                if target is None:
+                    best = min(trace[-1][1] for trace, _ in traces.values())
+                    target = best * (1 + options['tolerance'])
+
+                for solver, (trace, evaluations) in traces.items():
+                    reached = [elapsed for elapsed, fitness in trace if fitness <= target]
+                    runs[solver].append((
+                        reached[0] if reached else None, trace[-1][1],
+                        evaluations / max(trace[-1][0], 1e-9)
+                    ))
+
+            for solver in solvers:
+                times = [t for t, _, _ in runs[solver] if t is not None]
+                median_time = f'{np.median(times) * 1000:.1f}' if times else '-'
+                self.stdout.write(
+                    f'{num_components:>8} {solver:>8} '
+                    f'{len(times):>3}/{len(runs[solver]):<2} {median_time:>14} '
+                    f'{np.median([f for _, f, _ in runs[solver]]):>14.4g} '
+                    f'{np.median([r for _, _, r in runs[solver]]):>10.0f}'
+                )
+
+    def _random_page(self, num_components, rng, options):
+        """生成随机尺寸的组件和与之匹配的画布"""
+        components = [
+            {
+                'id': f'comp_{i}',
+                'width': float(rng.integers(60, 240)),
+                'height': float(rng.integers(30, 120)),
+            }
+            for i in range(num_components)
+        ]
+        area = sum(comp['width'] * comp['height'] for comp in components)
+        constraints = {
+            'canvas_width': 1200,
+            'canvas_height': max(800, area / options['density'] / 1200),
+            'min_spacing': 10,
+            'decompose': False,
+            'time_budget_ms': options['time_budget_ms'],
+        }
+        return components, constraints
+
+    def _run(self, solver, seed, components, constraints, options):
+        """运行一次优化 (不读写缓存)，返回 [(耗时秒, 当前最优适应度)] 轨迹和评估次数"""
+        optimizer = ComponentLayoutOptimizer(
+            swarm_size=options['swarm_size'], max_iterations=options['iterations'],
+            seed=seed, solver=solver
+        )
+        trace = []
+        started_at = time.perf_counter()
+
+        def on_progress(iterations, max_iterations, best_fitness):
+            trace.append((time.perf_counter() - started_at, best_fitness))
+
+        result = optimizer._optimize(components, constraints, on_progress)
+        trace.append((time.perf_counter() - started_at, result['fitness_score']))
+        return trace, result['evaluations']
@@ -0,0 +1,28 @@
+"""
+清除AI结果缓存 - 删除数据库中的缓存条目，并通知所有工作进程清除本地缓存
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.ai_cache import invalidate_cached_results
+from api.models import AICache
+
+
+class Command(BaseCommand):
+    help = '删除 AICache 条目 (可按类型和缓存键筛选)，各工作进程在下次轮询时清除对应的本地缓存'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--type', dest='cache_type', default='',
+            choices=[cache_type for cache_type, _ in AICache.CACHE_TYPES],
+            help='只清除该类型的缓存; 默认全部类型'
+        )
+        parser.add_argument('--key', default='', help='只清除该缓存键 (input_hash)')
+        parser.add_argument('--all', action='store_true', help='未指定 --type 和 --key 时需要确认清除全部缓存')
+
+    def handle(self, *args, **options):
+        if not (options['cache_type'] or options['key'] or options['all']):
+            raise CommandError('请指定 --type、--key 或 --all')
+
+        deleted = invalidate_cached_results(options['cache_type'], options['key'])
+        self.stdout.write(self.style.SUCCESS(f'已清除 {deleted} 条缓存，并通知其他工作进程'))
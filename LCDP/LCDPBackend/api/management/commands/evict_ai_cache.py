@@ -0,0 +1,48 @@
+"""
+清理AI结果缓存 - 删除过期条目，并按最近最少使用把各类型的条目数控制在上限以内
+"""
+
+from django.core.management.base import BaseCommand
+
+from api.ai_cache import evict_cache_entries, flush_hit_counts
+from api.models import AICache
+
+
+class Command(BaseCommand):
+    help = '按有效期和各类型条目上限清理 AICache 表，并报告回收的条目数和字节数'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ttl-days', type=float, default=None,
+            help='删除超过该天数未使用的条目; 默认使用 AI_CACHE_TTL_DAYS，0 表示不按时间清理'
+        )
+        parser.add_argument(
+            '--max-entries', type=int, default=None,
+            help='每种缓存类型最多保留的条目数; 默认使用 AI_CACHE_MAX_ENTRIES'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=None,
+            help='每个事务删除的条目数; 默认使用 AI_CACHE_EVICTION_BATCH_SIZE'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='只统计，不删除')
+
+    def handle(self, *args, **options):
+        # 先写回本进程缓冲的命中，避免刚使用过的条目被当作最近最少使用
+        flush_hit_counts()
+
+        max_entries = None
+        if options['max_entries'] is not None:
+            max_entries = {cache_type: options['max_entries'] for cache_type, _ in AICache.CACHE_TYPES}
+
+        reclaimed = evict_cache_entries(
+            ttl_days=options['ttl_days'], max_entries=max_entries,
+            batch_size=options['batch_size'], dry_run=options['dry_run']
+        )
+
+        for cache_type, totals in reclaimed.items():
+            self.stdout.write(f"{cache_type}: {totals['rows']} 条, {totals['bytes']} 字节")
+
+        total_rows = sum(totals['rows'] for totals in reclaimed.values())
+        total_bytes = sum(totals['bytes'] for totals in reclaimed.values())
+        verb = '可回收' if options['dry_run'] else '已回收'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {total_rows} 条缓存, {total_bytes} 字节'))
@@ -0,0 +1,40 @@
+"""
+处理积压的后台优化任务 - 用于服务重启后恢复未完成的任务
+"""
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.ai_jobs import run_optimization_job
+from api.models import OptimizationJob
+
+
+class Command(BaseCommand):
+    help = '执行所有待处理的布局优化任务，并可将长时间停留在运行中的任务重新排队'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requeue-stale', type=int, default=None, metavar='MINUTES',
+            help='将开始运行超过指定分钟数仍未结束的任务视为中断，重新排队'
+        )
+
+    def handle(self, *args, **options):
+        if options['requeue_stale'] is not None:
+            cutoff = timezone.now() - timedelta(minutes=options['requeue_stale'])
+            requeued = OptimizationJob.objects.filter(
+                status='RUNNING', started_at__lt=cutoff
+            ).update(status='PENDING', started_at=None, progress=0.0)
+            self.stdout.write(f'重新排队 {requeued} 个中断的任务')
+
+        job_ids = list(
+            OptimizationJob.objects.filter(status='PENDING')
+            .order_by('created_at').values_list('id', flat=True)
+        )
+        for job_id in job_ids:
+            run_optimization_job(job_id)
+            job = OptimizationJob.objects.get(pk=job_id)
+            self.stdout.write(f'任务 #{job_id}: {job.status}')
+
+        self.stdout.write(self.style.SUCCESS(f'共处理 {len(job_ids)} 个任务'))
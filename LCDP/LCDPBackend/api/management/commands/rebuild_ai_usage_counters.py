@@ -0,0 +1,17 @@
+"""
+重建AI使用量计数器 - 从优化历史、NLP训练数据、每日汇总和缓存表重新计算 AIUsageCounter
+"""
+
+from django.core.management.base import BaseCommand
+
+from api.ai_cache import flush_hit_counts
+from api.ai_usage import rebuild_usage_counters
+
+
+class Command(BaseCommand):
+    help = '从源数据重新计算 AIUsageCounter (部署计数器表后执行一次，或用于校正计数偏差)'
+
+    def handle(self, *args, **options):
+        flush_hit_counts()
+        count = rebuild_usage_counters()
+        self.stdout.write(self.style.SUCCESS(f'已重建 {count} 个计数器'))
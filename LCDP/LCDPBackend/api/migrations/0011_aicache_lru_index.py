@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_aicacheinvalidation'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='aicache',
+            name='api_aicache_cache_t_31c949_idx',
+        ),
+        migrations.AddIndex(
+            model_name='aicache',
+            index=models.Index(fields=['cache_type', 'last_used'], name='api_aicache_cache_t_1605a0_idx'),
+        ),
+    ]
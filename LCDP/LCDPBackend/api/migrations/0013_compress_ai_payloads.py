@@ -0,0 +1,90 @@
+# 把 AICache.result_data 和 OptimizationHistory.output_data 从 JSON 列迁移到压缩的二进制列
+
+import api.models
+from django.db import migrations, models
+
+
+BATCH_SIZE = 500
+
+
+def _copy(apps, model_name, source, target):
+    model = apps.get_model('api', model_name)
+    batch = []
+    for row in model.objects.only('id', source).iterator(chunk_size=BATCH_SIZE):
+        setattr(row, target, getattr(row, source))
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            model.objects.bulk_update(batch, [target])
+            batch = []
+    if batch:
+        model.objects.bulk_update(batch, [target])
+
+
+def compress_payloads(apps, schema_editor):
+    _copy(apps, 'AICache', 'result_data', 'result_payload')
+    _copy(apps, 'OptimizationHistory', 'output_data', 'output_payload')
+
+
+def decompress_payloads(apps, schema_editor):
+    _copy(apps, 'AICache', 'result_payload', 'result_data')
+    _copy(apps, 'OptimizationHistory', 'output_payload', 'output_data')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_aicachelease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aicache',
+            name='result_payload',
+            field=api.models.CompressedJSONField(null=True),
+        ),
+        migrations.AddField(
+            model_name='optimizationhistory',
+            name='output_payload',
+            field=api.models.CompressedJSONField(null=True),
+        ),
+        # 旧列先改为可空，使回滚时可以在有数据的表上重新添加
+        migrations.AlterField(
+            model_name='aicache',
+            name='result_data',
+            field=models.JSONField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='optimizationhistory',
+            name='output_data',
+            field=models.JSONField(null=True),
+        ),
+        migrations.RunPython(compress_payloads, decompress_payloads),
+        migrations.RemoveField(
+            model_name='aicache',
+            name='result_data',
+        ),
+        migrations.RemoveField(
+            model_name='optimizationhistory',
+            name='output_data',
+        ),
+        migrations.RenameField(
+            model_name='aicache',
+            old_name='result_payload',
+            new_name='result_data',
+        ),
+        migrations.RenameField(
+            model_name='optimizationhistory',
+            old_name='output_payload',
+            new_name='output_data',
+        ),
+        migrations.AlterField(
+            model_name='aicache',
+            name='result_data',
+            field=api.models.CompressedJSONField(),
+        ),
+        migrations.AlterField(
+            model_name='optimizationhistory',
+            name='output_data',
+            field=api.models.CompressedJSONField(),
+        ),
+    ]
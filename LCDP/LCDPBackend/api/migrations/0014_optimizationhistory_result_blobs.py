@@ -0,0 +1,107 @@
+# OptimizationHistory 的输入和结果改为引用按内容寻址的 AIResultBlob
+
+import django.db.models.deletion
+import api.models
+from django.db import migrations, models
+
+
+BATCH_SIZE = 500
+
+
+def move_to_blobs(apps, schema_editor):
+    AIResultBlob = apps.get_model('api', 'AIResultBlob')
+    OptimizationHistory = apps.get_model('api', 'OptimizationHistory')
+
+    def flush(batch, blobs):
+        AIResultBlob.objects.bulk_create(
+            [AIResultBlob(content_hash=key, data=data) for key, data in blobs.items()],
+            ignore_conflicts=True
+        )
+        OptimizationHistory.objects.bulk_update(batch, ['input_blob', 'output_blob'])
+
+    batch, blobs = [], {}
+    rows = OptimizationHistory.objects.only('id', 'input_data', 'output_data')
+    for row in rows.iterator(chunk_size=BATCH_SIZE):
+        row.input_blob_id = api.models.content_hash(row.input_data)
+        row.output_blob_id = api.models.content_hash(row.output_data)
+        blobs[row.input_blob_id] = row.input_data
+        blobs[row.output_blob_id] = row.output_data
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            flush(batch, blobs)
+            batch, blobs = [], {}
+    if batch:
+        flush(batch, blobs)
+
+
+def restore_from_blobs(apps, schema_editor):
+    OptimizationHistory = apps.get_model('api', 'OptimizationHistory')
+    batch = []
+    rows = OptimizationHistory.objects.select_related('input_blob', 'output_blob')
+    for row in rows.iterator(chunk_size=BATCH_SIZE):
+        row.input_data = row.input_blob.data
+        row.output_data = row.output_blob.data
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            OptimizationHistory.objects.bulk_update(batch, ['input_data', 'output_data'])
+            batch = []
+    if batch:
+        OptimizationHistory.objects.bulk_update(batch, ['input_data', 'output_data'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_compress_ai_payloads'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIResultBlob',
+            fields=[
+                ('content_hash', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('data', api.models.CompressedJSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='optimizationhistory',
+            name='input_blob',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='api.airesultblob'),
+        ),
+        migrations.AddField(
+            model_name='optimizationhistory',
+            name='output_blob',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='api.airesultblob'),
+        ),
+        # 旧列先改为可空，使回滚时可以在有数据的表上重新添加
+        migrations.AlterField(
+            model_name='optimizationhistory',
+            name='input_data',
+            field=models.JSONField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='optimizationhistory',
+            name='output_data',
+            field=api.models.CompressedJSONField(null=True),
+        ),
+        migrations.RunPython(move_to_blobs, restore_from_blobs),
+        migrations.RemoveField(
+            model_name='optimizationhistory',
+            name='input_data',
+        ),
+        migrations.RemoveField(
+            model_name='optimizationhistory',
+            name='output_data',
+        ),
+        migrations.AlterField(
+            model_name='optimizationhistory',
+            name='input_blob',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='api.airesultblob'),
+        ),
+        migrations.AlterField(
+            model_name='optimizationhistory',
+            name='output_blob',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='api.airesultblob'),
+        ),
+    ]
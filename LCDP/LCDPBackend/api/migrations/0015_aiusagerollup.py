@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:24
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_optimizationhistory_result_blobs'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIUsageRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('source', models.CharField(choices=[('OPTIMIZATION', 'Optimization History'), ('NLP', 'NLP Training Data')], max_length=20)),
+                ('category', models.CharField(blank=True, max_length=50)),
+                ('count', models.IntegerField(default=0)),
+                ('positive_feedback', models.IntegerField(default=0)),
+                ('corrections', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ai_usage_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-day'],
+                'unique_together': {('day', 'user', 'source', 'category')},
+            },
+        ),
+    ]
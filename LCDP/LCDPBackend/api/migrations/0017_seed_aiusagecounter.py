@@ -0,0 +1,24 @@
+# 按现有的优化历史、NLP训练数据、每日汇总和缓存条目初始化 AIUsageCounter
+
+from django.db import migrations
+
+from api.ai_usage import rebuild_usage_counters
+
+
+def seed_counters(apps, schema_editor):
+    rebuild_usage_counters(apps)
+
+
+def clear_counters(apps, schema_editor):
+    apps.get_model('api', 'AIUsageCounter').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_aiusagecounter'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_counters, clear_counters),
+    ]
@@ -1,8 +1,69 @@
+import hashlib
+import json
+import zlib
+
 from django.db import models
+from django.conf import settings
 from django.contrib.auth.models import User
 
 # Create your models here.
 
+# 压缩载荷的首字节格式标记
+PAYLOAD_FORMAT_JSON = b'j'
+PAYLOAD_FORMAT_ZLIB = b'z'
+
+
+def canonical_json(value) -> bytes:
+    """规范JSON编码 (键排序、无多余空白)，相同内容得到相同的字节"""
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def content_hash(value) -> str:
+    """JSON数据的内容哈希 (规范JSON的 SHA-256)"""
+    return hashlib.sha256(canonical_json(value)).hexdigest()
+
+
+def encode_payload(value, level=None) -> bytes:
+    """把JSON数据编码为规范JSON，按 level 进行 zlib 压缩，0 表示不压缩"""
+    level = settings.AI_PAYLOAD_COMPRESSION_LEVEL if level is None else level
+    data = canonical_json(value)
+    if level:
+        return PAYLOAD_FORMAT_ZLIB + zlib.compress(data, level)
+    return PAYLOAD_FORMAT_JSON + data
+
+
+def decode_payload(data: bytes):
+    """解码 encode_payload 生成的数据"""
+    data = bytes(data)
+    if data[:1] == PAYLOAD_FORMAT_ZLIB:
+        return json.loads(zlib.decompress(data[1:]))
+    return json.loads(data[1:])
+
+
+class CompressedJSONField(models.BinaryField):
+    """以压缩的规范JSON存储在二进制列中的JSON字段，读写时透明编解码"""
+    
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        return decode_payload(value)
+    
+    def to_python(self, value):
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return decode_payload(value)
+        if isinstance(value, str):
+            # 序列化数据 (value_to_string 输出的JSON)，例如 loaddata 导入的夹具
+            return json.loads(value)
+        return value
+    
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if value is not None and not isinstance(value, (bytes, memoryview)):
+            value = encode_payload(value)
+        return super().get_db_prep_value(value, connection, prepared)
+    
+    def value_to_string(self, obj):
+        return json.dumps(self.value_from_object(obj))
+
 class Project(models.Model):
     DEVICE_CHOICES = [
         ('web', 'Web'),
@@ -116,6 +177,16 @@ class Component(models.Model):
         return f"{self.type} on {self.page.name}"
 
 # AI功能相关模型
+class AIResultBlob(models.Model):
+    """按内容寻址的AI输入/结果数据，相同内容只保存一份，由 OptimizationHistory 引用"""
+    content_hash = models.CharField(max_length=64, primary_key=True)  # 规范JSON的 SHA-256
+    data = CompressedJSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.content_hash[:12]}..."
+
+
 class OptimizationHistory(models.Model):
     """PSO和NLP优化历史记录"""
     OPTIMIZATION_TYPES = [
@@ -128,8 +199,8 @@ class OptimizationHistory(models.Model):
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='optimizations')
     page = models.ForeignKey(Page, on_delete=models.CASCADE, related_name='optimizations', null=True, blank=True)
     optimization_type = models.CharField(max_length=50, choices=OPTIMIZATION_TYPES)
-    input_data = models.JSONField()  # 输入参数
-    output_data = models.JSONField()  # 优化结果
+    input_blob = models.ForeignKey(AIResultBlob, on_delete=models.PROTECT, related_name='+')  # 输入参数
+    output_blob = models.ForeignKey(AIResultBlob, on_delete=models.PROTECT, related_name='+')  # 优化结果
     performance_metrics = models.JSONField(default=dict)  # 性能指标
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ai_optimizations')
     created_at = models.DateTimeField(auto_now_add=True)
@@ -137,10 +208,59 @@ class OptimizationHistory(models.Model):
     class Meta:
         ordering = ['-created_at']
     
+    @property
+    def input_data(self):
+        return self.input_blob.data
+    
+    @property
+    def output_data(self):
+        return self.output_blob.data
+    
     def __str__(self):
         return f"{self.optimization_type} - {self.project.name} ({self.created_at.strftime('%Y-%m-%d')})"
 
 
+class OptimizationJob(models.Model):
+    """后台布局优化任务"""
+    JOB_TYPES = [
+        ('LAYOUT', 'Layout Optimization'),
+        ('BATCH_LAYOUT', 'Batch Layout Optimization'),
+    ]
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('RUNNING', 'Running'),
+        ('SUCCEEDED', 'Succeeded'),
+        ('FAILED', 'Failed'),
+        ('CANCELLED', 'Cancelled'),
+    ]
+    FINISHED_STATUSES = ('SUCCEEDED', 'FAILED', 'CANCELLED')
+    
+    job_type = models.CharField(max_length=20, choices=JOB_TYPES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    input_data = models.JSONField()  # 任务参数
+    result_data = models.JSONField(null=True, blank=True)  # 任务结果
+    error = models.TextField(blank=True, default='')
+    progress = models.FloatField(default=0.0)  # 0 - 1
+    cancel_requested = models.BooleanField(default=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='optimization_jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+    
+    @property
+    def is_finished(self):
+        return self.status in self.FINISHED_STATUSES
+    
+    def __str__(self):
+        return f"{self.job_type} #{self.id} - {self.status} ({self.progress:.0%})"
+
+
 class ComponentTemplate(models.Model):
     """NLP生成的组件模板"""
     name = models.CharField(max_length=100)
@@ -171,7 +291,7 @@ class AICache(models.Model):
     
     cache_type = models.CharField(max_length=50, choices=CACHE_TYPES)
     input_hash = models.CharField(max_length=64, unique=True)  # 输入数据的哈希值
-    result_data = models.JSONField()  # 缓存的结果
+    result_data = CompressedJSONField()  # 缓存的结果 (压缩存储)
     hit_count = models.IntegerField(default=0)  # 命中次数
     created_at = models.DateTimeField(auto_now_add=True)
     last_used = models.DateTimeField(auto_now=True)
@@ -179,13 +299,34 @@ class AICache(models.Model):
     class Meta:
         ordering = ['-last_used']
         indexes = [
-            models.Index(fields=['cache_type', 'input_hash']),
+            # input_hash 已有唯一索引; 该索引用于按类型淘汰最近最少使用的条目
+            models.Index(fields=['cache_type', 'last_used']),
         ]
     
     def __str__(self):
         return f"{self.cache_type} - {self.input_hash[:8]}... (hits: {self.hit_count})"
 
 
+class AICacheLease(models.Model):
+    """AI计算租约，同一缓存键同时只有一个工作进程执行计算，其他进程等待其结果"""
+    input_hash = models.CharField(max_length=64, unique=True)
+    owner = models.CharField(max_length=32)  # 持有者令牌
+    expires_at = models.DateTimeField()  # 持有者异常退出时，过期后可被其他进程接管
+    
+    def __str__(self):
+        return f"{self.input_hash[:8]}... (until {self.expires_at})"
+
+
+class AICacheInvalidation(models.Model):
+    """AI缓存失效记录，各工作进程轮询该表以清除进程内缓存中的过期条目"""
+    cache_type = models.CharField(max_length=50, blank=True)  # 为空表示所有类型
+    input_hash = models.CharField(max_length=64, blank=True)  # 为空表示该类型的所有条目
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.cache_type or '*'} - {self.input_hash[:8] or '*'}"
+
+
 class NLPTrainingData(models.Model):
     """NLP训练数据"""
     description = models.TextField()  # 用户描述
@@ -201,3 +342,42 @@ class NLPTrainingData(models.Model):
     
     def __str__(self):
         return f"Training: {self.description[:50]}... (feedback: {self.user_feedback or 'none'})"
+
+
+class AIUsageRollup(models.Model):
+    """按天、用户和类型汇总的历史使用量，保留期外的 OptimizationHistory/NLPTrainingData 归档删除前写入"""
+    SOURCES = [
+        ('OPTIMIZATION', 'Optimization History'),
+        ('NLP', 'NLP Training Data'),
+    ]
+    
+    day = models.DateField()
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ai_usage_rollups')
+    source = models.CharField(max_length=20, choices=SOURCES)
+    category = models.CharField(max_length=50, blank=True)  # 优化类型，NLP 为空
+    count = models.IntegerField(default=0)
+    positive_feedback = models.IntegerField(default=0)  # 评分 >= 4 的NLP生成数
+    corrections = models.IntegerField(default=0)  # 被用户修正的NLP生成数
+    
+    class Meta:
+        ordering = ['-day']
+        unique_together = ['day', 'user', 'source', 'category']
+    
+    def __str__(self):
+        return f"{self.day} {self.user.username} {self.source} {self.category}: {self.count}"
+
+
+class AIUsageCounter(models.Model):
+    """AI使用量计数器，写入历史、训练数据和缓存时增量更新; user 为空表示全局计数"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ai_usage_counters', null=True, blank=True)
+    name = models.CharField(max_length=50)  # 例如 optimization.PSO、nlp.generations、cache.hits
+    value = models.BigIntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'name'], name='unique_user_counter'),
+            models.UniqueConstraint(fields=['name'], condition=models.Q(user__isnull=True), name='unique_global_counter'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username if self.user else 'global'} {self.name}: {self.value}"
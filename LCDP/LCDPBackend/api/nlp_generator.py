@@ -8,9 +8,11 @@ import json
 import jieba
 import hashlib
 from typing import Dict, List, Optional, Tuple
-from django.utils import timezone
 from django.conf import settings
-from .models import ComponentTemplate, NLPTrainingData, AICache
+from django.db import transaction
+from .ai_cache import cache_result, get_cached_result
+from .ai_usage import record_training_data_usage
+from .models import ComponentTemplate, NLPTrainingData
 
 # 中文分词和关键词提取
 jieba.initialize()
@@ -516,28 +518,11 @@ class ChineseNLPProcessor:
     
     def _get_cached_result(self, cache_key: str, cache_type: str) -> Optional[Dict]:
         """获取缓存结果"""
-        try:
-            cache_entry = AICache.objects.get(
-                cache_type=cache_type,
-                input_hash=cache_key
-            )
-            cache_entry.hit_count += 1
-            cache_entry.last_used = timezone.now()
-            cache_entry.save()
-            return cache_entry.result_data
-        except AICache.DoesNotExist:
-            return None
+        return get_cached_result(cache_key, cache_type)
     
     def _cache_result(self, cache_key: str, cache_type: str, result: Dict):
         """缓存结果"""
-        try:
-            AICache.objects.create(
-                cache_type=cache_type,
-                input_hash=cache_key,
-                result_data=result
-            )
-        except Exception as e:
-            print(f"Cache save failed: {e}")
+        cache_result(cache_key, cache_type, result)
     
     def _save_training_data(self, description: str, component: Dict, user_id: int):
         """保存训练数据"""
@@ -545,11 +530,13 @@ class ChineseNLPProcessor:
             from django.contrib.auth.models import User
             user = User.objects.get(id=user_id)
             
-            NLPTrainingData.objects.create(
-                description=description,
-                generated_component=component,
-                created_by=user
-            )
+            with transaction.atomic():
+                training_data = NLPTrainingData.objects.create(
+                    description=description,
+                    generated_component=component,
+                    created_by=user
+                )
+                record_training_data_usage(training_data)
         except Exception as e:
             print(f"Training data save failed: {e}")
 
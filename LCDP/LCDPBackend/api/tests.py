@@ -1,3 +1,863 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import serializers
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import QuerySet
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import ai_cache, ai_jobs, ai_retention, ai_usage
+from .ai_optimizer import (
+    MIN_STREAM_INTERVAL_MS, ComponentLayoutOptimizer, GridLayoutOptimizer, LayoutFitnessState,
+    build_layout_constraints, skyline_pack
+)
+from .models import (
+    AICache, AICacheLease, AIResultBlob, AIUsageRollup, NLPTrainingData, OptimizationHistory,
+    OptimizationJob, Page, Project
+)
+
+
+class LayoutFitnessStateTests(SimpleTestCase):
+    """增量适应度与完整重算的一致性"""
+
+    def setUp(self):
+        self.optimizer = ComponentLayoutOptimizer()
+        self.rng = np.random.default_rng(42)
+        self.sizes = np.column_stack([
+            self.rng.integers(60, 240, 30),
+            self.rng.integers(30, 120, 30),
+        ]).astype(float)
+        self.constraints = {'canvas_width': 1200, 'canvas_height': 800}
+
+    def _state(self):
+        positions = np.round(self.rng.uniform(0, 700, (30, 2)))
+        return LayoutFitnessState(self.optimizer, positions, self.sizes, self.constraints)
+
+    def test_initial_fitness_matches_full_recompute(self):
+        state = self._state()
+        self.assertAlmostEqual(state.fitness, state.full_fitness(), delta=1e-6 * state.fitness)
+
+    def test_moves_match_full_recompute(self):
+        state = self._state()
+        for _ in range(200):
+            index = int(self.rng.integers(state.num_components))
+            x, y = np.round(self.rng.uniform(-50, 1250, 2))
+            expected = state.raw_fitness + state.delta(index, x, y)
+            state.move(index, x, y)
+            self.assertAlmostEqual(state.raw_fitness, expected, delta=1e-6 * max(1, abs(expected)))
+            self.assertAlmostEqual(state.fitness, state.full_fitness(), delta=1e-6 * max(1, state.fitness))
+
+    def test_delta_does_not_modify_state(self):
+        state = self._state()
+        before = state.positions.copy(), state.raw_fitness
+        state.delta(0, 500, 500)
+        np.testing.assert_array_equal(state.positions, before[0])
+        self.assertEqual(state.raw_fitness, before[1])
+
+
+def _random_components(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return [
+        {'id': f'comp_{i}', 'type': 'Button',
+         'width': int(rng.integers(60, 240)), 'height': int(rng.integers(30, 120))}
+        for i in range(count)
+    ]
+
+
+class LayoutGeometryTests(SimpleTestCase):
+    """优化结果无重叠且不超出画布"""
+
+    def assertValidLayout(self, layout, canvas_width, canvas_height=np.inf, size_keys=('width', 'height')):
+        positions = np.array([[item['x'], item['y']] for item in layout], dtype=float)
+        sizes = np.array([[item[key] for key in size_keys] for item in layout], dtype=float)
+        overlap = ComponentLayoutOptimizer()._brute_force_overlap(positions[None], sizes)[0]
+        self.assertEqual(overlap, 0)
+        self.assertTrue((positions >= 0).all())
+        self.assertTrue((positions + sizes <= [canvas_width, canvas_height]).all())
+
+    def _grid_components(self, count, seed=0):
+        rng = np.random.default_rng(seed)
+        return [
+            {'id': f'cell_{i}', 'x': int(rng.integers(0, 9)), 'y': int(rng.integers(0, 6)),
+             'w': int(rng.integers(1, 5)), 'h': int(rng.integers(1, 4))}
+            for i in range(count)
+        ]
+
+    def test_grid_layout_is_legal(self):
+        components = self._grid_components(20)
+        components[0].update(x=0, y=0, w=12, h=1, pinned=True)
+        components[1].update(x=5, y=4, w=3, h=2, locked=True)
+        for page in (components[2:], components):
+            optimizer = GridLayoutOptimizer(seed=0, max_iterations=20)
+            constraints = {'grid_columns': 12, 'min_spacing': 0}
+            constraints['grid_rows'] = optimizer._default_grid_rows(page, constraints)
+            layout = optimizer._optimize(page, constraints)['optimized_layout']
+            self.assertValidLayout(layout, 12, size_keys=('w', 'h'))
+            for item, comp in zip(layout, page):
+                self.assertEqual(item['id'], comp['id'])
+                if comp.get('pinned') or comp.get('locked'):
+                    self.assertEqual((item['x'], item['y']), (comp['x'], comp['y']))
+
+    def test_skyline_pack_has_no_overlap(self):
+        sizes = np.array([[comp['width'], comp['height']] for comp in _random_components(60)], dtype=float)
+        sizes[0] = [1500, 40]  # 比画布宽的组件按画布宽度放置
+        positions = skyline_pack(sizes, 1200, spacing=10)
+        layout = [
+            {'x': x, 'y': y, 'width': min(width, 1200) + 10, 'height': height + 10}
+            for (x, y), (width, height) in zip(positions, sizes)
+        ]
+        # 加上间距后仍互不重叠，最右侧的组件不需要右间距
+        self.assertValidLayout(layout, 1210)
+
+    def test_greedy_layout_is_placed_below_pinned_components(self):
+        components = _random_components(30)
+        components[0].update(x=0, y=0, width=1200, height=80, pinned=True)
+        constraints = build_layout_constraints({'method': 'greedy', 'canvas_height': 5000})
+        layout = ComponentLayoutOptimizer()._optimize(components, constraints)['optimized_layout']
+        self.assertValidLayout(layout, 1200, 5000)
+        self.assertEqual((layout[0]['x'], layout[0]['y']), (0, 0))
+        self.assertTrue(all(item['y'] >= 80 + constraints['min_spacing'] for item in layout[1:]))
+
+    def test_dense_page_decomposition_has_no_overlap(self):
+        # 150 个组件约占页面面积的 57%，各簇整块排布时容易放不下
+        components = _random_components(150)
+        area = sum(comp['width'] * comp['height'] for comp in components)
+        constraints = build_layout_constraints({'canvas_height': area / 0.57 / 1200})
+        rng = np.random.default_rng(1)
+        positioned = [
+            dict(comp, x=float(rng.uniform(0, 1200 - comp['width'])),
+                 y=float(rng.uniform(0, constraints['canvas_height'] - comp['height'])))
+            for comp in components
+        ]
+
+        for page in (components, positioned):
+            result = ComponentLayoutOptimizer(seed=0)._optimize(page, constraints)
+            self.assertGreater(result['clusters'], 1)
+            self.assertValidLayout(result['optimized_layout'], 1200, constraints['canvas_height'])
+
+
+class FitnessMetricTests(SimpleTestCase):
+    """大页面使用的可扩展指标与逐对精确计算的结果一致"""
+
+    def setUp(self):
+        self.optimizer = ComponentLayoutOptimizer()
+        self.rng = np.random.default_rng(7)
+
+    def _swarm(self, swarm_size, num_components, extent=600):
+        # 整数坐标，包含恰好相接、完全重合和差值等于对齐阈值的组件对
+        positions = self.rng.integers(0, extent, (swarm_size, num_components, 2)).astype(float)
+        positions[:, 1] = positions[:, 0]
+        positions[:, 2] = positions[:, 0] + [self.optimizer.ALIGNMENT_THRESHOLD, 0]
+        sizes = self.rng.integers(20, 120, (num_components, 2)).astype(float)
+        positions[:, 3] = positions[:, 0] + [sizes[0, 0], 0]
+        return positions, sizes
+
+    def test_sweep_and_prune_matches_brute_force(self):
+        for num_components in (5, self.optimizer.BROAD_PHASE_THRESHOLD, 150):
+            positions, sizes = self._swarm(12, num_components)
+            np.testing.assert_allclose(
+                self.optimizer._sweep_and_prune_overlap(positions, sizes),
+                self.optimizer._brute_force_overlap(positions, sizes)
+            )
+        self.assertTrue(self.optimizer._brute_force_overlap(positions, sizes).all())
+
+    def test_sorted_alignment_matches_pairwise_count(self):
+        for num_components in (5, self.optimizer.SCALABLE_METRICS_THRESHOLD, 150):
+            positions, _ = self._swarm(12, num_components)
+            np.testing.assert_array_equal(
+                self.optimizer._sorted_alignment_bonus(positions),
+                self.optimizer._calculate_alignment_bonus(positions)
+            )
+
+
+class LayoutConstraintValidationTests(TestCase):
+    """不合法的布局约束返回 400"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('constraints', password='p'))
+        self.components = _random_components(3)
+
+    def _post(self, url, constraints):
+        return self.client.post(url, {'components': self.components, 'constraints': constraints}, format='json')
+
+    def test_invalid_time_budget_is_rejected(self):
+        for url in ('/api/ai/pso/optimize-layout/', '/api/ai/pso/optimize-layout/stream/'):
+            for budget in ('abc', 0, -10, True):
+                response = self._post(url, {'time_budget_ms': budget})
+                self.assertEqual(response.status_code, 400, (url, budget))
+
+        response = self.client.post('/api/ai/batch/optimize-layouts/', {
+            'pages': [{'components': self.components, 'constraints': {'time_budget_ms': 'abc'}}]
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_stream_interval_is_validated_and_clamped(self):
+        for interval in ('fast', -1, [100]):
+            response = self._post('/api/ai/pso/optimize-layout/stream/', {'stream_interval_ms': interval})
+            self.assertEqual(response.status_code, 400, interval)
+
+        self.assertEqual(build_layout_constraints({'stream_interval_ms': 0})['stream_interval_ms'],
+                         MIN_STREAM_INTERVAL_MS)
+        self.assertEqual(build_layout_constraints({})['stream_interval_ms'], 100)
+
+    def test_numeric_time_budget_is_capped(self):
+        constraints = build_layout_constraints({'time_budget_ms': '10000000'})
+        self.assertEqual(constraints['time_budget_ms'], settings.AI_OPTIMIZER_MAX_TIME_BUDGET_MS)
+
+
+class PinnedLayoutStreamTests(TransactionTestCase):
+    """固定组件的局部重新优化在流式接口中推送完整布局"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('stream', password='p'))
+
+    def _events(self, response):
+        body = b''.join(response.streaming_content).decode('utf-8')
+        events = []
+        for chunk in body.strip().split('\n\n'):
+            event, data = chunk.split('\n', 1)
+            events.append((event[len('event: '):], json.loads(data[len('data: '):])))
+        return events
+
+    def test_progress_layouts_include_pinned_components(self):
+        components = [
+            {'id': 'header', 'width': 1200, 'height': 80, 'x': 0, 'y': 0, 'pinned': True},
+            {'id': 'footer', 'width': 1200, 'height': 60, 'x': 0, 'y': 700, 'locked': True},
+        ] + [{'id': f'card_{i}', 'width': 200, 'height': 120} for i in range(3)]
+
+        response = self.client.post('/api/ai/pso/optimize-layout/stream/', {
+            'components': components,
+            'constraints': {'stream_interval_ms': 0, 'max_iterations': 20},
+        }, format='json')
+        events = self._events(response)
+
+        kinds = [event for event, _ in events]
+        self.assertNotIn('error', kinds)
+        self.assertEqual(kinds[-1], 'result')
+        progress = [data for event, data in events if event == 'progress']
+        self.assertTrue(progress)
+        for data in progress:
+            layout = {comp['id']: comp for comp in data['layout']}
+            self.assertEqual(len(layout), len(components))
+            self.assertEqual((layout['header']['x'], layout['header']['y']), (0, 0))
+            self.assertEqual((layout['footer']['x'], layout['footer']['y']), (0, 700))
+
+
+@override_settings(AI_CACHE_LEASE_SECONDS=5, AI_CACHE_LEASE_POLL_SECONDS=0.01)
+class ComputeOnceTests(TestCase):
+    """相同缓存键的并发计算: 租约交接和等待超时"""
+
+    def setUp(self):
+        self.calls = []
+
+    def tearDown(self):
+        # 命中计入进程级缓冲区，在测试数据库销毁前写回，避免退出时写回失败
+        ai_cache.flush_hit_counts()
+
+    def _compute(self, remaining):
+        self.calls.append(remaining)
+        return {'value': 'computed'}, {'value': 'cached'}
+
+    def _hold_lease(self, cache_key, seconds):
+        AICacheLease.objects.create(
+            input_hash=cache_key, owner='other',
+            expires_at=timezone.now() + timedelta(seconds=seconds + ai_cache.LEASE_MARGIN_SECONDS)
+        )
+
+    def test_leader_computes_and_releases_lease(self):
+        cached, result = ai_cache.compute_once('leader', 'PSO_LAYOUT', self._compute, time_budget=1)
+        self.assertIsNone(cached)
+        self.assertEqual(result, {'value': 'computed'})
+        self.assertEqual(len(self.calls), 1)
+        self.assertFalse(AICacheLease.objects.exists())
+        self.assertTrue(AICache.objects.filter(input_hash='leader').exists())
+
+    def test_waiter_receives_result_of_lease_holder(self):
+        self._hold_lease('handoff', 1)
+
+        def holder_finishes(seconds):
+            # 持有租约的进程在等待者第一次轮询时写入结果并释放租约
+            ai_cache.cache_result('handoff', 'PSO_LAYOUT', {'value': 'from holder'})
+            AICacheLease.objects.filter(owner='other').delete()
+
+        with mock.patch('api.ai_cache.time.sleep', side_effect=holder_finishes):
+            cached, result = ai_cache.compute_once('handoff', 'PSO_LAYOUT', self._compute, time_budget=2)
+        self.assertEqual(cached, {'value': 'from holder'})
+        self.assertIsNone(result)
+        self.assertEqual(self.calls, [])
+
+    def test_does_not_wait_for_holder_with_later_deadline(self):
+        self._hold_lease('slow_holder', 30)
+        started_at = time.monotonic()
+        cached, result = ai_cache.compute_once('slow_holder', 'PSO_LAYOUT', self._compute, time_budget=0.2)
+        self.assertLess(time.monotonic() - started_at, 0.2)
+        self.assertIsNone(cached)
+        self.assertEqual(len(self.calls), 1)
+        self.assertGreater(self.calls[0], 0)
+
+    def test_computes_locally_when_holder_misses_deadline(self):
+        self._hold_lease('stalled', 0.1)
+        started_at = time.monotonic()
+        cached, result = ai_cache.compute_once('stalled', 'PSO_LAYOUT', self._compute, time_budget=0.3)
+        elapsed = time.monotonic() - started_at
+        self.assertIsNone(cached)
+        self.assertEqual(result, {'value': 'computed'})
+        self.assertGreaterEqual(elapsed, 0.3)
+        self.assertLess(elapsed, 1.0)
+        self.assertEqual(self.calls, [0.0])
+
+    def test_expired_lease_is_taken_over(self):
+        AICacheLease.objects.create(
+            input_hash='abandoned', owner='crashed', expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        cached, result = ai_cache.compute_once('abandoned', 'PSO_LAYOUT', self._compute, time_budget=1)
+        self.assertEqual(result, {'value': 'computed'})
+        self.assertFalse(AICacheLease.objects.exists())
+
+
+class RetentionTests(TestCase):
+    """保留策略: 汇总只统计一次，复用中的数据不被删除"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('retention', password='p')
+        self.project = Project.objects.create(name='p', owner=self.user)
+        self.page = Page.objects.create(name='pg', project=self.project, owner=self.user, layout_config={})
+        self.archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.archive_dir.cleanup)
+        self.old = timezone.now() - timedelta(days=400)
+
+    def _history(self, count, created_at=None):
+        for i in range(count):
+            input_hash, output_hash = ai_cache.store_result_blobs({'input': i}, {'output': i})
+            record = OptimizationHistory.objects.create(
+                project=self.project, page=self.page, optimization_type='LAYOUT', user=self.user,
+                input_blob_id=input_hash, output_blob_id=output_hash
+            )
+            if created_at:
+                OptimizationHistory.objects.filter(pk=record.pk).update(created_at=created_at)
+
+    def _apply(self):
+        return ai_retention.apply_retention(retention_days=30, archive_dir=self.archive_dir.name, batch_size=2)
+
+    def test_repeated_runs_count_each_record_once(self):
+        self._history(3, created_at=self.old)
+        self._history(2)
+        NLPTrainingData.objects.create(
+            description='按钮', generated_component={}, user_feedback=5, created_by=self.user
+        )
+        NLPTrainingData.objects.update(created_at=self.old)
+
+        results = self._apply()
+        self._apply()
+
+        self.assertEqual(results['optimization_history']['rows'], 3)
+        self.assertEqual(len(results['optimization_history']['files']), 2)
+        self.assertTrue(all(os.path.exists(path) for path in results['optimization_history']['files']))
+        self.assertEqual(OptimizationHistory.objects.count(), 2)
+        rollup = AIUsageRollup.objects.get(source='OPTIMIZATION', category='LAYOUT')
+        self.assertEqual(rollup.count, 3)
+        rollup = AIUsageRollup.objects.get(source='NLP')
+        self.assertEqual((rollup.count, rollup.positive_feedback), (1, 1))
+
+    def test_interrupted_batch_is_not_counted_twice(self):
+        self._history(2, created_at=self.old)
+        with mock.patch.object(ai_retention, '_apply_history_rollups', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self._apply()
+        self.assertEqual(OptimizationHistory.objects.count(), 2)
+
+        results = self._apply()
+        self.assertEqual(len(os.listdir(os.path.dirname(results['optimization_history']['files'][0]))), 1)
+        self.assertEqual(AIUsageRollup.objects.get(source='OPTIMIZATION').count, 2)
+
+    def test_concurrently_created_rollup_is_updated(self):
+        day = self.old.date()
+        AIUsageRollup.objects.create(day=day, user=self.user, source='NLP', count=1)
+        update = QuerySet.update
+        calls = []
+
+        def first_update_misses(queryset, **kwargs):
+            # 模拟第一次更新时汇总行尚未被并发任务创建
+            calls.append(kwargs)
+            return 0 if len(calls) == 1 else update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', first_update_misses):
+            ai_retention._add_rollup(day, self.user.id, 'NLP', '', 2, positive_feedback=1)
+        rollup = AIUsageRollup.objects.get(day=day, user=self.user, source='NLP')
+        self.assertEqual((rollup.count, rollup.positive_feedback), (3, 1))
+
+    def test_reused_blob_is_not_purged(self):
+        reused, expired = ai_cache.store_result_blobs({'reused': True}, {'expired': True})
+        AIResultBlob.objects.update(created_at=self.old)
+        ai_cache.store_result_blobs({'reused': True})
+
+        deleted = ai_retention.delete_unreferenced_blobs(timezone.now() - timedelta(days=30), batch_size=10)
+        self.assertEqual(deleted, 1)
+        self.assertTrue(AIResultBlob.objects.filter(pk=reused).exists())
+        self.assertFalse(AIResultBlob.objects.filter(pk=expired).exists())
+
+
+class UsageCounterTests(TestCase):
+    """增量维护的计数器与 rebuild_usage_counters 的结果一致"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('counters', password='p')
+        self.project = Project.objects.create(name='p', owner=self.user)
+        self.page = Page.objects.create(name='pg', project=self.project, owner=self.user, layout_config={})
+        self.archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.archive_dir.cleanup)
+        self.old = timezone.now() - timedelta(days=400)
+
+    def _counters(self):
+        # 减到 0 的计数器仍保留在表中，重建时不写入，读取时二者等价
+        return {
+            scope: {name: value for name, value in values.items() if value}
+            for scope, values in ai_usage.get_usage_counters(self.user.id).items()
+        }
+
+    def _assert_counters_match_rebuild(self):
+        counters = self._counters()
+        ai_usage.rebuild_usage_counters()
+        self.assertEqual(self._counters(), counters)
+        return counters
+
+    def _training_data(self, **fields):
+        training_data = NLPTrainingData.objects.create(
+            description='按钮', generated_component={}, created_by=self.user, **fields
+        )
+        ai_usage.record_training_data_usage(training_data)
+        return training_data
+
+    def _history(self, count, created_at=None, page=None):
+        for i in range(count):
+            input_hash, output_hash = ai_cache.store_result_blobs({'input': i}, {'output': i})
+            record = OptimizationHistory.objects.create(
+                project=self.project, page=page or self.page, optimization_type='LAYOUT',
+                user=self.user, input_blob_id=input_hash, output_blob_id=output_hash
+            )
+            ai_usage.increment_usage({ai_usage.OPTIMIZATION_COUNTER.format('LAYOUT'): 1}, self.user.id)
+            if created_at:
+                OptimizationHistory.objects.filter(pk=record.pk).update(created_at=created_at)
+
+    def test_counters_follow_deletes_and_retention(self):
+        other_page = Page.objects.create(name='other', project=self.project, owner=self.user, layout_config={})
+        self._history(3, created_at=self.old)
+        self._history(2, page=other_page)
+        self._training_data(user_feedback=5)
+        self._training_data(corrected_component={'type': 'Input'}).delete()
+        NLPTrainingData.objects.update(created_at=self.old)
+        counters = self._assert_counters_match_rebuild()
+        self.assertEqual(counters['user'][ai_usage.OPTIMIZATION_COUNTER.format('LAYOUT')], 5)
+        self.assertNotIn(ai_usage.NLP_CORRECTIONS, counters['user'])
+
+        other_page.delete()
+        counters = self._assert_counters_match_rebuild()
+        self.assertEqual(counters['user'][ai_usage.OPTIMIZATION_COUNTER.format('LAYOUT')], 3)
+
+        ai_retention.apply_retention(retention_days=30, archive_dir=self.archive_dir.name, batch_size=2)
+        counters = self._assert_counters_match_rebuild()
+        self.assertEqual(counters['user'][ai_usage.OPTIMIZATION_COUNTER.format('LAYOUT')], 3)
+        self.assertEqual(counters['user'][ai_usage.NLP_GENERATIONS], 1)
+
+    def test_retention_batch_does_not_update_counters(self):
+        self._history(6, created_at=self.old)
+        for _ in range(4):
+            self._training_data(user_feedback=5)
+        NLPTrainingData.objects.update(created_at=self.old)
+        counters = self._counters()
+
+        with CaptureQueriesContext(connection) as queries:
+            ai_retention.apply_retention(retention_days=30, archive_dir=self.archive_dir.name, batch_size=10)
+        counter_queries = [q['sql'] for q in queries if 'api_aiusagecounter' in q['sql']]
+        self.assertEqual(counter_queries, [])
+        self.assertEqual(self._counters(), counters)
+        self.assertFalse(OptimizationHistory.objects.exists())
+        self._assert_counters_match_rebuild()
+
+        # 保留策略之外的删除仍减少计数
+        self._history(1)
+        OptimizationHistory.objects.all().delete()
+        self.assertEqual(self._counters(), counters)
+
+    def test_user_delete_removes_counters(self):
+        self._history(1)
+        self._training_data()
+        self.user.delete()
+        self.assertFalse(ai_usage.AIUsageCounter.objects.exists())
+
+
+class CompressedJSONFieldTests(TestCase):
+    """压缩JSON字段经序列化 (dumpdata/loaddata) 往返后内容不变"""
+
+    def test_serialization_round_trip(self):
+        payload = {'components': [{'id': 'c0', 'x': 1.5}], 'text': '按钮'}
+        content_hash, = ai_cache.store_result_blobs(payload)
+        data = serializers.serialize('json', AIResultBlob.objects.filter(pk=content_hash))
+        AIResultBlob.objects.all().delete()
+
+        for obj in serializers.deserialize('json', data):
+            obj.save()
+        self.assertEqual(AIResultBlob.objects.get(pk=content_hash).data, payload)
+
+
+class ClearCacheCommandTests(TestCase):
+    """clear_ai_cache 删除数据库条目，其他工作进程轮询后清除本地缓存"""
+
+    def test_other_workers_drop_cleared_entries(self):
+        ai_cache.cache_result('stale', 'PSO_LAYOUT', {'value': 'old'})
+        ai_cache.cache_result('kept', 'NLP_COMPONENT', {'value': 'kept'})
+        worker_cache = ai_cache.LocalLRUCache(max_entries=10, ttl_seconds=60)
+        watcher = ai_cache.InvalidationWatcher(worker_cache, poll_seconds=0)
+        watcher.poll()
+        worker_cache.set(('PSO_LAYOUT', 'stale'), {'value': 'old'})
+        worker_cache.set(('NLP_COMPONENT', 'kept'), {'value': 'kept'})
+
+        call_command('clear_ai_cache', '--type', 'PSO_LAYOUT', stdout=StringIO())
+        watcher.poll()
+
+        self.assertIsNone(worker_cache.get(('PSO_LAYOUT', 'stale')))
+        self.assertEqual(worker_cache.get(('NLP_COMPONENT', 'kept')), {'value': 'kept'})
+        self.assertEqual(list(AICache.objects.values_list('input_hash', flat=True)), ['kept'])
+
+    def test_requires_explicit_scope(self):
+        with self.assertRaises(CommandError):
+            call_command('clear_ai_cache')
+
+
+class CacheEvictionTests(TestCase):
+    """按有效期和条目上限清理 AICache"""
+
+    def _entry(self, cache_key, days_unused, hit_count=0, cache_type='PSO_LAYOUT'):
+        ai_cache.cache_result(cache_key, cache_type, {'key': cache_key})
+        AICache.objects.filter(input_hash=cache_key).update(
+            last_used=timezone.now() - timedelta(days=days_unused), hit_count=hit_count
+        )
+        ai_usage.increment_usage({ai_usage.CACHE_HITS: hit_count})
+
+    def _keys(self):
+        return set(AICache.objects.values_list('input_hash', flat=True))
+
+    def test_expired_entries_are_deleted(self):
+        self._entry('expired', 40, hit_count=3)
+        self._entry('recent', 1)
+        reclaimed = ai_cache.evict_cache_entries(ttl_days=30, max_entries={}, batch_size=10)
+        self.assertEqual(reclaimed['PSO_LAYOUT']['rows'], 1)
+        self.assertGreater(reclaimed['PSO_LAYOUT']['bytes'], 0)
+        self.assertEqual(self._keys(), {'recent'})
+
+    def test_least_recently_used_entries_above_limit_are_deleted(self):
+        self._entry('oldest', 5)
+        self._entry('old_rarely_hit', 3, hit_count=1)
+        self._entry('old_often_hit', 3, hit_count=9)
+        self._entry('newest', 1)
+        self._entry('other_type', 9, cache_type='NLP_COMPONENT')
+        reclaimed = ai_cache.evict_cache_entries(ttl_days=0, max_entries={'PSO_LAYOUT': 2}, batch_size=1)
+        self.assertEqual(reclaimed['PSO_LAYOUT']['rows'], 2)
+        self.assertEqual(self._keys(), {'old_often_hit', 'newest', 'other_type'})
+
+    def test_dry_run_only_reports(self):
+        self._entry('expired', 40)
+        reclaimed = ai_cache.evict_cache_entries(ttl_days=30, max_entries={}, dry_run=True)
+        self.assertEqual(reclaimed['PSO_LAYOUT']['rows'], 1)
+        self.assertEqual(self._keys(), {'expired'})
+
+    def test_counters_match_rebuild_after_eviction(self):
+        self._entry('expired', 40, hit_count=3)
+        self._entry('recent', 1, hit_count=2)
+        ai_cache.evict_cache_entries(ttl_days=30, max_entries={})
+        counters = ai_usage.get_usage_counters(None)['global']
+        self.assertEqual((counters[ai_usage.CACHE_ENTRIES], counters[ai_usage.CACHE_HITS]), (1, 2))
+        ai_usage.rebuild_usage_counters()
+        self.assertEqual(ai_usage.get_usage_counters(None)['global'], counters)
+
+
+class HitCounterTests(TestCase):
+    """命中次数在内存中累计，flush 时合并写回 AICache 和计数器"""
+
+    def setUp(self):
+        self.counter = ai_cache.HitCounter()
+        for cache_key in ('a', 'b', 'c'):
+            ai_cache.cache_result(cache_key, 'PSO_LAYOUT', {'key': cache_key})
+        AICache.objects.update(last_used=timezone.now() - timedelta(days=1))
+
+    def test_flush_writes_buffered_hits(self):
+        for cache_key in ('a', 'a', 'b', 'a', 'missing'):
+            self.counter.record(cache_key)
+        yesterday = timezone.now() - timedelta(hours=12)
+
+        self.assertEqual(AICache.objects.filter(hit_count__gt=0).count(), 0)
+        self.assertEqual(self.counter.flush(), 5)
+        hits = dict(AICache.objects.values_list('input_hash', 'hit_count'))
+        self.assertEqual(hits, {'a': 3, 'b': 1, 'c': 0})
+        self.assertEqual(AICache.objects.filter(last_used__gt=yesterday).count(), 2)
+        self.assertEqual(ai_usage.get_usage_counters(None)['global'][ai_usage.CACHE_HITS], 4)
+
+    def test_empty_flush_makes_no_queries(self):
+        self.counter.record('a')
+        self.counter.flush()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.counter.flush(), 0)
+
+    def test_failed_flush_keeps_hits_for_retry(self):
+        self.counter.record('a')
+        with mock.patch('api.ai_cache.increment_usage', side_effect=RuntimeError('db down')):
+            with self.assertLogs('api.ai_cache', 'WARNING'):
+                self.assertEqual(self.counter.flush(), 0)
+        self.assertEqual(AICache.objects.get(input_hash='a').hit_count, 0)
+        self.counter.flush()
+        self.assertEqual(AICache.objects.get(input_hash='a').hit_count, 1)
+
+
+class SeedUsageCountersMigrationTests(TransactionTestCase):
+    """0017 数据迁移按现有数据初始化计数器"""
+
+    def _migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate([('api', target)])
+        return executor.loader.project_state([('api', target)]).apps
+
+    def test_counters_are_seeded_from_existing_rows(self):
+        apps = self._migrate('0016_aiusagecounter')
+        user = apps.get_model('auth', 'User').objects.create(username='seed')
+        project = apps.get_model('api', 'Project').objects.create(name='p', owner=user)
+        blob = apps.get_model('api', 'AIResultBlob').objects.create(content_hash='h', data={})
+        for _ in range(2):
+            apps.get_model('api', 'OptimizationHistory').objects.create(
+                project=project, optimization_type='LAYOUT', user=user,
+                input_blob=blob, output_blob=blob
+            )
+        apps.get_model('api', 'AICache').objects.create(
+            cache_type='PSO_LAYOUT', input_hash='k', result_data={}, hit_count=4
+        )
+
+        self._migrate('0017_seed_aiusagecounter')
+        counters = ai_usage.get_usage_counters(user.id)
+        self.assertEqual(counters['user'], {ai_usage.OPTIMIZATION_COUNTER.format('LAYOUT'): 2})
+        self.assertEqual(counters['global'], {ai_usage.CACHE_ENTRIES: 1, ai_usage.CACHE_HITS: 4})
+
+
+class OptimizationJobTests(TestCase):
+    """后台优化任务: 提交、状态、取消、失败和中断后重新排队 (同步执行 run_optimization_job)"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('jobs', password='p')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _submit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post('/api/ai/pso/optimize-layout/', {
+                'components': _random_components(4),
+                'constraints': {'max_iterations': 5},
+                'async': True,
+            }, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(len(callbacks), 1)
+        return response.data['job_id']
+
+    def _status(self, job_id):
+        return self.client.get(f'/api/ai/jobs/{job_id}/').data['job']
+
+    def test_job_runs_to_success(self):
+        job_id = self._submit()
+        self.assertEqual(self._status(job_id)['status'], 'PENDING')
+
+        statuses = []
+        report = ai_jobs.JobProgressReporter.report
+
+        def record_status(reporter, progress, force=False):
+            statuses.append(OptimizationJob.objects.get(pk=job_id).status)
+            return report(reporter, progress, force)
+
+        with mock.patch.object(ai_jobs.JobProgressReporter, 'report', record_status):
+            ai_jobs.run_optimization_job(job_id)
+
+        self.assertEqual(set(statuses), {'RUNNING'})
+        job = self._status(job_id)
+        self.assertEqual((job['status'], job['progress']), ('SUCCEEDED', 1.0))
+        self.assertEqual(len(job['result']['optimized_layout']), 4)
+        self.assertIsNotNone(job['finished_at'])
+
+    def test_cancel_pending_job(self):
+        job_id = self._submit()
+        response = self.client.post(f'/api/ai/jobs/{job_id}/cancel/')
+        self.assertEqual(response.data['status'], 'CANCELLED')
+
+        ai_jobs.run_optimization_job(job_id)
+        self.assertEqual(self._status(job_id)['status'], 'CANCELLED')
+        self.assertEqual(self.client.post(f'/api/ai/jobs/{job_id}/cancel/').status_code, 409)
+
+    def test_cancel_running_job(self):
+        job_id = self._submit()
+        report = ai_jobs.JobProgressReporter.report
+
+        def cancel_then_report(reporter, progress, force=False):
+            # 运行中请求取消，下一次写入进度时停止
+            self.client.post(f'/api/ai/jobs/{job_id}/cancel/')
+            return report(reporter, progress, force)
+
+        with mock.patch.object(ai_jobs.JobProgressReporter, 'report', cancel_then_report):
+            ai_jobs.run_optimization_job(job_id)
+        job = self._status(job_id)
+        self.assertEqual(job['status'], 'CANCELLED')
+        self.assertTrue(job['cancel_requested'])
+        self.assertIsNone(job['result'])
+
+    def test_failed_job_records_error(self):
+        job = OptimizationJob.objects.create(user=self.user, job_type='LAYOUT', input_data={'components': []})
+        ai_jobs.run_optimization_job(job.id)
+        job = self._status(job.id)
+        self.assertEqual(job['status'], 'FAILED')
+        self.assertIn('constraints', job['error'])
+
+    def test_requeue_stale_jobs(self):
+        stale = OptimizationJob.objects.create(
+            user=self.user, job_type='BATCH_LAYOUT', status='RUNNING',
+            started_at=timezone.now() - timedelta(hours=2),
+            input_data={'pages': [{'page_id': 1, 'components': _random_components(3)}],
+                        'constraints': {'max_iterations': 5}}
+        )
+        recent = OptimizationJob.objects.create(
+            user=self.user, job_type='LAYOUT', status='RUNNING', started_at=timezone.now(),
+            input_data={}
+        )
+        call_command('process_optimization_jobs', '--requeue-stale', '30', stdout=StringIO())
+
+        stale.refresh_from_db()
+        recent.refresh_from_db()
+        self.assertEqual(stale.status, 'SUCCEEDED')
+        self.assertEqual(stale.result_data['summary']['successful_optimizations'], 1)
+        self.assertEqual(recent.status, 'RUNNING')
+
+
+class PageOptimizeLayoutTests(TestCase):
+    """页面布局优化接口: 保存、dry_run 和并发修改冲突"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('pages', password='p')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        project = Project.objects.create(name='p', owner=self.user)
+        self.components = [
+            {'id': f'card_{i}', 'type': 'Card', 'x': 0, 'y': 0, 'w': 4, 'h': 3} for i in range(3)
+        ]
+        self.page = Page.objects.create(
+            name='pg', project=project, owner=self.user, layout_config={'components': self.components}
+        )
+        self.url = f'/api/pages/{self.page.id}/optimize-layout/'
+
+    def tearDown(self):
+        # 命中计入进程级缓冲区，在测试数据库销毁前写回，避免退出时写回失败
+        ai_cache.flush_hit_counts()
+
+    def _post(self, data, format='json'):
+        return self.client.post(self.url, dict({'constraints': {'max_iterations': 5}}, **data), format=format)
+
+    def _stored_components(self):
+        self.page.refresh_from_db()
+        return self.page.layout_config['components']
+
+    def test_saves_layout_with_history(self):
+        response = self._post({})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.data['dry_run'])
+        self.assertEqual(self._stored_components(), response.data['result']['optimized_layout'])
+        self.assertEqual(OptimizationHistory.objects.filter(page=self.page).count(), 1)
+
+    def test_dry_run_parsing(self):
+        # 表单提交的值都是字符串
+        for value, dry_run in (('true', True), ('1', True), ('false', False), ('0', False)):
+            response = self.client.post(self.url, {'dry_run': value})
+            self.assertEqual(response.data['dry_run'], dry_run, value)
+
+    def test_dry_run_does_not_save(self):
+        response = self._post({'dry_run': True})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._stored_components(), self.components)
+        self.assertFalse(OptimizationHistory.objects.exists())
+
+    def test_concurrent_edit_returns_conflict(self):
+        optimize_layout = GridLayoutOptimizer.optimize_layout
+        edited = [dict(self.components[0], x=8)] + self.components[1:]
+
+        def edit_during_optimization(optimizer, components, constraints, progress_callback=None):
+            Page.objects.filter(pk=self.page.pk).update(layout_config={'components': edited})
+            return optimize_layout(optimizer, components, constraints, progress_callback)
+
+        with mock.patch.object(GridLayoutOptimizer, 'optimize_layout', edit_during_optimization):
+            response = self._post({})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self._stored_components(), edited)
+        self.assertFalse(OptimizationHistory.objects.exists())
+
+    def test_history_failure_rolls_back_layout(self):
+        with mock.patch('api.views.page_views.record_layout_history', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self._post({})
+        self.assertEqual(self._stored_components(), self.components)
+
+    def test_non_object_constraints_are_rejected(self):
+        for constraints in (['solver'], 'pso', 5):
+            response = self.client.post(self.url, {'constraints': constraints}, format='json')
+            self.assertEqual(response.status_code, 400, constraints)
+
+
+class StructuralLayoutCacheTests(TestCase):
+    """组件顺序和ID不同但矩形相同的页面命中同一缓存，坐标映射回对应组件"""
+
+    def setUp(self):
+        # 进程内缓存不随测试事务回滚
+        ai_cache._local_cache.discard()
+        self.constraints = build_layout_constraints({'max_iterations': 10, 'swarm_size': 10})
+        self.components = [
+            {'id': f'a{i}', 'type': 'Card', 'width': 100 + 20 * i, 'height': 60 + 10 * i}
+            for i in range(5)
+        ]
+
+    def tearDown(self):
+        # 命中计入进程级缓冲区，在测试数据库销毁前写回，避免退出时写回失败
+        ai_cache.flush_hit_counts()
+
+    def _positions_by_size(self, result):
+        return {
+            (item['width'], item['height']): (item['x'], item['y'])
+            for item in result['optimized_layout']
+        }
+
+    def test_reordered_and_renamed_components_hit_cache(self):
+        first = ComponentLayoutOptimizer(seed=0).optimize_layout(self.components, self.constraints)
+        renamed = [
+            dict(comp, id=f'b{i}', properties={'text': str(i)})
+            for i, comp in enumerate(reversed(self.components))
+        ]
+
+        with mock.patch.object(ComponentLayoutOptimizer, '_optimize', side_effect=AssertionError('cache miss')):
+            second = ComponentLayoutOptimizer(seed=1).optimize_layout(renamed, self.constraints)
+
+        self.assertEqual([item['id'] for item in second['optimized_layout']], [comp['id'] for comp in renamed])
+        self.assertEqual(second['optimized_layout'][0]['properties'], {'text': '0'})
+        self.assertEqual(self._positions_by_size(second), self._positions_by_size(first))
+        self.assertEqual(second['fitness_score'], first['fitness_score'])
+
+    def test_different_sizes_miss_cache(self):
+        ComponentLayoutOptimizer(seed=0).optimize_layout(self.components, self.constraints)
+        resized = [dict(self.components[0], width=999)] + self.components[1:]
+        with mock.patch.object(ComponentLayoutOptimizer, '_optimize', side_effect=AssertionError('cache miss')):
+            with self.assertRaisesMessage(AssertionError, 'cache miss'):
+                ComponentLayoutOptimizer(seed=0).optimize_layout(resized, self.constraints)
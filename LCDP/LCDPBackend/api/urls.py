@@ -12,6 +12,7 @@ from .views import (
 from .views.generation_views import generate_project, generation_status
 from .views.ai_views import (
     PSOLayoutOptimizationView,
+    PSOLayoutStreamView,
     ColorSchemeOptimizationView,
     NLPComponentGenerationView,
     SmartRecommendationView,
@@ -20,6 +21,8 @@ from .views.ai_views import (
     nlp_feedback,
     ai_statistics,
     batch_optimize_layouts,
+    optimization_job_status,
+    cancel_optimization_job,
     generate_component_variations
 )
 
@@ -45,6 +48,7 @@ urlpatterns = [
     
     # AI功能端点
     path('ai/pso/optimize-layout/', PSOLayoutOptimizationView.as_view(), name='pso_optimize_layout'),
+    path('ai/pso/optimize-layout/stream/', PSOLayoutStreamView.as_view(), name='pso_optimize_layout_stream'),
     path('ai/pso/optimize-colors/', ColorSchemeOptimizationView.as_view(), name='pso_optimize_colors'),
     path('ai/nlp/generate-component/', NLPComponentGenerationView.as_view(), name='nlp_generate_component'),
     path('ai/nlp/recommend/', SmartRecommendationView.as_view(), name='nlp_recommend'),
@@ -54,4 +58,6 @@ urlpatterns = [
     path('ai/feedback/', nlp_feedback, name='nlp_feedback'),
     path('ai/statistics/', ai_statistics, name='ai_statistics'),
     path('ai/batch/optimize-layouts/', batch_optimize_layouts, name='batch_optimize_layouts'),
+    path('ai/jobs/<int:job_id>/', optimization_job_status, name='optimization_job_status'),
+    path('ai/jobs/<int:job_id>/cancel/', cancel_optimization_job, name='cancel_optimization_job'),
 ] 
\ No newline at end of file
@@ -3,7 +3,12 @@ AI功能相关视图 - PSO和NLP API端点
 """
 
 import json
-from django.http import JsonResponse
+import queue
+import threading
+import time
+from django.db import close_old_connections, transaction
+from django.http import JsonResponse, StreamingHttpResponse
+from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth.decorators import login_required
@@ -15,9 +20,19 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.views import APIView
 
-from ..ai_optimizer import ComponentLayoutOptimizer, ColorSchemeOptimizer
+from ..ai_optimizer import (
+    ColorSchemeOptimizer, InvalidLayoutConstraints, OptimizationCancelled,
+    build_batch_page_constraints, build_layout_constraints, create_layout_optimizer,
+    record_layout_history, optimize_layout_batch, summarize_layout_batch
+)
+from ..ai_jobs import submit_optimization_job, request_job_cancellation
+from ..ai_solvers import SOLVERS
+from ..ai_usage import (
+    CACHE_ENTRIES, CACHE_HITS, NLP_CORRECTIONS, NLP_GENERATIONS, NLP_POSITIVE_FEEDBACK,
+    OPTIMIZATION_COUNTER, get_usage_counters, record_training_data_usage
+)
 from ..nlp_generator import ChineseNLPProcessor, SmartRecommendationEngine, TranslationService
-from ..models import OptimizationHistory, Project, Page
+from ..models import OptimizationHistory, OptimizationJob
 
 
 class PSOLayoutOptimizationView(APIView):
@@ -38,49 +53,30 @@ class PSOLayoutOptimizationView(APIView):
                 }, status=status.HTTP_400_BAD_REQUEST)
             
             # 设置默认约束
-            default_constraints = {
-                'canvas_width': 1200,
-                'canvas_height': 800,
-                'min_spacing': 10,
-                'max_iterations': 100,
-                'swarm_size': 30
-            }
-            default_constraints.update(constraints)
+            default_constraints = build_layout_constraints(constraints)
+            invalid = _unsupported_solver_response(default_constraints['solver'])
+            if invalid:
+                return invalid
             
-            # 执行PSO优化
-            optimizer = ComponentLayoutOptimizer(
-                swarm_size=default_constraints['swarm_size'],
-                max_iterations=default_constraints['max_iterations']
-            )
+            # 异步模式: 提交到后台任务队列，立即返回任务ID
+            if request.data.get('async'):
+                job = submit_optimization_job(request.user, 'LAYOUT', {
+                    'components': components,
+                    'constraints': default_constraints,
+                    'project_id': project_id,
+                    'page_id': page_id
+                })
+                return _job_accepted_response(request, job)
             
+            # 执行PSO优化
+            optimizer = create_layout_optimizer(default_constraints)
             result = optimizer.optimize_layout(components, default_constraints)
             
             # 保存优化历史
-            if project_id:
-                try:
-                    project = Project.objects.get(id=project_id, owner=request.user)
-                    page = None
-                    if page_id:
-                        page = Page.objects.get(id=page_id, project=project)
-                    
-                    OptimizationHistory.objects.create(
-                        project=project,
-                        page=page,
-                        optimization_type='PSO',
-                        input_data={
-                            'components': components,
-                            'constraints': default_constraints
-                        },
-                        output_data=result,
-                        performance_metrics={
-                            'fitness_score': result.get('fitness_score', 0),
-                            'iterations': result.get('iterations', 0),
-                            'improvement': result.get('improvement', 0)
-                        },
-                        user=request.user
-                    )
-                except (Project.DoesNotExist, Page.DoesNotExist):
-                    pass  # 不影响主要功能
+            record_layout_history(
+                request.user, project_id, page_id,
+                components, default_constraints, result
+            )
             
             return Response({
                 'success': True,
@@ -88,6 +84,8 @@ class PSOLayoutOptimizationView(APIView):
                 'message': f'布局优化完成，经过{result.get("iterations", 0)}次迭代'
             })
             
+        except InvalidLayoutConstraints as e:
+            return _invalid_constraints_response(e)
         except Exception as e:
             return Response({
                 'success': False,
@@ -95,6 +93,113 @@ class PSOLayoutOptimizationView(APIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class PSOLayoutStreamView(APIView):
+    """PSO布局优化 - 以 server-sent events 推送每轮迭代进度
+    
+    事件类型: progress (迭代轮数、最优适应度和当前最优布局)、
+    result (完整优化结果) 和 error。客户端断开连接即视为提前接受
+    当前布局，优化随之停止。
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request):
+        components = request.data.get('components', [])
+        if not components:
+            return Response({
+                'success': False,
+                'message': '组件列表不能为空'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            constraints = build_layout_constraints(request.data.get('constraints', {}))
+        except InvalidLayoutConstraints as e:
+            return _invalid_constraints_response(e)
+        invalid = _unsupported_solver_response(constraints['solver'])
+        if invalid:
+            return invalid
+        
+        response = StreamingHttpResponse(
+            _stream_layout_events(
+                request.user, components, constraints,
+                request.data.get('project_id'), request.data.get('page_id')
+            ),
+            content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # 禁止反向代理缓冲
+        return response
+
+
+def _invalid_constraints_response(error):
+    """布局约束不合法时的 400 响应"""
+    return Response({
+        'success': False,
+        'message': f'约束参数不合法: {error}'
+    }, status=status.HTTP_400_BAD_REQUEST)
+
+
+def _unsupported_solver_response(solver):
+    """solver 不是已注册的优化算法时返回 400 响应"""
+    if solver in SOLVERS:
+        return None
+    return Response({
+        'success': False,
+        'message': f"不支持的优化算法: {solver}，可选: {', '.join(SOLVERS)}"
+    }, status=status.HTTP_400_BAD_REQUEST)
+
+
+def _sse_event(event: str, data) -> str:
+    """格式化一条 server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _stream_layout_events(user, components, constraints, project_id, page_id):
+    """在后台线程中运行优化，把进度事件逐条产出给流式响应"""
+    events = queue.Queue()
+    stopped = threading.Event()
+    interval = constraints['stream_interval_ms'] / 1000
+    optimizer = create_layout_optimizer(constraints)
+    last_sent = [0.0]
+    
+    def on_progress(iterations, max_iterations, best_fitness):
+        # 客户端已断开，停止优化
+        if stopped.is_set():
+            raise OptimizationCancelled()
+        now = time.monotonic()
+        if now - last_sent[0] < interval:
+            return
+        last_sent[0] = now
+        events.put(('progress', {
+            'iteration': iterations,
+            'max_iterations': max_iterations,
+            'best_fitness': best_fitness,
+            'layout': optimizer.current_best_layout(components, constraints)
+        }))
+    
+    def run():
+        try:
+            result = optimizer.optimize_layout(components, constraints, on_progress)
+            record_layout_history(user, project_id, page_id, components, constraints, result)
+            events.put(('result', result))
+        except OptimizationCancelled:
+            pass
+        except Exception as e:
+            events.put(('error', {'message': f'优化失败: {str(e)}'}))
+        finally:
+            events.put(None)
+            close_old_connections()
+    
+    threading.Thread(target=run, daemon=True).start()
+    try:
+        while True:
+            item = events.get()
+            if item is None:
+                break
+            yield _sse_event(*item)
+    finally:
+        stopped.set()
+
+
 class ColorSchemeOptimizationView(APIView):
     """颜色方案优化视图"""
     permission_classes = [IsAuthenticated]
@@ -112,8 +217,13 @@ class ColorSchemeOptimizationView(APIView):
             }
             default_requirements.update(requirements)
             
+            solver = request.data.get('solver', 'pso')
+            invalid = _unsupported_solver_response(solver)
+            if invalid:
+                return invalid
+            
             # 执行颜色优化
-            optimizer = ColorSchemeOptimizer()
+            optimizer = ColorSchemeOptimizer(solver=solver)
             result = optimizer.optimize_color_scheme(base_color, default_requirements)
             
             return Response({
@@ -296,14 +406,16 @@ def nlp_feedback(request):
         
         # 保存反馈数据
         from ..models import NLPTrainingData
-        training_data = NLPTrainingData.objects.create(
-            description=description,
-            generated_component=generated_component,
-            user_feedback=feedback_score,
-            is_correct=is_correct,
-            corrected_component=corrected_component,
-            created_by=request.user
-        )
+        with transaction.atomic():
+            training_data = NLPTrainingData.objects.create(
+                description=description,
+                generated_component=generated_component,
+                user_feedback=feedback_score,
+                is_correct=is_correct,
+                corrected_component=corrected_component,
+                created_by=request.user
+            )
+            record_training_data_usage(training_data)
         
         return Response({
             'success': True,
@@ -325,34 +437,27 @@ def ai_statistics(request):
     try:
         user = request.user
         
+        # 计数器随写入增量更新，一次查询读取
+        counters = get_usage_counters(user.id)
+        user_counters, global_counters = counters['user'], counters['global']
+        
         # 统计优化历史
-        optimization_stats = {}
-        for opt_type in ['PSO', 'NLP', 'LAYOUT', 'COLOR']:
-            count = OptimizationHistory.objects.filter(
-                user=user, 
-                optimization_type=opt_type
-            ).count()
-            optimization_stats[opt_type] = count
+        optimization_stats = {
+            opt_type: user_counters.get(OPTIMIZATION_COUNTER.format(opt_type), 0)
+            for opt_type in ['PSO', 'NLP', 'LAYOUT', 'COLOR']
+        }
         
         # 统计NLP训练数据
-        from ..models import NLPTrainingData
         nlp_stats = {
-            'total_generations': NLPTrainingData.objects.filter(created_by=user).count(),
-            'positive_feedback': NLPTrainingData.objects.filter(
-                created_by=user, 
-                user_feedback__gte=4
-            ).count(),
-            'corrections_made': NLPTrainingData.objects.filter(
-                created_by=user, 
-                corrected_component__isnull=False
-            ).count()
+            'total_generations': user_counters.get(NLP_GENERATIONS, 0),
+            'positive_feedback': user_counters.get(NLP_POSITIVE_FEEDBACK, 0),
+            'corrections_made': user_counters.get(NLP_CORRECTIONS, 0)
         }
         
         # 缓存命中率统计
-        from ..models import AICache
         cache_stats = {
-            'total_cache_entries': AICache.objects.count(),
-            'total_hits': sum(cache.hit_count for cache in AICache.objects.all())
+            'total_cache_entries': global_counters.get(CACHE_ENTRIES, 0),
+            'total_hits': global_counters.get(CACHE_HITS, 0)
         }
         
         return Response({
@@ -387,40 +492,31 @@ def batch_optimize_layouts(request):
                 'message': '页面数据不能为空'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        results = []
-        optimizer = ComponentLayoutOptimizer()
-        
+        # 与单页优化相同，合并约束后的 solver 必须是已注册的优化算法
         for page_data in pages_data:
-            page_id = page_data.get('page_id')
-            components = page_data.get('components', [])
-            page_constraints = {**global_constraints, **page_data.get('constraints', {})}
-            
-            try:
-                result = optimizer.optimize_layout(components, page_constraints)
-                results.append({
-                    'page_id': page_id,
-                    'success': True,
-                    'result': result
-                })
-            except Exception as e:
-                results.append({
-                    'page_id': page_id,
-                    'success': False,
-                    'error': str(e)
-                })
+            page_constraints = build_batch_page_constraints(global_constraints, page_data)
+            invalid = _unsupported_solver_response(page_constraints['solver'])
+            if invalid:
+                return invalid
+        
+        # 异步模式: 提交到后台任务队列，立即返回任务ID
+        if data.get('async'):
+            job = submit_optimization_job(request.user, 'BATCH_LAYOUT', {
+                'pages': pages_data,
+                'constraints': global_constraints
+            })
+            return _job_accepted_response(request, job)
         
-        successful_count = sum(1 for r in results if r['success'])
+        results = optimize_layout_batch(pages_data, global_constraints)
         
         return Response({
             'success': True,
             'results': results,
-            'summary': {
-                'total_pages': len(pages_data),
-                'successful_optimizations': successful_count,
-                'failed_optimizations': len(pages_data) - successful_count
-            }
+            'summary': summarize_layout_batch(results)
         })
         
+    except InvalidLayoutConstraints as e:
+        return _invalid_constraints_response(e)
     except Exception as e:
         return Response({
             'success': False,
@@ -428,6 +524,76 @@ def batch_optimize_layouts(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+def _job_accepted_response(request, job):
+    """异步任务已受理的响应"""
+    return Response({
+        'success': True,
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': request.build_absolute_uri(
+            reverse('optimization_job_status', args=[job.id])
+        ),
+        'message': '优化任务已提交'
+    }, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def optimization_job_status(request, job_id):
+    """查询后台优化任务的状态、进度和结果"""
+    try:
+        job = OptimizationJob.objects.get(id=job_id, user=request.user)
+    except OptimizationJob.DoesNotExist:
+        return Response({
+            'success': False,
+            'message': '任务不存在'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    return Response({
+        'success': True,
+        'job': {
+            'id': job.id,
+            'job_type': job.job_type,
+            'status': job.status,
+            'progress': job.progress,
+            'cancel_requested': job.cancel_requested,
+            'result': job.result_data,
+            'error': job.error or None,
+            'created_at': job.created_at.isoformat(),
+            'started_at': job.started_at.isoformat() if job.started_at else None,
+            'finished_at': job.finished_at.isoformat() if job.finished_at else None
+        }
+    })
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def cancel_optimization_job(request, job_id):
+    """取消后台优化任务"""
+    try:
+        job = OptimizationJob.objects.get(id=job_id, user=request.user)
+    except OptimizationJob.DoesNotExist:
+        return Response({
+            'success': False,
+            'message': '任务不存在'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    if job.is_finished:
+        return Response({
+            'success': False,
+            'status': job.status,
+            'message': '任务已结束，无法取消'
+        }, status=status.HTTP_409_CONFLICT)
+    
+    request_job_cancellation(job)
+    job.refresh_from_db()
+    return Response({
+        'success': True,
+        'status': job.status,
+        'message': '已请求取消任务'
+    })
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def generate_component_variations(request):
@@ -2,7 +2,12 @@ from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.exceptions import PermissionDenied
+from django.db import transaction
 from django.shortcuts import get_object_or_404
+from api.ai_optimizer import (
+    InvalidLayoutConstraints, build_layout_constraints, create_layout_optimizer, record_layout_history
+)
+from api.ai_solvers import SOLVERS
 from api.models import Page, Project
 from api.serializers.page_serializers import PageSerializer, PageDetailSerializer, PageListSerializer
 
@@ -126,3 +131,64 @@ class PageViewSet(viewsets.ModelViewSet):
         
         serializer = PageSerializer(new_page)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
+    
+    @action(detail=True, methods=['post'], url_path='optimize-layout')
+    def optimize_layout(self, request, pk=None):
+        """
+        Optimize the stored layout of a page in grid mode and save it back
+        
+        The components in layout_config are optimized as they are stored
+        (grid units), so pinned/locked components and the current positions
+        are respected. The new layout and its OptimizationHistory record are
+        written in one transaction; pass dry_run to only return the result.
+        """
+        page = get_object_or_404(Page, pk=pk, owner=request.user)
+        components = (page.layout_config or {}).get('components') or []
+        if not components:
+            return Response(
+                {'success': False, 'message': 'This page has no components to optimize'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            constraints = build_layout_constraints(request.data.get('constraints') or {})
+        except InvalidLayoutConstraints as e:
+            return Response(
+                {'success': False, 'message': f'Invalid constraints: {e}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        constraints['mode'] = 'grid'
+        if constraints['solver'] not in SOLVERS:
+            return Response(
+                {'success': False, 'message': f"Unsupported solver: {constraints['solver']}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        optimizer = create_layout_optimizer(constraints)
+        result = optimizer.optimize_layout(components, constraints)
+        
+        # Form data sends strings, so "false"/"0" must not count as true
+        dry_run = str(request.data.get('dry_run', False)).lower() in ('1', 'true', 'yes')
+        if not dry_run:
+            with transaction.atomic():
+                page = Page.objects.select_for_update().get(pk=page.pk)
+                
+                # The page was edited while the optimizer was running
+                if (page.layout_config or {}).get('components') != components:
+                    return Response(
+                        {'success': False, 'message': 'The page layout changed during optimization, please retry'},
+                        status=status.HTTP_409_CONFLICT
+                    )
+                
+                page.layout_config = {**page.layout_config, 'components': result['optimized_layout']}
+                page.save(update_fields=['layout_config', 'updated_at'])
+                record_layout_history(
+                    request.user, page.project_id, page.id, components, constraints, result
+                )
+        
+        return Response({
+            'success': True,
+            'dry_run': dry_run,
+            'result': result,
+            'message': 'Layout optimized' if dry_run else 'Layout optimized and saved'
+        })
@@ -148,6 +148,53 @@ CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
 ]
 
+# AI optimizer settings
+# 岛模型PSO进程池的最大进程数，默认使用全部CPU核心
+AI_OPTIMIZER_MAX_WORKERS = int(os.getenv('AI_OPTIMIZER_MAX_WORKERS', os.cpu_count() or 1))
+
+# 单次布局优化的最长耗时 (毫秒)，请求中的 time_budget_ms 不能超过该值
+AI_OPTIMIZER_MAX_TIME_BUDGET_MS = int(os.getenv('AI_OPTIMIZER_MAX_TIME_BUDGET_MS', 30000))
+
+# 后台优化任务线程池大小
+AI_JOB_WORKERS = int(os.getenv('AI_JOB_WORKERS', 2))
+
+# AI结果缓存: 每个工作进程内LRU的最大条目数和有效期 (秒)，设为0可关闭进程内缓存
+AI_CACHE_LOCAL_MAX_ENTRIES = int(os.getenv('AI_CACHE_LOCAL_MAX_ENTRIES', 512))
+AI_CACHE_LOCAL_TTL_SECONDS = float(os.getenv('AI_CACHE_LOCAL_TTL_SECONDS', 300))
+
+# 各工作进程检查缓存失效记录的间隔 (秒)
+AI_CACHE_INVALIDATION_POLL_SECONDS = float(os.getenv('AI_CACHE_INVALIDATION_POLL_SECONDS', 5))
+
+# 缓存命中次数和最后使用时间写回 AICache 表的间隔 (秒)
+AI_CACHE_HIT_FLUSH_SECONDS = float(os.getenv('AI_CACHE_HIT_FLUSH_SECONDS', 10))
+
+# AICache 表清理: 超过 AI_CACHE_TTL_DAYS 天未使用的条目被删除 (0 表示不按时间清理)，
+# 各类型最多保留的条目数，超出时删除最近最少使用的条目
+AI_CACHE_TTL_DAYS = float(os.getenv('AI_CACHE_TTL_DAYS', 30))
+AI_CACHE_MAX_ENTRIES = {
+    'PSO_LAYOUT': int(os.getenv('AI_CACHE_MAX_PSO_LAYOUT_ENTRIES', 5000)),
+    'NLP_COMPONENT': int(os.getenv('AI_CACHE_MAX_NLP_COMPONENT_ENTRIES', 20000)),
+    'NLP_TRANSLATE': int(os.getenv('AI_CACHE_MAX_NLP_TRANSLATE_ENTRIES', 20000)),
+    'COLOR_OPTIMIZE': int(os.getenv('AI_CACHE_MAX_COLOR_OPTIMIZE_ENTRIES', 5000)),
+}
+AI_CACHE_EVICTION_BATCH_SIZE = int(os.getenv('AI_CACHE_EVICTION_BATCH_SIZE', 500))
+
+# 各工作进程在后台清理 AICache 表的间隔 (秒)，设为0则只通过 evict_ai_cache 命令清理
+AI_CACHE_EVICTION_INTERVAL_SECONDS = float(os.getenv('AI_CACHE_EVICTION_INTERVAL_SECONDS', 3600))
+
+# 相同请求并发时，等待其他进程计算结果的最长时间 (秒，同时是计算租约的有效期) 和轮询间隔
+AI_CACHE_LEASE_SECONDS = float(os.getenv('AI_CACHE_LEASE_SECONDS', AI_OPTIMIZER_MAX_TIME_BUDGET_MS / 1000 + 30))
+AI_CACHE_LEASE_POLL_SECONDS = float(os.getenv('AI_CACHE_LEASE_POLL_SECONDS', 0.2))
+
+# AICache.result_data 和 AIResultBlob.data (优化历史的输入/结果) 的 zlib 压缩级别 (0-9)，0 表示不压缩
+AI_PAYLOAD_COMPRESSION_LEVEL = int(os.getenv('AI_PAYLOAD_COMPRESSION_LEVEL', 6))
+
+# OptimizationHistory/NLPTrainingData 的保留天数，更早的记录汇总为每日统计、归档为
+# AI_ARCHIVE_DIR 下的 gzip JSONL 文件后分批删除 (apply_ai_retention 命令)
+AI_RETENTION_DAYS = int(os.getenv('AI_RETENTION_DAYS', 90))
+AI_RETENTION_BATCH_SIZE = int(os.getenv('AI_RETENTION_BATCH_SIZE', 1000))
+AI_ARCHIVE_DIR = os.getenv('AI_ARCHIVE_DIR', str(BASE_DIR / 'archives'))
+
 # Django REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [